@@ -1,13 +1,13 @@
 from django.contrib import admin
 from django.utils import timezone
-from .models import Cashier, Customer, Debt
+from .models import ArchivedDebt, Branch, Cashier, ChangeEvent, Customer, Debt, JobRun
 
 
 @admin.register(Cashier)
 class CashierAdmin(admin.ModelAdmin):
-    list_display = ['name', 'surname', 'user', 'phone', 'email', 'created_at']
+    list_display = ['name', 'surname', 'branch', 'user', 'phone', 'email', 'created_at']
     search_fields = ['name', 'surname', 'phone', 'email', 'user__username']
-    list_filter = ['created_at']
+    list_filter = ['branch', 'created_at']
     # Only show these fields - exclude user to avoid context copying error
     fields = ['name', 'surname', 'phone', 'email']
 
@@ -67,3 +67,60 @@ class DebtAdmin(admin.ModelAdmin):
             return timezone.localtime(obj.paid_date).strftime('%d.%m.%Y %H:%M')
         return '-'
     paid_date_display.short_description = 'Paid Date'
+
+
+@admin.register(ArchivedDebt)
+class ArchivedDebtAdmin(admin.ModelAdmin):
+    """Read-only view of the archive; rows get there with 'manage.py archive_debts'"""
+    list_display = ['id', 'customer', 'cashier', 'amount', 'date_given', 'is_paid', 'paid_date', 'is_deleted', 'archived_at']
+    list_filter = ['is_paid', 'is_deleted', 'cashier']
+    search_fields = ['customer__name', 'customer__surname', 'customer__place', 'description']
+    date_hierarchy = 'date_given'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    """History of 'manage.py run_scheduler'"""
+    list_display = ['job', 'status', 'started_at', 'duration', 'result']
+    list_filter = ['job', 'status']
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(admin.ModelAdmin):
+    """The change outbox (main.outbox); append-only"""
+    list_display = ['id', 'model', 'object_id', 'action', 'created_at']
+    list_filter = ['model', 'action']
+    search_fields = ['=object_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    """Pharmacies imported by 'manage.py sync_import' (main.branch_sync)"""
+    list_display = ['code', 'name', 'last_sequence', 'last_exported_at', 'last_imported_at']
+    search_fields = ['code', 'name']
+    readonly_fields = ['code', 'last_sequence', 'last_exported_at', 'last_imported_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,166 @@
+"""
+Archival of settled history.
+
+Paid and soft-deleted debts stay in the debt table forever, next to the
+unpaid ones every list page scans. Debts settled (or deleted) more than
+N months ago are moved, with their payments, into ``ArchivedDebt`` /
+``ArchivedPayment``: same ids, same columns. Each batch is copied and
+removed in one transaction, so a debt is always in exactly one place.
+
+Readers that need the full history use the archive as well: the
+customer statement (``main.statements``) and the monthly figures of the
+dashboards (``archived_monthly_totals``). Debts with edit requests
+are left in place, the requests refer to the live row.
+
+The archive only changes here, so its monthly figures are rolled up per
+cashier into ``ArchivedMonthlyTotal`` after every archiving run instead
+of being summed on each dashboard view.
+"""
+from calendar import monthrange
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedDebt, ArchivedMonthlyTotal, ArchivedPayment, ChangeEvent, Debt, Payment
+from .outbox import deletes_not_recorded
+
+DEFAULT_MONTHS = 12
+DEFAULT_BATCH_SIZE = 500
+
+DEBT_FIELDS = [
+    'id', 'cashier_id', 'customer_id', 'amount', 'date_given', 'promise_date', 'description',
+    'is_paid', 'paid_total', 'paid_date', 'payment_method', 'is_deleted', 'deleted_at',
+    'deleted_by_id', 'created_at', 'updated_at',
+]
+PAYMENT_FIELDS = [
+    'id', 'debt_id', 'amount', 'payment_date', 'payment_method', 'notes', 'created_by_id', 'created_at',
+]
+
+
+def months_ago(months, now=None):
+    """The same moment ``months`` calendar months back (day clamped to the month end)"""
+    now = now or timezone.now()
+    month_index = now.year * 12 + now.month - 1 - months
+    year, month = divmod(month_index, 12)
+    day = min(now.day, monthrange(year, month + 1)[1])
+    return now.replace(year=year, month=month + 1, day=day)
+
+
+def archivable_debts(cutoff):
+    """Debts settled or deleted before ``cutoff`` that can be archived"""
+    return Debt.all_objects.filter(
+        Q(is_paid=True, paid_date__lt=cutoff)
+        | Q(is_paid=True, paid_date__isnull=True, updated_at__lt=cutoff)
+        | Q(is_deleted=True, deleted_at__lt=cutoff)
+    ).filter(edit_requests__isnull=True)
+
+
+def archive_batch(debt_ids, cutoff):
+    """Move the given debts and their payments to the archive; returns (debts, payments)"""
+    with transaction.atomic():
+        # Re-check inside the transaction: a debt may have changed since it was picked
+        debts = list(archivable_debts(cutoff).filter(pk__in=debt_ids).values(*DEBT_FIELDS))
+        if not debts:
+            return 0, 0
+        ids = [row['id'] for row in debts]
+        payments = list(Payment.objects.filter(debt_id__in=ids).values(*PAYMENT_FIELDS))
+
+        ArchivedDebt.objects.bulk_create([ArchivedDebt(**row) for row in debts])
+        ArchivedPayment.objects.bulk_create([ArchivedPayment(**row) for row in payments])
+        with deletes_not_recorded():
+            Payment.objects.filter(debt_id__in=ids).delete()
+            Debt.all_objects.filter(pk__in=ids).delete()
+        ChangeEvent.record(Payment, [row['id'] for row in payments], 'archive')
+        ChangeEvent.record(Debt, ids, 'archive')
+    return len(debts), len(payments)
+
+
+def archive_settled_debts(months=DEFAULT_MONTHS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Archive debts settled or deleted more than ``months`` months ago, in
+    batches of ``batch_size`` (one short transaction each). Returns
+    ``{'debts', 'payments', 'cutoff'}``; with ``dry_run`` only counts.
+    """
+    cutoff = months_ago(months)
+    candidates = archivable_debts(cutoff).order_by('pk')
+    if dry_run:
+        return {
+            'debts': candidates.count(),
+            'payments': Payment.objects.filter(debt__in=candidates).count(),
+            'cutoff': cutoff,
+        }
+
+    moved_debts = moved_payments = 0
+    last_pk = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        debts, payments = archive_batch(ids, cutoff)
+        moved_debts += debts
+        moved_payments += payments
+    if moved_debts:
+        rebuild_archived_totals()
+    return {'debts': moved_debts, 'payments': moved_payments, 'cutoff': cutoff}
+
+
+def _sum_by_month(queryset, date_field, cashier_field):
+    return (
+        queryset.annotate(month=TruncMonth(date_field))
+        .order_by()
+        .values_list(cashier_field, 'month')
+        .annotate(total=Sum('amount'))
+    )
+
+
+def rebuild_archived_totals():
+    """
+    Recompute ``ArchivedMonthlyTotal`` from the archive tables, counted
+    like the live figures: debts given in the month, payments made in it,
+    and debts paid in full in it without a payment in that same month.
+    Returns the number of rows.
+    """
+    totals = defaultdict(lambda: {'given': Decimal(0), 'returned': Decimal(0)})
+    given = _sum_by_month(ArchivedDebt.objects.filter(is_deleted=False), 'given_local_date', 'cashier_id')
+    for cashier_id, month, total in given:
+        totals[cashier_id, month]['given'] += total
+    partial = _sum_by_month(ArchivedPayment.objects.all(), 'payment_local_date', 'debt__cashier_id')
+    for cashier_id, month, total in partial:
+        totals[cashier_id, month]['returned'] += total
+    payment_in_month = ArchivedPayment.objects.filter(debt=OuterRef('pk')).annotate(
+        month=TruncMonth('payment_local_date')
+    ).filter(month=OuterRef('month'))
+    full = _sum_by_month(
+        ArchivedDebt.objects.filter(is_deleted=False, is_paid=True, paid_local_date__isnull=False),
+        'paid_local_date', 'cashier_id',
+    ).filter(~Exists(payment_in_month))
+    for cashier_id, month, total in full:
+        totals[cashier_id, month]['returned'] += total
+
+    with transaction.atomic():
+        ArchivedMonthlyTotal.objects.all().delete()
+        ArchivedMonthlyTotal.objects.bulk_create(
+            [
+                ArchivedMonthlyTotal(cashier_id=cashier_id, month=month, **values)
+                for (cashier_id, month), values in totals.items()
+            ],
+            batch_size=DEFAULT_BATCH_SIZE,
+        )
+    return len(totals)
+
+
+def archived_monthly_totals(month, cashier=None):
+    """
+    Archived part of the dashboards' figures for the month starting on
+    the local date ``month``: ``{'given', 'returned'}``, from the rollup.
+    ``cashier`` limits them to that cashier's debts.
+    """
+    rows = ArchivedMonthlyTotal.objects.filter(month=month)
+    if cashier is not None:
+        rows = rows.filter(cashier=cashier)
+    return rows.aggregate(given=Sum('given', default=0), returned=Sum('returned', default=0))
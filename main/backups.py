@@ -0,0 +1,193 @@
+"""
+Online backups of the SQLite database.
+
+Copying ``db.sqlite3`` while the server runs can catch the file half
+written (and misses whatever is still in the ``-wal`` file). Backups are
+taken with SQLite's backup API instead (``sqlite3.Connection.backup``):
+the database is copied a few hundred pages per step with a short pause
+in between, each step reading a consistent state of the database. In WAL
+mode readers never block the writer, so cashiers keep working while the
+backup runs; if they change the database in the middle, SQLite restarts
+the copy from the start.
+
+Every snapshot is checked with ``PRAGMA integrity_check`` before it is
+kept, then gzip-compressed into the backup directory as
+``pharmacy-YYYYmmdd-HHMMSS.sqlite3.gz``; only the newest ``keep`` are
+kept. A verified, uncompressed copy can also be written over the
+reports database (``REPORTS_DATABASE``, see ``main.routers``).
+
+Restoring goes through the backup API too, in the other direction: the
+snapshot is checked, the current database is backed up first, and the
+snapshot then replaces the contents of the live database in one
+transaction, so running server processes see either the old or the
+restored data.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+SNAPSHOT_PREFIX = 'pharmacy-'
+SNAPSHOT_SUFFIX = '.sqlite3.gz'
+# Label of the snapshot taken before a restore; kept by rotation
+PRE_RESTORE_LABEL = '-pre-restore'
+
+# Pages copied per step (4 KiB each) and the pause between steps
+DEFAULT_PAGES = 256
+STEP_SLEEP = 0.01
+TIMEOUT = 20
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_path(alias='default'):
+    """File of the SQLite database ``alias``"""
+    database = settings.DATABASES[alias]
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise BackupError(f'Database "{alias}" is not SQLite, use its own backup tools')
+    return Path(database['NAME'])
+
+
+def _connect(path):
+    return sqlite3.connect(str(path), timeout=TIMEOUT)
+
+
+def copy_database(source, target, pages=DEFAULT_PAGES):
+    """Copy the database file ``source`` into ``target`` with the backup API"""
+    src = _connect(source)
+    dst = _connect(target)
+    try:
+        src.backup(dst, pages=pages, sleep=STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+
+def check_integrity(path):
+    """Raise BackupError unless ``PRAGMA integrity_check`` on ``path`` says ok"""
+    conn = _connect(path)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as exc:
+        raise BackupError(f'{path.name}: {exc}') from exc
+    finally:
+        conn.close()
+    if rows != ['ok']:
+        raise BackupError(f'{path.name} failed the integrity check: ' + '; '.join(rows[:5]))
+
+
+def _standalone(path):
+    # The copy keeps the source's WAL flag; a snapshot should be one self-contained file
+    conn = _connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        conn.close()
+
+
+def take_snapshot(target, pages=DEFAULT_PAGES):
+    """Verified copy of the live database at ``target``"""
+    copy_database(database_path(), target, pages=pages)
+    _standalone(target)
+    check_integrity(target)
+
+
+def _compress(source, target):
+    partial = target.with_name(target.name + '.part')
+    with open(source, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(partial, target)
+
+
+def list_snapshots(directory):
+    """Snapshots in ``directory`` (pre-restore ones included), newest first"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted(
+        (p for p in directory.iterdir() if p.name.startswith(SNAPSHOT_PREFIX) and p.name.endswith(SNAPSHOT_SUFFIX)),
+        key=lambda p: (p.stat().st_mtime, p.name),
+        reverse=True,
+    )
+
+
+def rotate_snapshots(directory, keep):
+    """Delete all but the newest ``keep`` snapshots; returns the deleted paths"""
+    regular = [p for p in list_snapshots(directory) if PRE_RESTORE_LABEL not in p.name]
+    old = regular[keep:]
+    for path in old:
+        path.unlink()
+    return old
+
+
+def backup_database(directory, keep, pages=DEFAULT_PAGES, reports_copy=None, label=''):
+    """
+    Snapshot the live database into ``directory`` (compressed, verified)
+    and rotate old snapshots (none with ``keep=None``). ``reports_copy``
+    is a database file refreshed from the same snapshot. Returns
+    ``{'path', 'size', 'compressed', 'deleted'}``.
+    """
+    if reports_copy and Path(reports_copy).resolve() == database_path().resolve():
+        raise BackupError('The reports copy cannot be the live database itself')
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.localtime().strftime('%Y%m%d-%H%M%S')
+    path = directory / f'{SNAPSHOT_PREFIX}{stamp}{label}{SNAPSHOT_SUFFIX}'
+    counter = 1
+    while path.exists():
+        # Two backups within a second
+        counter += 1
+        path = directory / f'{SNAPSHOT_PREFIX}{stamp}-{counter}{label}{SNAPSHOT_SUFFIX}'
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        snapshot = Path(tmp) / 'snapshot.sqlite3'
+        take_snapshot(snapshot, pages=pages)
+        size = snapshot.stat().st_size
+        if reports_copy:
+            # Through the backup API as well: the reports file may be open in the server
+            copy_database(snapshot, reports_copy, pages=-1)
+        _compress(snapshot, path)
+
+    return {
+        'path': path,
+        'size': size,
+        'compressed': path.stat().st_size,
+        'deleted': rotate_snapshots(directory, keep) if keep is not None else [],
+    }
+
+
+def restore_database(snapshot, directory, pages=DEFAULT_PAGES):
+    """
+    Replace the live database with ``snapshot`` (``.gz`` or plain). The
+    current database is saved to ``directory`` first (PRE_RESTORE_LABEL,
+    not rotated away by the next backups). Returns that safety snapshot.
+    """
+    snapshot = Path(snapshot)
+    if not snapshot.is_file():
+        raise BackupError(f'{snapshot} does not exist')
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        source = Path(tmp) / 'restore.sqlite3'
+        opener = gzip.open if snapshot.suffix == '.gz' else open
+        try:
+            with opener(snapshot, 'rb') as src, open(source, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        except (OSError, EOFError) as exc:
+            raise BackupError(f'{snapshot.name}: {exc}') from exc
+        check_integrity(source)
+
+        saved = backup_database(directory, keep=None, pages=pages, label=PRE_RESTORE_LABEL)
+        # Django's own connections must not hold a read snapshot of the old data
+        connections.close_all()
+        copy_database(source, database_path(), pages=-1)
+    return saved['path']
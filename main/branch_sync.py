@@ -0,0 +1,672 @@
+"""
+File-based replication from the pharmacy branches to head office.
+
+Every pharmacy server keeps its own database and has a ``BRANCH_CODE``.
+Its changes (the ``main.outbox`` events) leave it as batch files:
+
+    manage.py sync_export                 (at the branch, nightly job)
+    manage.py sync_import D:\\sync\\inbox   (at head office)
+
+``<branch>-<from>-<to>.jsonl.gz`` holds the branch's events with
+sequence numbers ``from + 1`` to ``to``, reduced to the last state of
+every row, and the branch's cashiers. The first export of a branch is a
+snapshot of all its rows. The files travel however is convenient (shared
+folder, USB stick, e-mail); nothing listens on the network.
+
+Head office keeps, per ``Branch``, the sequence number imported up to,
+and maps every branch row to its own row (``ReplicaKey``), so the ids of
+different branches never collide. A file is applied in one transaction
+and only where the branch left off: files already imported are skipped,
+a missing file stops that branch until it arrives. Importing a file
+twice changes nothing. Imported cashiers carry their branch, so the
+dashboards and reports of head office show all branches together.
+
+Customers are shared between branches. A branch customer with the same
+name, surname, patronymic and place as a customer head office already
+has (from another branch, or entered there) becomes that customer. On a
+shared customer the latest change (by the time it was made at the
+branch) wins, except that a known patronymic, phone or address is never
+replaced by an empty one, and an older change only fills in what is
+missing. Namesakes a branch keeps apart (a blank patronymic does not
+count in its unique constraint) stay apart. A branch renaming a customer
+into another existing customer moves its debts there; renaming one that
+other branches share gives the branch's customer a row of its own. A
+customer is deleted at head office once no branch has it and no debts
+are left.
+
+Archiving at a branch is not replicated: head office keeps the debt and
+archives it on its own schedule.
+"""
+import gzip
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from itertools import chain
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fields import local_date
+from .models import (
+    ArchivedDebt, Branch, Cashier, ChangeEvent, Customer, Debt, OutboxCursor, Payment, ReplicaKey,
+)
+from .outbox import last_sequence, read_changes
+
+FORMAT_VERSION = 1
+FILE_SUFFIX = '.jsonl.gz'
+EXPORT_CURSOR = 'branch-sync'
+EVENTS_PER_FILE = 50000
+BATCH_SIZE = 500
+BRANCH_CODE_RE = re.compile(r'^[A-Za-z0-9_]{1,20}$')
+
+CASHIER_FIELDS = ['name', 'surname', 'phone', 'email']
+CUSTOMER_FIELDS = ['name', 'surname', 'patronymic', 'place', 'phone', 'address']
+# Customer details a branch never clears on a shared customer
+KEPT_FIELDS = {'patronymic', 'phone', 'address'}
+DEBT_FIELDS = [
+    'cashier_id', 'customer_id', 'amount', 'date_given', 'promise_date', 'description', 'is_paid',
+    'paid_total', 'paid_date', 'payment_method', 'is_deleted', 'deleted_at',
+]
+PAYMENT_FIELDS = ['debt_id', 'amount', 'payment_date', 'payment_method', 'notes']
+UPSERT_ACTIONS = {'create', 'update'}
+
+
+class SyncError(Exception):
+    pass
+
+
+class SyncGap(SyncError):
+    """The batch file before this one has not been imported"""
+
+
+def batch_filename(branch, start, end):
+    return f'{branch}-{start:010d}-{end:010d}{FILE_SUFFIX}'
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# Export (branch side)
+
+def _event_record(event):
+    return {
+        'type': 'event',
+        'seq': event.id,
+        'model': event.model,
+        'id': event.object_id,
+        'action': event.action,
+        'at': event.created_at,
+        'data': event.data,
+    }
+
+
+def _compact(events):
+    """The last event of every row, in sequence order"""
+    last = {}
+    for event in events:
+        last[event.model, event.object_id] = event
+    return sorted(last.values(), key=lambda event: event.id)
+
+
+def _snapshot_events(sequence, at):
+    """Every current row as a 'create' event, parents first"""
+    for model in (Customer, Debt, Payment):
+        fields = ChangeEvent.row_fields(model)
+        for row in model._base_manager.order_by('pk').values(*fields).iterator(chunk_size=2000):
+            yield ChangeEvent(
+                id=sequence, model=model._meta.model_name, object_id=row['id'],
+                action='create', data=row, created_at=at,
+            )
+
+
+def _write_batch(directory, header, events):
+    """Write a batch file atomically (a reader never sees half of it); returns its path"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / batch_filename(header['branch'], header['from'], header['to'])
+    partial = path.with_name(path.name + '.part')
+    cashiers = (
+        {'type': 'cashier', **row}
+        for row in Cashier.objects.order_by('pk').values('id', *CASHIER_FIELDS)
+    )
+    count = 0
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        for record in chain([header], cashiers, map(_event_record, events)):
+            count += record['type'] == 'event'
+            out.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        out.write(json.dumps({'type': 'end', 'events': count}) + '\n')
+    os.replace(partial, path)
+    return path
+
+
+def branch_code():
+    """This server's BRANCH_CODE; raises SyncError if it is missing or unusable in a file name"""
+    code = settings.BRANCH_CODE
+    if not code:
+        raise SyncError('BRANCH_CODE is not set for this server')
+    if not BRANCH_CODE_RE.match(code):
+        raise SyncError(f'BRANCH_CODE "{code}" may only contain letters, digits and _ (at most 20)')
+    return code
+
+
+def export_changes(directory, snapshot=False, events_per_file=EVENTS_PER_FILE):
+    """
+    Write this branch's changes not exported yet to ``directory``; the
+    first export (or one with ``snapshot``) writes all rows instead.
+    Returns the paths of the files written.
+
+    Reads run outside a transaction so the terminals keep working: a
+    snapshot may already contain changes made after its sequence number,
+    which the next file repeats; applying them twice is harmless.
+    """
+    code = branch_code()
+    directory = Path(directory)
+    paths = []
+    while True:
+        cursor = OutboxCursor.objects.filter(name=EXPORT_CURSOR).first()
+        header = {
+            'type': 'batch',
+            'format': FORMAT_VERSION,
+            'branch': code,
+            'name': settings.BRANCH_NAME or code,
+            'created_at': timezone.now(),
+            'snapshot': snapshot or cursor is None,
+        }
+        if header['snapshot']:
+            header['from'], header['to'] = 0, last_sequence()
+            events = _snapshot_events(header['to'], header['created_at'])
+        else:
+            changes = read_changes(cursor.position, events_per_file)
+            if not changes:
+                return paths
+            header['from'], header['to'] = cursor.position, changes[-1].id
+            events = _compact(changes)
+        paths.append(_write_batch(directory, header, events))
+
+        if cursor is None:
+            OutboxCursor.objects.create(name=EXPORT_CURSOR, position=header['to'])
+        elif not OutboxCursor.objects.filter(name=EXPORT_CURSOR, position=cursor.position).update(
+            position=header['to'], updated_at=timezone.now(),
+        ):
+            raise SyncError('Another export ran at the same time; run the export again')
+        snapshot = False
+
+
+# Import (head office side)
+
+def _read_records(path, header_only=False):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            if header_only:
+                return [json.loads(next(lines, 'null'))]
+            return [json.loads(line) for line in lines]
+    except (OSError, EOFError, ValueError) as exc:
+        raise SyncError(f'{path.name}: unreadable batch file ({exc})') from exc
+
+
+def read_header(path):
+    """The header of a batch file"""
+    path = Path(path)
+    header = _read_records(path, header_only=True)[0]
+    if not isinstance(header, dict) or header.get('type') != 'batch':
+        raise SyncError(f'{path.name}: not a batch file')
+    if header.get('format') != FORMAT_VERSION:
+        raise SyncError(f'{path.name}: batch format {header.get("format")} is not supported, update this server')
+    header['created_at'] = parse_datetime(header['created_at'])
+    return header
+
+
+def read_batch(path):
+    """(header, cashier rows, events) of a batch file; raises SyncError if it is damaged"""
+    path = Path(path)
+    header = read_header(path)
+    records = _read_records(path)
+    cashiers = [record for record in records if record['type'] == 'cashier']
+    events = [record for record in records if record['type'] == 'event']
+    if records[-1] != {'type': 'end', 'events': len(events)}:
+        raise SyncError(f'{path.name}: incomplete batch file')
+    for event in events:
+        event['at'] = parse_datetime(event['at'])
+    return header, cashiers, events
+
+
+def _parse_row(model, data):
+    """Event data as model values (Decimal, aware datetimes...)"""
+    return {
+        field.attname: field.to_python(data[field.attname])
+        for field in model._meta.concrete_fields if field.attname in data
+    }
+
+
+def _identity(values):
+    """The customer natural key (Customer.Meta.unique_together); a blank patronymic is ''"""
+    if isinstance(values, Customer):
+        values = {field: getattr(values, field) for field in CUSTOMER_FIELDS}
+    return values['name'], values['surname'], values['patronymic'] or '', values['place']
+
+
+def _displayed(customer):
+    return [getattr(customer, field) for field in Customer.DISPLAYED_FIELDS]
+
+
+class _BatchImport:
+    """Applies the rows of one batch file of ``branch``, inside the caller's transaction"""
+
+    def __init__(self, branch):
+        self.branch = branch
+        self.now = timezone.now()
+        self.keys = defaultdict(dict)  # model -> {source id: ReplicaKey}
+        self.changed_keys = {}
+        self.stats = Counter()
+        # Head office customers a branch customer moved away from
+        self.orphans = set()
+
+    def _load_keys(self, model, source_ids):
+        known = self.keys[model]
+        missing = {source_id for source_id in source_ids if source_id not in known}
+        for chunk in _chunks(missing):
+            for key in ReplicaKey.objects.filter(branch=self.branch, model=model, source_id__in=chunk):
+                known[key.source_id] = key
+        return known
+
+    def _local_id(self, model, source_id):
+        key = self.keys[model].get(source_id)
+        return key.local_id if key else None
+
+    def _link(self, model, source_id, local_id, at):
+        key = self.keys[model].get(source_id)
+        if key is None:
+            key = ReplicaKey(branch=self.branch, model=model, source_id=source_id)
+            self.keys[model][source_id] = key
+        key.local_id = local_id
+        key.changed_at = at
+        self.changed_keys[model, source_id] = key
+
+    def _unlink(self, model, source_id):
+        key = self.keys[model].pop(source_id, None)
+        self.changed_keys.pop((model, source_id), None)
+        if key and key.pk:
+            key.delete()
+        return key.local_id if key else None
+
+    def _save_keys(self):
+        keys = list(self.changed_keys.values())
+        ReplicaKey.objects.bulk_create([key for key in keys if key.pk is None], batch_size=BATCH_SIZE)
+        ReplicaKey.objects.bulk_update(
+            [key for key in keys if key.pk is not None], ['local_id', 'changed_at'], batch_size=BATCH_SIZE
+        )
+        self.changed_keys.clear()
+
+    def apply(self, cashiers, events):
+        by_model = defaultdict(list)
+        for event in events:
+            by_model[event['model'], event['action'] in UPSERT_ACTIONS].append(event)
+        self.stats['archived'] = sum(event['action'] == 'archive' for event in events)
+
+        self.cashiers(cashiers)
+        self.customers(by_model['customer', True])
+        self.debts(by_model['debt', True])
+        self.payments(by_model['payment', True])
+        self._save_keys()
+
+        self.delete_payments(by_model['payment', False])
+        self.delete_debts(by_model['debt', False])
+        orphans = self.delete_customers(by_model['customer', False])
+        self._save_keys()
+        self._delete_orphans(orphans | self.orphans)
+        return self.stats
+
+    def cashiers(self, rows):
+        keys = self._load_keys('cashier', [row['id'] for row in rows])
+        existing = Cashier.objects.in_bulk([key.local_id for key in keys.values()])
+        new, changed, renamed = [], [], []
+        for row in rows:
+            cashier = existing.get(self._local_id('cashier', row['id']))
+            values = {field: row[field] for field in CASHIER_FIELDS}
+            if cashier is None:
+                new.append((row['id'], Cashier(branch=self.branch, **values)))
+            elif any(getattr(cashier, field) != value for field, value in values.items()):
+                if (cashier.name, cashier.surname) != (values['name'], values['surname']):
+                    renamed.append(cashier.pk)
+                for field, value in values.items():
+                    setattr(cashier, field, value)
+                changed.append(cashier)
+        Cashier.objects.bulk_create([cashier for _, cashier in new], batch_size=BATCH_SIZE)
+        Cashier.objects.bulk_update(changed, CASHIER_FIELDS, batch_size=BATCH_SIZE)
+        for source_id, cashier in new:
+            self._link('cashier', source_id, cashier.pk, self.now)
+        if renamed:
+            Debt.refresh_search_keys(Debt.all_objects.filter(cashier_id__in=renamed), touch=True)
+        self.stats['cashiers'] = len(new) + len(changed)
+
+    def _customer_owners(self, customer_ids):
+        """
+        ({head office customer id: {(branch id, source id)}}, {id: when any
+        branch last changed it}) for these head office customers
+        """
+        owners, latest = defaultdict(set), {}
+        for chunk in _chunks(customer_ids):
+            keys = ReplicaKey.objects.filter(model='customer', local_id__in=chunk).values_list(
+                'local_id', 'branch_id', 'source_id', 'changed_at',
+            )
+            for local_id, branch_id, source_id, changed_at in keys:
+                owners[local_id].add((branch_id, source_id))
+                latest[local_id] = max(latest.get(local_id) or changed_at, changed_at)
+        return owners, latest
+
+    def _merged_values(self, customer, values, newer):
+        """The fields a branch's version changes on ``customer`` under the conflict rules"""
+        merged = {}
+        for field in CUSTOMER_FIELDS:
+            value, current = values[field], getattr(customer, field)
+            if value == current or (not value and field in KEPT_FIELDS and current):
+                continue
+            if newer or not current:
+                merged[field] = value
+        return merged
+
+    def _move_branch_debts(self, source, target):
+        """Move the debts this branch has on ``source`` to ``target`` (after a rename)"""
+        branch_debts = ReplicaKey.objects.filter(branch=self.branch, model='debt').values('local_id')
+        debts = Debt.all_objects.filter(customer=source, pk__in=branch_debts)
+        moved = list(debts.values_list('pk', flat=True))
+        debts.update(customer=target, updated_at=self.now, version=F('version') + 1)
+        ChangeEvent.record(Debt, moved, 'update')
+        Debt.refresh_search_keys(Debt.all_objects.filter(pk__in=moved))
+        ArchivedDebt.objects.filter(customer=source, pk__in=branch_debts).update(customer=target)
+
+    def customers(self, events):
+        keys = self._load_keys('customer', [event['id'] for event in events])
+        rows = {event['id']: _parse_row(Customer, event['data']) for event in events}
+        customers = Customer.objects.in_bulk([keys[event['id']].local_id for event in events if event['id'] in keys])
+        # Customers head office already has under the names arriving
+        by_identity = {_identity(customer): customer for customer in customers.values()}
+        for chunk in _chunks({row['surname'] for row in rows.values()}):
+            for customer in Customer.objects.filter(surname__in=chunk):
+                customers.setdefault(customer.pk, customer)
+                by_identity.setdefault(_identity(customer), customer)
+        owner_ids, latest = self._customer_owners(list(customers))
+        # Kept per object: customers created by this batch have no pk yet
+        owners = defaultdict(set, {id(customers[pk]): keys for pk, keys in owner_ids.items()})
+
+        new, changed, old_keys, links, moves = [], {}, {}, [], []
+        for event in events:
+            mine = (self.branch.pk, event['id'])
+            values = {field: rows[event['id']][field] for field in CUSTOMER_FIELDS}
+            linked = customers.get(self._local_id('customer', event['id']))
+            customer = linked
+            same_name = by_identity.get(_identity(values))
+            if same_name is not None and any(
+                owner[0] == self.branch.pk and owner != mine for owner in owners[id(same_name)]
+            ):
+                # Another customer of this branch: the branch keeps namesakes apart
+                # (a blank patronymic does not count in its unique constraint)
+                same_name = None
+            if customer is None:
+                customer = same_name
+            elif same_name is not None and same_name is not customer:
+                # Renamed at the branch into a customer head office already has
+                moves.append((customer, same_name, 'customers_merged'))
+                customer = same_name
+            self.stats['customers'] += 1
+
+            merged, split_from = {}, None
+            if customer is not None:
+                previous = latest.get(customer.pk) if customer.pk else None
+                merged = self._merged_values(customer, values, previous is None or event['at'] >= previous)
+                current = {field: getattr(customer, field) for field in CUSTOMER_FIELDS}
+                if _identity({**current, **merged}) != _identity(current) and owners[id(customer)] - {mine}:
+                    # Renaming a customer other keys share: this branch's customer becomes its own row
+                    split_from, customer = customer, None
+
+            if customer is None:
+                customer = Customer(**values)
+                new.append(customer)
+                if split_from is not None and split_from.pk:
+                    moves.append((split_from, customer, 'customers_split'))
+            elif merged:
+                old_identity = _identity(customer)
+                before = (customer.search_key, _displayed(customer))
+                for field, value in merged.items():
+                    setattr(customer, field, value)
+                if customer.pk:
+                    old_keys.setdefault(customer.pk, before)
+                    changed[customer.pk] = customer
+                if by_identity.get(old_identity) is customer:
+                    del by_identity[old_identity]
+            by_identity.setdefault(_identity(customer), customer)
+            if linked is not None and linked is not customer:
+                owners[id(linked)].discard(mine)
+            owners[id(customer)].add(mine)
+            links.append((event['id'], customer, event['at']))
+            if customer.pk:
+                latest[customer.pk] = max(latest.get(customer.pk) or event['at'], event['at'])
+
+        for customer in chain(new, changed.values()):
+            customer.search_key = customer.build_search_key()
+        Customer.objects.bulk_create(new, batch_size=BATCH_SIZE)
+        Customer.objects.bulk_update(changed.values(), CUSTOMER_FIELDS + ['search_key'], batch_size=BATCH_SIZE)
+        for source_id, customer, at in links:
+            self._link('customer', source_id, customer.pk, at)
+        for source, target, stat in moves:
+            self._move_branch_debts(source, target)
+            self.stats[stat] += 1
+        ChangeEvent.record(Customer, [customer.pk for customer in new], 'create')
+        ChangeEvent.record(Customer, list(changed), 'update')
+        renamed = [pk for pk, (_, shown) in old_keys.items() if _displayed(changed[pk]) != shown]
+        rekeyed = [pk for pk, (key, _) in old_keys.items() if changed[pk].search_key != key and pk not in renamed]
+        if renamed:
+            Debt.refresh_search_keys(Debt.all_objects.filter(customer_id__in=renamed), touch=True)
+        if rekeyed:
+            Debt.refresh_search_keys(Debt.all_objects.filter(customer_id__in=rekeyed))
+        # The customers left behind go if nothing else has them
+        self.orphans.update(source.pk for source, _, _ in moves)
+
+    def _parents(self, events, field, parent):
+        """Head office ids of the ``parent`` rows the events point to through ``field``"""
+        self._load_keys(parent, {event['data'][field] for event in events})
+        return {
+            event['id']: self._local_id(parent, event['data'][field]) for event in events
+        }
+
+    def _upsert(self, model, events, fields, prepare):
+        """Create or update the rows of ``events``; ``prepare(obj)`` sets the derived columns"""
+        name = model._meta.model_name
+        keys = self._load_keys(name, [event['id'] for event in events])
+        existing = model._base_manager.in_bulk([keys[event['id']].local_id for event in events if event['id'] in keys])
+        new, changed, links = [], [], []
+        for event in events:
+            values = event['values']
+            obj = existing.get(self._local_id(name, event['id']))
+            if obj is None:
+                obj = model(**values)
+                new.append(obj)
+                prepare(obj)
+            elif any(getattr(obj, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                changed.append(obj)
+                prepare(obj)
+            links.append((event, obj))
+        model._base_manager.bulk_create(new, batch_size=BATCH_SIZE)
+        model._base_manager.bulk_update(changed, fields, batch_size=BATCH_SIZE)
+        for event, obj in links:
+            self._link(name, event['id'], obj.pk, event['at'])
+        ChangeEvent.record(model, [obj.pk for obj in new], 'create')
+        ChangeEvent.record(model, [obj.pk for obj in changed], 'update')
+        self.stats[f'{name}s'] += len(events)
+
+    def debts(self, events):
+        cashiers = self._parents(events, 'cashier_id', 'cashier')
+        customers = self._parents(events, 'customer_id', 'customer')
+        ready = []
+        for event in events:
+            if cashiers[event['id']] is None or customers[event['id']] is None:
+                # The parent arrives with a later file (see export_changes)
+                self.stats['skipped'] += 1
+                continue
+            row = _parse_row(Debt, event['data'])
+            event['values'] = {field: row[field] for field in DEBT_FIELDS}
+            event['values'].update(cashier_id=cashiers[event['id']], customer_id=customers[event['id']])
+            ready.append(event)
+
+        related = {
+            'cashier': Cashier.objects.in_bulk(set(cashiers.values()) - {None}),
+            'customer': Customer.objects.in_bulk(set(customers.values()) - {None}),
+        }
+
+        def prepare(debt):
+            debt.cashier = related['cashier'][debt.cashier_id]
+            debt.customer = related['customer'][debt.customer_id]
+            debt.search_key = debt.build_search_key()
+            # bulk_update skips pre_save: keep the local dates and the version in step here
+            debt.given_local_date = local_date(debt.date_given)
+            debt.paid_local_date = local_date(debt.paid_date)
+            debt.updated_at = self.now
+            if debt.pk:
+                debt.version = F('version') + 1
+
+        self._upsert(Debt, ready, DEBT_FIELDS + [
+            'search_key', 'given_local_date', 'paid_local_date', 'updated_at', 'version',
+        ], prepare)
+
+    def payments(self, events):
+        debts = self._parents(events, 'debt_id', 'debt')
+        ready = []
+        for event in events:
+            if debts[event['id']] is None:
+                self.stats['skipped'] += 1
+                continue
+            row = _parse_row(Payment, event['data'])
+            event['values'] = {field: row[field] for field in PAYMENT_FIELDS}
+            event['values']['debt_id'] = debts[event['id']]
+            ready.append(event)
+
+        def prepare(payment):
+            payment.payment_local_date = local_date(payment.payment_date)
+
+        self._upsert(Payment, ready, PAYMENT_FIELDS + ['payment_local_date'], prepare)
+
+    def _delete(self, model, events):
+        name = model._meta.model_name
+        self._load_keys(name, [event['id'] for event in events])
+        ids = [self._unlink(name, event['id']) for event in events]
+        ids = [pk for pk in ids if pk is not None]
+        for chunk in _chunks(ids):
+            model._base_manager.filter(pk__in=chunk).delete()
+        self.stats[f'{name}s_deleted'] += len(ids)
+        return ids
+
+    def delete_payments(self, events):
+        self._delete(Payment, events)
+
+    def delete_debts(self, events):
+        self._load_keys('debt', [event['id'] for event in events])
+        debt_ids = [self._local_id('debt', event['id']) for event in events]
+        # Their payments go with them (cascade); forget the branch's keys to those too
+        payment_ids = set()
+        for chunk in _chunks(pk for pk in debt_ids if pk is not None):
+            payment_ids.update(Payment.objects.filter(debt_id__in=chunk).values_list('pk', flat=True))
+        for chunk in _chunks(payment_ids):
+            ReplicaKey.objects.filter(branch=self.branch, model='payment', local_id__in=chunk).delete()
+        self._delete(Debt, events)
+
+    def delete_customers(self, events):
+        self._load_keys('customer', [event['id'] for event in events])
+        ids = [self._unlink('customer', event['id']) for event in events]
+        return {pk for pk in ids if pk is not None}
+
+    def _delete_orphans(self, customer_ids):
+        """Delete the customers no branch has any more, unless debts are left"""
+        for chunk in _chunks(customer_ids):
+            shared = ReplicaKey.objects.filter(model='customer', local_id__in=chunk).values('local_id')
+            deleted, _ = Customer.objects.filter(
+                pk__in=chunk, debts__isnull=True, archived_debts__isnull=True,
+            ).exclude(pk__in=shared).delete()
+            self.stats['customers_deleted'] += deleted
+
+
+def import_batch(path):
+    """
+    Apply one batch file. Returns (branch code, status, stats) with status
+    'imported' or 'skipped' (already imported); raises SyncGap if the
+    branch's previous file is missing and SyncError for a damaged file.
+    """
+    path = Path(path)
+    header, cashiers, events = read_batch(path)
+    if header['branch'] == settings.BRANCH_CODE:
+        raise SyncError(f'{path.name}: exported by this server')
+    with transaction.atomic():
+        branch, _ = Branch.objects.get_or_create(code=header['branch'], defaults={'name': header['name']})
+        # A newer snapshot replaces the branch's sequence (e.g. after a restore at the branch)
+        resync = header['snapshot'] and (
+            branch.last_exported_at is None or header['created_at'] > branch.last_exported_at
+        )
+        if header['to'] <= branch.last_sequence and not resync:
+            return branch.code, 'skipped', {}
+        if header['from'] > branch.last_sequence and not resync:
+            raise SyncGap(
+                f'{path.name}: changes {branch.last_sequence + 1}-{header["from"]} of {branch.code} '
+                'have not been imported yet'
+            )
+        stats = _BatchImport(branch).apply(cashiers, events)
+        branch.name = header['name']
+        branch.last_sequence = header['to']
+        branch.last_exported_at = header['created_at']
+        branch.last_imported_at = timezone.now()
+        branch.save()
+    return branch.code, 'imported', stats
+
+
+def batch_files(paths):
+    """Batch files among ``paths`` (files or folders), in the order they must be applied"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob(f'*{FILE_SUFFIX}')))
+        else:
+            files.append(path)
+    unreadable, batches = [], []
+    for path in files:
+        try:
+            batches.append((path, read_header(path), None))
+        except SyncError as exc:
+            unreadable.append((path, None, exc))
+    # Per branch in the order they were written (sequences restart after a restore)
+    batches.sort(key=lambda item: (item[1]['branch'], item[1]['created_at'], item[1]['from']))
+    return unreadable + batches
+
+
+def import_batches(paths):
+    """
+    Import the batch files among ``paths``. A failing file stops its
+    branch (the later files wait for it, except a snapshot, which
+    replaces them all) but not the others. Yields
+    (path, branch code, status, stats or error) per file, status
+    'imported', 'skipped', 'waiting' or 'failed'.
+    """
+    stopped = set()
+    for path, header, error in batch_files(paths):
+        if error:
+            yield path, None, 'failed', error
+            continue
+        if header['branch'] in stopped and not header['snapshot']:
+            yield path, header['branch'], 'waiting', None
+            continue
+        try:
+            code, status, stats = import_batch(path)
+        except SyncError as exc:
+            stopped.add(header['branch'])
+            yield path, header['branch'], 'failed', exc
+        else:
+            if status == 'imported':
+                stopped.discard(code)
+            yield path, code, status, stats
@@ -0,0 +1,125 @@
+"""
+Cache keys for rendered debt lists.
+
+Rows are cached by their own version ``(pk, updated_at, paid_total)``,
+so a row fragment can never be stale: saving a debt bumps
+``updated_at`` (auto_now) and adding a payment changes the paid total.
+Whole tables are cached under a key that includes the data version of
+the debts they show (see ``debt_data_version``), so any Debt/Payment
+write in that scope produces a new key and old entries simply expire.
+
+The same data version backs the HTTP validators (ETag/Last-Modified)
+of the dashboard pages, so an unchanged page is answered with 304.
+
+Bulk writes that bypass ``Model.save()`` (``QuerySet.update()``,
+``bulk_update()``) must set ``updated_at`` themselves to keep this true.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .edit_requests import pending_count
+from .models import Cashier, Debt, Payment
+
+# Row fragments are self-versioned, they can live long
+DEBT_ROW_CACHE_TIMEOUT = 60 * 60 * 24
+# Tables also depend on "today" (overdue badges), keep them short-lived
+DEBT_TABLE_CACHE_TIMEOUT = 60 * 5
+
+
+def debt_data_version(debts=None, payments=None):
+    """
+    Cheap fingerprint of the debts/payments in a scope.
+
+    Uses max(updated_at) and count of debts (soft and hard deletes
+    included) plus the payment high-water mark (max id and count).
+    """
+    if debts is None:
+        debts = Debt.all_objects.all()
+    if payments is None:
+        payments = Payment.objects.filter(debt__in=debts)
+    debt_stats = debts.order_by().aggregate(last=Max('updated_at'), count=Count('id'))
+    payment_stats = payments.order_by().aggregate(last=Max('id'), count=Count('id'))
+    return (
+        debt_stats['last'],
+        debt_stats['count'],
+        payment_stats['last'],
+        payment_stats['count'],
+    )
+
+
+def table_cache_key(request, name, version, today):
+    """Key for a whole rendered table: view, filters, viewer and data version"""
+    parts = [
+        name,
+        request.user.pk,
+        request.user.is_staff or request.user.is_superuser,
+        getattr(request, 'LANGUAGE_CODE', ''),
+        today.isoformat(),
+        sorted(request.GET.items()),
+        version,
+    ]
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'{name}:{digest}'
+
+
+def _dashboard_scope(request):
+    """Debts a dashboard page depends on, or None if it won't be rendered"""
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if user.is_staff or user.is_superuser:
+        # Admins are redirected from home to the admin dashboard
+        if request.resolver_match and request.resolver_match.url_name == 'home':
+            return None
+        return Debt.all_objects.all()
+    try:
+        cashier = user.cashier_profile
+    except Cashier.DoesNotExist:
+        return None
+    return Debt.all_objects.filter(cashier=cashier)
+
+
+def _dashboard_validators(request):
+    """(etag, last_modified) for home/todays_operations, computed once per request"""
+    if hasattr(request, '_dashboard_validators'):
+        return request._dashboard_validators
+
+    validators = (None, None)
+    # Pending flash messages are part of the page; render it fully
+    if request.method in ('GET', 'HEAD') and not len(messages.get_messages(request)):
+        debts = _dashboard_scope(request)
+        if debts is not None:
+            version = debt_data_version(debts)
+            last_payment = Payment.objects.filter(debt__in=debts).order_by().aggregate(
+                last=Max('created_at')
+            )['last']
+            parts = [
+                request.resolver_match.url_name if request.resolver_match else request.path,
+                request.user.pk,
+                getattr(request, 'LANGUAGE_CODE', ''),
+                timezone.localdate().isoformat(),
+                sorted(request.GET.items()),
+                version,
+            ]
+            if request.user.is_staff or request.user.is_superuser:
+                # The navbar shows the pending edit request count
+                parts.append(pending_count())
+            etag = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+            last_modified = max((d for d in (version[0], last_payment) if d), default=None)
+            validators = (etag, last_modified)
+
+    request._dashboard_validators = validators
+    return validators
+
+
+def dashboard_etag(request, *args, **kwargs):
+    """ETag for the ``condition`` decorator on dashboard pages"""
+    return _dashboard_validators(request)[0]
+
+
+def dashboard_last_modified(request, *args, **kwargs):
+    """Last-Modified for the ``condition`` decorator on dashboard pages"""
+    return _dashboard_validators(request)[1]
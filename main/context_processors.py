@@ -1,2 +1,9 @@
-# Context processor removed - no longer needed
+from .edit_requests import pending_count
 
+
+def pending_edit_requests(request):
+    """Pending debt edit request count for the admin navbar badge"""
+    user = getattr(request, 'user', None)
+    if user is None or not (user.is_staff or user.is_superuser):
+        return {}
+    return {'pending_edit_request_count': pending_count()}
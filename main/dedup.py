@@ -0,0 +1,244 @@
+"""
+Finding and merging duplicate customers.
+
+The unique constraint on (name, surname, patronymic, place) only catches
+exact copies. Real duplicates differ in the details: ``None`` against
+``''`` patronymic, "Qasımov" typed at the counter against "Гасымов"
+from a 1C export, "Sumqayıt" against "Sumqayit", or a place left as
+"Unknown" on a customer with the same phone.
+
+Comparing every customer with every other one does not scale, so
+customers are first put into blocks that duplicates are bound to share:
+
+    surname  - normalized surname + first letter of the name
+    phone    - last 9 digits of the phone number
+    person   - normalized name + patronymic (catches surname typos)
+
+and only pairs inside a block are compared, on the normalized
+(``search.normalize_search_text``) fields. Oversized blocks (a very
+common name) are skipped rather than compared pair by pair.
+
+A group is merged into the customer that has a known place and the most
+debts: every foreign key to the other customers is rewritten with one
+UPDATE per relation, the other customers are deleted and blank
+patronymic/phone/address fields are filled in from them, all in one
+transaction.
+"""
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import ChangeEvent, Customer, Debt, ReplicaKey
+from .search import normalize_search_text
+
+DEFAULT_THRESHOLD = 0.85
+
+# Blocks larger than this are not compared pair by pair
+MAX_BLOCK_SIZE = 200
+
+# Places that mean "not known"; they are no evidence of the same person
+UNKNOWN_PLACES = {'', 'unknown', 'namalum', 'neizvestno'}
+
+# Shorter words must match exactly (Əli / Əlim are two names)
+MIN_FUZZY_LENGTH = 5
+
+# Case/When branches per UPDATE
+MERGE_BATCH_SIZE = 500
+
+NON_DIGIT_RE = re.compile(r'\D+')
+
+
+def _similar(a, b, threshold):
+    if a == b:
+        return True
+    if min(len(a), len(b)) < MIN_FUZZY_LENGTH:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def _profile(values):
+    """Normalized fields of a customer, as used by the comparisons"""
+    place = normalize_search_text(values['place'])
+    digits = NON_DIGIT_RE.sub('', values['phone'] or '')
+    return {
+        'pk': values['pk'],
+        'name': normalize_search_text(values['name']),
+        'surname': normalize_search_text(values['surname']),
+        'patronymic': normalize_search_text(values['patronymic']),
+        'place': '' if place in UNKNOWN_PLACES else place,
+        'phone': digits[-9:] if len(digits) >= 7 else '',
+    }
+
+
+def _blocking_keys(profile):
+    if profile['surname']:
+        yield ('surname', profile['surname'], profile['name'][:1])
+    if profile['phone']:
+        yield ('phone', profile['phone'])
+    if profile['name'] and profile['patronymic']:
+        yield ('person', profile['name'], profile['patronymic'])
+
+
+def is_duplicate(a, b, threshold=DEFAULT_THRESHOLD):
+    """
+    Whether two customer profiles (see _profile) are the same person.
+
+    Surname and name must be similar (relatives share a home phone),
+    then the same phone or the same known place confirms it. A merge
+    cannot be undone, so a missing phone or place never does.
+    """
+    if not _similar(a['surname'], b['surname'], threshold):
+        return False
+    if not _similar(a['name'], b['name'], threshold):
+        return False
+    if a['patronymic'] and b['patronymic'] and not _similar(a['patronymic'], b['patronymic'], threshold):
+        return False
+    if a['phone'] and b['phone']:
+        # Two different phone numbers: two people
+        return a['phone'] == b['phone']
+    return bool(a['place'] and b['place']) and _similar(a['place'], b['place'], threshold)
+
+
+def find_duplicate_groups(customers=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups of duplicate customers, each a list of Customer objects with
+    the one to keep first.
+    """
+    if customers is None:
+        customers = Customer.objects.all()
+    profiles = [
+        _profile(values)
+        for values in customers.values('pk', 'name', 'surname', 'patronymic', 'place', 'phone')
+    ]
+
+    blocks = defaultdict(list)
+    for profile in profiles:
+        for key in _blocking_keys(profile):
+            blocks[key].append(profile)
+
+    # Clusters of matching customers. Two clusters are joined only if all
+    # their members match, so A~B~C does not merge A and C unless A~C.
+    cluster_of = {}
+    clusters = {}
+
+    def cluster(profile):
+        return clusters.setdefault(cluster_of.setdefault(profile['pk'], profile['pk']), [profile])
+
+    compared = set()
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                pair = (a['pk'], b['pk']) if a['pk'] < b['pk'] else (b['pk'], a['pk'])
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                if not is_duplicate(a, b, threshold):
+                    continue
+                cluster_a, cluster_b = cluster(a), cluster(b)
+                if cluster_a is cluster_b:
+                    continue
+                if all(is_duplicate(x, y, threshold) for x in cluster_a for y in cluster_b):
+                    del clusters[cluster_of[b['pk']]]
+                    for member in cluster_b:
+                        cluster_of[member['pk']] = cluster_of[a['pk']]
+                    cluster_a.extend(cluster_b)
+
+    groups = [[profile['pk'] for profile in members] for members in clusters.values() if len(members) > 1]
+    if not groups:
+        return []
+    by_pk = {profile['pk']: profile for profile in profiles}
+
+    all_pks = [pk for pks in groups for pk in pks]
+    debt_counts = dict(
+        Debt.all_objects.filter(customer_id__in=all_pks).order_by()
+        .values_list('customer_id')
+        .annotate(count=Count('id'))
+    )
+    objects = Customer.objects.in_bulk(all_pks)
+
+    def keep_order(pk):
+        return (not by_pk[pk]['place'], -debt_counts.get(pk, 0), pk)
+
+    result = [[objects[pk] for pk in sorted(pks, key=keep_order)] for pks in groups]
+    result.sort(key=lambda group: (group[0].surname, group[0].name))
+    return result
+
+
+def _customer_relations():
+    """(model, field name) of every foreign key pointing to Customer"""
+    return [
+        (relation.related_model, relation.field.name)
+        for relation in Customer._meta.related_objects
+        if relation.one_to_many or relation.one_to_one
+    ]
+
+
+def merge_customers(groups):
+    """
+    Merge each group (as returned by find_duplicate_groups) into its first
+    customer. Returns counts of merged customers and moved debts.
+    """
+    target = {}
+    survivors = {}
+    for group in groups:
+        keep = group[0]
+        survivors[keep.pk] = keep
+        for duplicate in group[1:]:
+            target[duplicate.pk] = keep.pk
+            # Keep details the survivor does not have
+            for field in ('patronymic', 'phone', 'address'):
+                if not getattr(keep, field) and getattr(duplicate, field):
+                    setattr(keep, field, getattr(duplicate, field))
+    if not target:
+        return {'merged': 0, 'debts': 0}
+
+    now = timezone.now()
+    moved_debts = 0
+    with transaction.atomic():
+        duplicates = list(target)
+        for start in range(0, len(duplicates), MERGE_BATCH_SIZE):
+            batch = duplicates[start:start + MERGE_BATCH_SIZE]
+            for model, field in _customer_relations():
+                column = f'{field}_id'
+                changes = {
+                    column: Case(
+                        *[When(**{column: pk}, then=Value(target[pk])) for pk in batch],
+                        output_field=IntegerField(),
+                    ),
+                }
+                rows = model._base_manager.filter(**{f'{column}__in': batch})
+                if model is Debt:
+                    # Bulk UPDATE bypasses auto_now; rendered rows must change version
+                    changes['updated_at'] = now
+                    changes['version'] = F('version') + 1
+                    moved = list(rows.values_list('pk', flat=True))
+                updated = rows.update(**changes)
+                if model is Debt:
+                    ChangeEvent.record(Debt, moved, 'update')
+                    moved_debts += updated
+            # Branch customers imported into a duplicate now arrive at the survivor
+            ReplicaKey.objects.filter(model='customer', local_id__in=batch).update(
+                local_id=Case(
+                    *[When(local_id=pk, then=Value(target[pk])) for pk in batch],
+                    output_field=IntegerField(),
+                ),
+            )
+
+        # Duplicates go first: a filled-in patronymic may give the survivor their exact key
+        Customer.objects.filter(pk__in=duplicates).delete()
+        for keep in survivors.values():
+            keep.search_key = keep.build_search_key()
+        Customer.objects.bulk_update(
+            survivors.values(), ['patronymic', 'phone', 'address', 'search_key'], batch_size=MERGE_BATCH_SIZE
+        )
+        ChangeEvent.record(Customer, list(survivors), 'update')
+        # Moved debts carry the old customer's name in their search key
+        Debt.refresh_search_keys(Debt.all_objects.filter(customer_id__in=list(survivors)))
+
+    return {'merged': len(target), 'debts': moved_debts}
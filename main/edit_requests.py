@@ -0,0 +1,108 @@
+"""
+Debt edit requests: cashiers ask, admins approve or reject.
+
+A cashier cannot change a debt, they submit a DebtEditRequest with the
+new amount and/or paid date and a reason. Admins work through the
+pending queue and can approve many requests at once: the changes are
+applied with one ``bulk_update`` of the debts and one UPDATE of the
+requests, in a single transaction (BEGIN IMMEDIATE on SQLite, so the
+debts cannot change between the check and the write).
+
+The number of pending requests is shown on every admin page (navbar
+badge). It is counted on each render: the queue index (status,
+created_at) makes that a small index-only COUNT, and a per-process
+cache would go stale in the other server workers.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .fields import local_date
+from .models import ChangeEvent, Debt, DebtEditRequest
+
+# Requests per batch approval; keeps the CASE expressions of bulk_update small
+MAX_BATCH_REVIEW = 500
+
+
+def pending_count():
+    """Number of pending edit requests"""
+    return DebtEditRequest.objects.filter(status='pending').count()
+
+
+def submit_edit_request(debt, cashier, reason, requested_amount=None, requested_paid_date=None):
+    """Create a pending request to change ``debt``"""
+    return DebtEditRequest.objects.create(
+        debt=debt,
+        requested_by=cashier,
+        requested_amount=requested_amount,
+        requested_paid_date=requested_paid_date,
+        reason=reason,
+    )
+
+
+def _check(edit_request, debt):
+    """Why the request cannot be applied to the debt as it is now (None if it can)"""
+    if debt.is_deleted:
+        return _('Borc silinib')
+    amount = edit_request.requested_amount
+    if amount is not None and amount < debt.paid_total:
+        return _('Məbləğ ödənilmiş məbləğdən ({paid}₼) az ola bilməz.').format(paid=debt.paid_total)
+    return None
+
+
+def approve_requests(request_ids, reviewer, review_notes=''):
+    """
+    Apply and approve the pending requests ``request_ids`` (at most
+    MAX_BATCH_REVIEW). Requests that no longer fit their debt (deleted,
+    amount below what is already paid) stay pending and are returned in
+    ``failed`` as ``(request, reason)``. Returns ``{'approved', 'failed'}``.
+    """
+    request_ids = list(request_ids)[:MAX_BATCH_REVIEW]
+    now = timezone.now()
+    with transaction.atomic():
+        requests = list(
+            DebtEditRequest.objects.filter(pk__in=request_ids, status='pending')
+            .select_related('debt__customer')
+            .order_by('created_at', 'pk')
+        )
+        approved = []
+        failed = []
+        changed = {}
+        for edit_request in requests:
+            # One instance per debt, so several requests for it add up
+            debt = changed.get(edit_request.debt_id, edit_request.debt)
+            reason = _check(edit_request, debt)
+            if reason:
+                failed.append((edit_request, reason))
+                continue
+            # Later requests for the same debt win, in the order they were made
+            if edit_request.requested_amount is not None:
+                debt.amount = edit_request.requested_amount
+            if edit_request.requested_paid_date is not None:
+                debt.paid_date = edit_request.requested_paid_date
+                debt.paid_local_date = local_date(debt.paid_date)
+            changed[debt.pk] = debt
+            approved.append(edit_request)
+
+        if changed:
+            for debt in changed.values():
+                # bulk_update bypasses auto_now; open edit forms must see the change
+                debt.updated_at = now
+                debt.version = F('version') + 1
+            Debt.all_objects.bulk_update(
+                changed.values(), ['amount', 'paid_date', 'paid_local_date', 'updated_at', 'version']
+            )
+            ChangeEvent.record(Debt, list(changed), 'update')
+        if approved:
+            DebtEditRequest.objects.filter(pk__in=[r.pk for r in approved]).update(
+                status='approved', reviewed_by=reviewer, reviewed_at=now, review_notes=review_notes or None,
+            )
+    return {'approved': approved, 'failed': failed}
+
+
+def reject_requests(request_ids, reviewer, review_notes=''):
+    """Reject the pending requests ``request_ids``; returns how many were rejected"""
+    return DebtEditRequest.objects.filter(pk__in=list(request_ids), status='pending').update(
+        status='rejected', reviewed_by=reviewer, reviewed_at=timezone.now(), review_notes=review_notes or None,
+    )
@@ -0,0 +1,148 @@
+"""
+Incremental operation events for the live admin feed (Server-Sent Events).
+
+Events are read back from the database rather than pushed from
+``save()``: the server may run several worker processes, and only rows
+that are committed are visible here. A cursor remembers the last seen
+debt and payment ids plus a timestamp for status changes (full payment
+via ``mark_as_paid`` and soft deletes).
+
+Event types:
+    debt_given    - a new debt was created
+    payment       - a payment was recorded (``debt_paid`` if it settled the debt)
+    full_payment  - a debt was marked paid without covering payments
+    debt_deleted  - a debt was soft deleted
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Debt, Payment
+
+# Status changes are read with a small overlap so rows committed just
+# after their timestamp was taken are not missed; duplicates are dropped.
+STATUS_OVERLAP = timedelta(seconds=5)
+
+
+def _customer_display(customer):
+    return f"{customer.surname} {customer.name}".strip()
+
+
+def _month(value):
+    return timezone.localtime(value).strftime('%Y-%m') if value else ''
+
+
+def initial_cursor(token=None):
+    """Cursor from a Last-Event-ID token, or positioned at 'now'"""
+    if token:
+        try:
+            debt_id, payment_id, since = token.split(':', 2)
+            return {
+                'debt_id': int(debt_id),
+                'payment_id': int(payment_id),
+                'since': datetime.fromisoformat(since),
+                'seen': set(),
+            }
+        except (ValueError, TypeError):
+            pass
+    return {
+        'debt_id': Debt.all_objects.aggregate(last=Max('id'))['last'] or 0,
+        'payment_id': Payment.objects.aggregate(last=Max('id'))['last'] or 0,
+        'since': timezone.now(),
+        'seen': set(),
+    }
+
+
+def cursor_token(cursor):
+    """Serialize a cursor into an SSE event id"""
+    return f"{cursor['debt_id']}:{cursor['payment_id']}:{cursor['since'].isoformat()}"
+
+
+def collect_operation_events(cursor):
+    """Return (events, cursor) with everything committed after the cursor"""
+    now = timezone.now()
+    today = timezone.localdate()
+    since = cursor['since'] - STATUS_OVERLAP
+    events = []
+
+    new_debts = Debt.all_objects.filter(id__gt=cursor['debt_id']).select_related('customer', 'cashier').order_by('id')
+    for debt in new_debts:
+        cursor['debt_id'] = debt.id
+        events.append({
+            'type': 'debt_given',
+            'debt_id': debt.id,
+            'customer': _customer_display(debt.customer),
+            'cashier': str(debt.cashier),
+            'amount': str(debt.amount),
+            'is_overdue': debt.promise_date < today,
+            'month': _month(debt.date_given),
+        })
+
+    new_payments = Payment.objects.filter(id__gt=cursor['payment_id']).select_related(
+        'debt__customer', 'debt__cashier'
+    ).order_by('id')
+    for payment in new_payments:
+        cursor['payment_id'] = payment.id
+        debt = payment.debt
+        events.append({
+            'type': 'payment',
+            'debt_id': debt.id,
+            'payment_id': payment.id,
+            'customer': _customer_display(debt.customer),
+            'cashier': str(debt.cashier),
+            'amount': str(payment.amount),
+            'method': payment.payment_method,
+            'debt_paid': debt.is_paid,
+            'is_overdue': debt.promise_date < today,
+            'month': _month(payment.payment_date),
+        })
+
+    # Debts settled by mark_as_paid (paid_date set to "now", no covering payment)
+    fully_paid = Debt.all_objects.filter(
+        is_paid=True, paid_date__gte=since, updated_at__gte=since, id__lte=cursor['debt_id']
+    ).select_related('customer', 'cashier')
+    for debt in fully_paid:
+        remaining = debt.amount - debt.paid_total
+        key = ('full_payment', debt.id)
+        if remaining <= 0 or key in cursor['seen']:
+            continue
+        cursor['seen'].add(key)
+        events.append({
+            'type': 'full_payment',
+            'debt_id': debt.id,
+            'customer': _customer_display(debt.customer),
+            'cashier': str(debt.cashier),
+            'amount': str(remaining),
+            'method': debt.payment_method,
+            'is_overdue': debt.promise_date < today,
+            'month': _month(debt.paid_date),
+        })
+
+    deleted = Debt.all_objects.filter(
+        is_deleted=True, deleted_at__gte=since
+    ).select_related('customer', 'cashier')
+    for debt in deleted:
+        key = ('debt_deleted', debt.id)
+        if key in cursor['seen']:
+            continue
+        cursor['seen'].add(key)
+        remaining = Decimal('0') if debt.is_paid else debt.amount - debt.paid_total
+        events.append({
+            'type': 'debt_deleted',
+            'debt_id': debt.id,
+            'customer': _customer_display(debt.customer),
+            'cashier': str(debt.cashier),
+            'amount': str(debt.amount),
+            'remaining': str(remaining),
+            'was_paid': debt.is_paid,
+            'is_overdue': not debt.is_paid and debt.promise_date < today,
+            'month': _month(debt.date_given),
+        })
+
+    # Forget dedupe keys that fell out of the overlap window
+    if len(cursor['seen']) > 1000:
+        cursor['seen'].clear()
+    cursor['since'] = now
+    return events, cursor
@@ -0,0 +1,118 @@
+"""
+Model fields shared by the debt models.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+# qəpik in one manat
+MINOR_UNITS = 100
+
+CENT = Decimal('0.01')
+
+
+def local_date(value):
+    """Calendar date of an aware datetime in TIME_ZONE (Asia/Baku); None stays None"""
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        return value.date()
+    return timezone.localtime(value, timezone.get_default_timezone()).date()
+
+
+class LocalDateField(models.DateField):
+    """
+    The TIME_ZONE date of another DateTimeField of the model (``source``).
+
+    Kept in step like ``auto_now``: computed in ``pre_save``, so it is set
+    by ``save()`` and ``bulk_create()``. ``QuerySet.update()`` and
+    ``bulk_update()`` that change the source must set it themselves.
+    Day and month reports filter and group on it with plain indexed
+    comparisons instead of converting timestamps in SQL.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = local_date(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def to_minor_units(amount):
+    """Manat amount (Decimal, int, str or float) as whole qəpik; rounds half up"""
+    if amount is None:
+        return None
+    if isinstance(amount, float):
+        amount = str(amount)
+    return int((Decimal(amount) * MINOR_UNITS).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(value):
+    """Whole qəpik (as stored) as a manat Decimal with two places"""
+    if value is None:
+        return None
+    return Decimal(int(value)).scaleb(-2)
+
+
+class MoneyField(models.BigIntegerField):
+    """
+    A manat amount stored as an integer number of qəpik.
+
+    The model, forms and ``values()`` see ``Decimal('12.50')``, the
+    database column holds 1250, so ``SUM()`` is exact integer arithmetic
+    on every backend. Plain values in filters and updates are converted;
+    expressions are not: wrap amounts as ``Value(amount,
+    output_field=MoneyField())`` and give arithmetic on money columns
+    ``output_field=MoneyField()`` to get manat back instead of qəpik.
+    """
+    description = _('Məbləğ (qəpik)')
+    default_error_messages = {
+        'invalid': _('“%(value)s” dəyəri onluq ədəd olmalıdır.'),
+    }
+
+    def from_db_value(self, value, expression, connection):
+        return from_minor_units(value)
+
+    def to_python(self, value):
+        if value is None:
+            return None
+        try:
+            return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+        except InvalidOperation:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        try:
+            return to_minor_units(value)
+        except (InvalidOperation, TypeError, ValueError) as e:
+            raise e.__class__(f"Field '{self.name}' expected a number but got {value!r}.") from e
+
+    def formfield(self, **kwargs):
+        # Skip IntegerField.formfield: the form works in manat
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': 10,
+            'decimal_places': 2,
+            **kwargs,
+        })
@@ -1,8 +1,15 @@
+import os
+
 from django import forms
 from django.contrib.auth.models import User
+from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import Cashier, Customer, Debt, Payment
+from .models import Cashier, Customer, Debt, DebtEditRequest, Payment
+from .services import MAX_BATCH_PAYMENTS
+from .utils import (
+    parse_csv_file, parse_excel_file, parse_payment_rows, payment_cells_from_file, payment_cells_from_text,
+)
 
 
 class CashierForm(forms.ModelForm):
@@ -151,17 +158,57 @@ class DebtForm(forms.ModelForm):
         }
 
 
+class CustomerAutocompleteWidget(forms.HiddenInput):
+    """
+    Customer picker backed by the customer search API.
+
+    Renders the selected customer id in a hidden input plus a text box
+    that searches remotely, instead of a <select> with every customer.
+    """
+    template_name = 'main/widgets/customer_autocomplete.html'
+
+    def __init__(self, attrs=None, search_url=reverse_lazy('customer_search_api')):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.selected = None
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['search_url'] = str(self.search_url)
+        context['widget']['label'] = self.label_for(value)
+        return context
+
+    def label_for(self, value):
+        """Display text for the selected customer (one lookup at most)"""
+        if value in (None, ''):
+            return ''
+        if self.selected is not None and str(self.selected.pk) == str(value):
+            return str(self.selected)
+        customer = Customer.objects.filter(pk=value).first()
+        return str(customer) if customer else ''
+
+
 class DebtEditForm(forms.ModelForm):
     """Form for editing debts - only admins can use this"""
+    # Version of the debt the form was rendered with, checked on save
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
     
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance and self.instance.pk:
+            self.fields['version'].initial = self.instance.version
+        
+        # Stored balance, reused by the help text and clean_amount
+        self.paid_amount = 0
+        if self.instance and self.instance.pk:
+            self.paid_amount = self.instance.paid_total
         
-        # Always allow editing customer - use Select widget
+        # Always allow editing customer - remote search instead of a full <select>
         if 'customer' in self.fields:
-            from .models import Customer
-            self.fields['customer'].queryset = Customer.objects.all().order_by('surname', 'name')
-            self.fields['customer'].widget.attrs.update({'class': 'form-control'})
+            widget = CustomerAutocompleteWidget()
+            if self.instance and self.instance.customer_id:
+                widget.selected = self.instance.customer
+            self.fields['customer'].widget = widget
         
         # Format paid_date for datetime-local input if it exists
         if 'paid_date' in self.fields and self.instance and self.instance.paid_date:
@@ -182,12 +229,12 @@ class DebtEditForm(forms.ModelForm):
             self.fields['amount'].widget.attrs.update({'class': 'form-control'})
             # Add warning if there are payments
             if self.instance and self.instance.pk:
-                paid_amount = self.instance.paid_amount
+                paid_amount = self.paid_amount
                 if paid_amount > 0:
                     self.fields['amount'].help_text = _('XƏBƏRDARLIQ: Bu borcda artıq {paid}₼ ödəniş var. Məbləği dəyişdikdə qalan məbləğ yenidən hesablanacaq. Hazırkı məbləğ: {current}₼, Ödənilmiş: {paid}₼, Qalan: {remaining}₼').format(
                         paid=paid_amount,
                         current=self.instance.amount,
-                        remaining=self.instance.remaining_amount
+                        remaining=self.instance.amount - paid_amount
                     )
         if 'paid_date' in self.fields:
             self.fields['paid_date'].widget.attrs.update({'class': 'form-control', 'type': 'datetime-local'})
@@ -198,7 +245,7 @@ class DebtEditForm(forms.ModelForm):
         """Validate amount - ensure it's not less than paid amount"""
         amount = self.cleaned_data.get('amount')
         if self.instance and self.instance.pk:
-            paid_amount = self.instance.paid_amount
+            paid_amount = self.paid_amount
             if amount and paid_amount > 0 and amount < paid_amount:
                 raise forms.ValidationError(
                     _('Məbləğ ödənilmiş məbləğdən ({paid}₼) az ola bilməz.').format(paid=paid_amount)
@@ -224,11 +271,18 @@ class DebtEditForm(forms.ModelForm):
             paid_date = local_tz.localize(paid_date)
         return paid_date
     
+    def save(self, commit=True):
+        """Save only if nobody changed the debt since the form was shown (raises DebtConflict)"""
+        debt = super().save(commit=False)
+        if commit:
+            debt.save_if_unchanged(self._meta.fields, version=self.cleaned_data.get('version'))
+        return debt
+    
     class Meta:
         model = Debt
         fields = ['customer', 'amount', 'date_given', 'promise_date', 'description', 'paid_date', 'payment_method']
         widgets = {
-            'customer': forms.Select(attrs={'class': 'form-control'}),
+            'customer': CustomerAutocompleteWidget(),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'date_given': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
             'promise_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
@@ -238,6 +292,46 @@ class DebtEditForm(forms.ModelForm):
         }
 
 
+class DebtEditRequestForm(forms.ModelForm):
+    """Form for a cashier's request to change a debt (approved by an admin)"""
+    
+    def __init__(self, *args, debt=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.debt = debt
+        self.fields['reason'].widget.attrs.update({'class': 'form-control', 'rows': 3})
+        if debt:
+            self.fields['requested_amount'].help_text = _('Hazırkı məbləğ: {amount}₼').format(amount=debt.amount)
+    
+    def clean_requested_amount(self):
+        amount = self.cleaned_data.get('requested_amount')
+        if self.debt and amount is not None and amount < self.debt.paid_total:
+            raise forms.ValidationError(
+                _('Məbləğ ödənilmiş məbləğdən ({paid}₼) az ola bilməz.').format(paid=self.debt.paid_total)
+            )
+        return amount
+    
+    def clean_requested_paid_date(self):
+        """Convert naive datetime from datetime-local input to timezone-aware datetime"""
+        paid_date = self.cleaned_data.get('requested_paid_date')
+        if paid_date and timezone.is_naive(paid_date):
+            paid_date = timezone.make_aware(paid_date)
+        return paid_date
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('requested_amount') is None and cleaned_data.get('requested_paid_date') is None:
+            raise forms.ValidationError(_('Yeni məbləğ və ya yeni ödəniş tarixi daxil edin.'))
+        return cleaned_data
+    
+    class Meta:
+        model = DebtEditRequest
+        fields = ['requested_amount', 'requested_paid_date', 'reason']
+        widgets = {
+            'requested_amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0'}),
+            'requested_paid_date': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        }
+
+
 class PaymentForm(forms.ModelForm):
     """Form for adding partial payments"""
     
@@ -323,4 +417,107 @@ class CustomerImportForm(forms.Form):
         label=_('Boş sətirləri atla'),
         help_text=_('Konтрагент (Müqavilə tərəfi) boş olan sətirləri xəta göstərmək əvəzinə atla'),
         widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
-    )
\ No newline at end of file
+    )
+
+class PaymentBatchForm(forms.Form):
+    """Many payments at once: pasted rows or an uploaded CSV/Excel file"""
+    rows = forms.CharField(
+        required=False,
+        label=_('Ödəniş sətirləri'),
+        help_text=_('Hər sətirdə: borc nömrəsi; məbləğ; ödəniş üsulu; tarix (istəyə bağlı). Excel-dən birbaşa yapışdırmaq olar.'),
+        widget=forms.Textarea(attrs={
+            'class': 'form-control font-monospace',
+            'rows': 10,
+            'placeholder': '125; 20,00; nağd; 19.10.2026 18:30\n131; 15.50; kart',
+        })
+    )
+    file = forms.FileField(
+        required=False,
+        label=_('və ya fayl (CSV və ya Excel)'),
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx,.xls'
+        })
+    )
+    skip_invalid = forms.BooleanField(
+        required=False,
+        initial=False,
+        label=_('Səhv sətirləri atla'),
+        help_text=_('İşarələnərsə, düzgün sətirlər qeyd edilir, səhvlilər hesabatda göstərilir. İşarələnməzsə, bir səhv olduqda heç nə qeyd edilmir.'),
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        text = cleaned_data.get('rows')
+        file = cleaned_data.get('file')
+        if not text and not file:
+            raise forms.ValidationError(_('Ödəniş sətirlərini daxil edin və ya fayl yükləyin.'))
+
+        try:
+            cells = payment_cells_from_file(file) if file else payment_cells_from_text(text)
+        except ImportError:
+            raise forms.ValidationError(_('Excel faylları üçün openpyxl quraşdırılmalıdır: pip install openpyxl'))
+        except Exception:
+            raise forms.ValidationError(_('Faylı oxumaq mümkün olmadı. CSV və ya Excel faylı yükləyin.'))
+
+        payment_rows = parse_payment_rows(cells)
+        if not payment_rows:
+            raise forms.ValidationError(_('Heç bir ödəniş sətri tapılmadı.'))
+        if len(payment_rows) > MAX_BATCH_PAYMENTS:
+            raise forms.ValidationError(
+                _('Bir dəfədə ən çox {count} ödəniş qeyd etmək olar.').format(count=MAX_BATCH_PAYMENTS)
+            )
+        cleaned_data['payment_rows'] = payment_rows
+        return cleaned_data
+
+
+class DebtImportForm(forms.Form):
+    """Debts from a 1C sales export (CSV or Excel)"""
+    file = forms.FileField(
+        label=_('Fayl seçin (CSV və ya Excel)'),
+        help_text=_('1C-dən ixrac edilmiş satış faylı. Dəstəklənən formatlar: .csv, .xlsx, .xls'),
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx,.xls'
+        })
+    )
+    cashier = forms.ModelChoiceField(
+        queryset=Cashier.objects.all(),
+        required=False,
+        label=_('Kassir'),
+        empty_label=_('Fayldakı "Kassir" sütunundan'),
+        help_text=_('Bütün borclar bu kassirə yazılır. Boş qalarsa, hər sətrin kassiri fayldan götürülür.'),
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    promise_days = forms.IntegerField(
+        min_value=0,
+        initial=30,
+        label=_('Vəd müddəti (gün)'),
+        help_text=_('Faylda vəd tarixi olmayan borclar üçün: borc tarixindən sonra neçə gün.'),
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, is_admin=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cashiers always import into their own profile
+        if not is_admin:
+            del self.fields['cashier']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        file = cleaned_data.get('file')
+        if not file:
+            return cleaned_data
+
+        extension = os.path.splitext(file.name)[1].lower()
+        if extension not in ('.csv', '.xlsx', '.xls'):
+            raise forms.ValidationError(_('Dəstəklənməyən fayl formatı. Zəhmət olmasa CSV və ya Excel faylı yükləyin.'))
+        try:
+            data_rows = parse_csv_file(file) if extension == '.csv' else parse_excel_file(file)
+        except ImportError:
+            raise forms.ValidationError(_('Excel faylları üçün openpyxl quraşdırılmalıdır: pip install openpyxl'))
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        cleaned_data['data_rows'] = data_rows
+        return cleaned_data
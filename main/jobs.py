@@ -0,0 +1,81 @@
+"""
+Jobs run by ``manage.py run_scheduler`` (see ``main.scheduler``).
+
+Times are local (Asia/Baku) and fall in the night, after closing: the
+backup first, then archiving (which rebuilds the archive's monthly
+rollup used by the dashboards), then the database maintenance inside
+``MAINTENANCE_WINDOW`` and the small clean-ups. A branch server (with a
+``BRANCH_CODE``) also exports its changes for head office.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from .archive import archive_settled_debts
+from .backups import backup_database, database_path
+from .branch_sync import export_changes
+from .maintenance import run_maintenance
+from .models import JobRun
+from .outbox import prune_changes
+from .scheduler import job
+
+JOB_RUN_HISTORY_DAYS = 90
+
+
+@job('backup', '30 1 * * *')
+def backup():
+    """Compressed, verified snapshot of the database (and the reports copy)"""
+    reports_copy = settings.REPORTS_DATABASE
+    if reports_copy.resolve() == database_path().resolve():
+        reports_copy = None
+    result = backup_database(settings.BACKUP_DIR, settings.BACKUP_KEEP, reports_copy=reports_copy)
+    return f'{result["path"].name} ({filesizeformat(result["compressed"])}), {len(result["deleted"])} old deleted'
+
+
+@job('archive_debts', '0 3 * * *')
+def archive_debts():
+    """Move debts settled long ago to the archive and refresh its monthly rollup"""
+    result = archive_settled_debts()
+    return f'{result["debts"]} debt(s), {result["payments"]} payment(s) archived'
+
+
+@job('maintain_database', '0 4 * * *')
+def maintain_database():
+    """ANALYZE, incremental vacuum and WAL checkpoint"""
+    result = run_maintenance()
+    return (
+        f'{filesizeformat(result["before"]["size"])} → {filesizeformat(result["after"]["size"])}, '
+        f'checkpoint {"incomplete" if result["checkpoint"]["busy"] else "done"}'
+    )
+
+
+@job('clear_sessions', '30 4 * * *')
+def clear_sessions():
+    """Delete expired login sessions"""
+    call_command('clearsessions')
+
+
+@job('prune_job_runs', '45 4 * * 0')
+def prune_job_runs():
+    """Forget job runs older than JOB_RUN_HISTORY_DAYS"""
+    deleted, _ = JobRun.objects.filter(
+        started_at__lt=timezone.now() - timedelta(days=JOB_RUN_HISTORY_DAYS)
+    ).delete()
+    return f'{deleted} run(s) deleted'
+
+
+@job('prune_outbox', '50 4 * * 0')
+def prune_outbox():
+    """Delete old change events that every consumer has read"""
+    return f'{prune_changes()} event(s) deleted'
+
+
+if settings.BRANCH_CODE:
+    @job('sync_export', '15 1 * * *')
+    def sync_export():
+        """Write the day's changes as batch files for head office"""
+        paths = export_changes(settings.SYNC_DIR / 'outbox')
+        return ', '.join(path.name for path in paths) or 'no changes'
@@ -0,0 +1,129 @@
+"""
+Routine maintenance of the SQLite database.
+
+Soft deletes, archiving and ``updated_at`` churn leave free pages in
+``db.sqlite3`` and half-empty pages in its tables and indexes, and the
+query planner only knows about the indexes' selectivity after ANALYZE.
+``run_maintenance`` (``manage.py maintain_database``) does, in order:
+
+    ANALYZE + PRAGMA optimize   refresh the planner statistics
+    PRAGMA incremental_vacuum   give free pages back to the file system
+    PRAGMA wal_checkpoint       copy the WAL into the database and truncate it
+
+Incremental vacuum needs ``auto_vacuum=INCREMENTAL``. New databases get
+it from the connection settings; an existing file is switched once with
+a full VACUUM (``enable_incremental_vacuum``), which rewrites the whole
+file and blocks writers while it runs, so it belongs in the maintenance
+window (``MAINTENANCE_WINDOW``, off-hours) like the rest.
+
+``database_report`` lists the size of every table and index and how
+full its pages are (from the ``dbstat`` table, when SQLite has it).
+"""
+from datetime import time
+
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+AUTO_VACUUM_INCREMENTAL = 2
+# Rows ANALYZE looks at per index; enough for the planner, fast on big tables
+ANALYSIS_LIMIT = 1000
+
+
+def _pragma(cursor, statement):
+    cursor.execute(f'PRAGMA {statement}')
+    return cursor.fetchone()
+
+
+def file_stats(using='default'):
+    """``{'size', 'free', 'page_size', 'auto_vacuum'}`` of the database file (bytes)"""
+    with connections[using].cursor() as cursor:
+        page_size = _pragma(cursor, 'page_size')[0]
+        return {
+            'size': _pragma(cursor, 'page_count')[0] * page_size,
+            'free': _pragma(cursor, 'freelist_count')[0] * page_size,
+            'page_size': page_size,
+            'auto_vacuum': _pragma(cursor, 'auto_vacuum')[0],
+        }
+
+
+def database_report(using='default'):
+    """
+    Tables and indexes by size: ``[{'name', 'table', 'kind', 'size',
+    'unused', 'fill'}]`` (bytes; ``fill`` is the used share of their
+    pages). Empty when SQLite was built without ``dbstat``.
+    """
+    with connections[using].cursor() as cursor:
+        try:
+            cursor.execute(
+                """
+                SELECT s.name, m.tbl_name, m.type, SUM(s.pgsize), SUM(s.unused)
+                FROM dbstat AS s JOIN sqlite_master AS m ON m.name = s.name
+                GROUP BY s.name
+                ORDER BY SUM(s.pgsize) DESC
+                """
+            )
+        except OperationalError:
+            return []
+        return [
+            {
+                'name': name,
+                'table': table,
+                'kind': kind,
+                'size': size,
+                'unused': unused,
+                'fill': 1 - unused / size if size else 1,
+            }
+            for name, table, kind, size, unused in cursor.fetchall()
+        ]
+
+
+def enable_incremental_vacuum(using='default'):
+    """Switch the file to ``auto_vacuum=INCREMENTAL`` (full VACUUM, blocks writers)"""
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+def run_maintenance(vacuum_pages=None, using='default'):
+    """
+    Analyze, vacuum up to ``vacuum_pages`` free pages (all by default)
+    and checkpoint the WAL. Returns ``{'before', 'after', 'vacuumed',
+    'checkpoint'}``; ``vacuumed`` is False when the file is not in
+    incremental auto-vacuum mode.
+    """
+    before = file_stats(using)
+    with connections[using].cursor() as cursor:
+        _pragma(cursor, f'analysis_limit={ANALYSIS_LIMIT}')
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+
+        vacuumed = before['auto_vacuum'] == AUTO_VACUUM_INCREMENTAL
+        if vacuumed:
+            # The pragma frees one page per step; executescript steps it to the end
+            connections[using].connection.executescript(
+                'PRAGMA incremental_vacuum' if vacuum_pages is None else f'PRAGMA incremental_vacuum({int(vacuum_pages)})'
+            )
+
+        # (busy, WAL frames, frames checkpointed); busy when a reader holds an old snapshot
+        checkpoint = _pragma(cursor, 'wal_checkpoint(TRUNCATE)')
+    return {
+        'before': before,
+        'after': file_stats(using),
+        'vacuumed': vacuumed,
+        'checkpoint': {'busy': bool(checkpoint[0]), 'frames': checkpoint[1], 'checkpointed': checkpoint[2]},
+    }
+
+
+def parse_window(window):
+    """``'02:00-05:00'`` -> (time(2), time(5)); raises ValueError"""
+    start, end = window.split('-')
+    return time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+
+
+def in_window(window, now=None):
+    """Whether the local time ``now`` falls in ``window`` (may pass midnight)"""
+    start, end = parse_window(window)
+    current = (now or timezone.localtime()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
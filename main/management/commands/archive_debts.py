@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.archive import DEFAULT_BATCH_SIZE, DEFAULT_MONTHS, archive_settled_debts
+
+
+class Command(BaseCommand):
+    help = 'Move debts settled or deleted long ago, with their payments, to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=DEFAULT_MONTHS,
+            help=f'Archive debts settled or deleted more than this many months ago (default: {DEFAULT_MONTHS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Debts moved per transaction (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count what would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        result = archive_settled_debts(
+            months=options['months'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        cutoff = result['cutoff'].strftime('%d.%m.%Y')
+        if options['dry_run']:
+            self.stdout.write(
+                f'{result["debts"]} debt(s) and {result["payments"]} payment(s) settled before {cutoff} would be archived'
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Archived {result["debts"]} debt(s) and {result["payments"]} payment(s) settled before {cutoff}'
+        ))
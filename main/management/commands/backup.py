@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from main.backups import (
+    DEFAULT_PAGES, BackupError, backup_database, database_path, list_snapshots, restore_database,
+)
+
+
+class Command(BaseCommand):
+    help = 'Back up the running SQLite database (compressed, verified snapshots) or restore a snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=settings.BACKUP_DIR,
+            help=f'Snapshot directory (default: BACKUP_DIR, {settings.BACKUP_DIR})',
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=settings.BACKUP_KEEP,
+            help=f'Snapshots to keep, older ones are deleted (default: {settings.BACKUP_KEEP})',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=DEFAULT_PAGES,
+            help=f'Database pages copied per step (default: {DEFAULT_PAGES})',
+        )
+        parser.add_argument(
+            '--reports',
+            action='store_true',
+            help='Also refresh the REPORTS_DATABASE copy from the snapshot',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the snapshots and exit',
+        )
+        parser.add_argument(
+            '--restore',
+            metavar='SNAPSHOT',
+            help='Replace the database with this snapshot (the current data is backed up first)',
+        )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation before restoring',
+        )
+
+    def handle(self, *args, **options):
+        if options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+        if options['pages'] < 1:
+            raise CommandError('--pages must be at least 1')
+
+        if options['list']:
+            for path in list_snapshots(options['dir']):
+                self.stdout.write(f'{path.name}  {filesizeformat(path.stat().st_size)}')
+            return
+        try:
+            if options['restore']:
+                self._restore(options)
+            else:
+                self._backup(options)
+        except BackupError as exc:
+            raise CommandError(str(exc)) from exc
+
+    def _backup(self, options):
+        reports_copy = None
+        if options['reports']:
+            reports_copy = settings.REPORTS_DATABASE
+            if reports_copy.resolve() == database_path().resolve():
+                raise CommandError('REPORTS_DATABASE is not set, the reports read the live database')
+
+        result = backup_database(
+            options['dir'], options['keep'], pages=options['pages'], reports_copy=reports_copy,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {result["path"]} ({filesizeformat(result["size"])}, '
+            f'{filesizeformat(result["compressed"])} compressed, integrity ok)'
+        ))
+        if reports_copy:
+            self.stdout.write(f'  Reports copy refreshed: {reports_copy}')
+        for path in result['deleted']:
+            self.stdout.write(f'  Deleted old snapshot {path.name}')
+
+    def _restore(self, options):
+        snapshot = options['restore']
+        if options['interactive']:
+            answer = input(
+                f'This replaces ALL data in {database_path()} with {snapshot}.\n'
+                "Type 'yes' to continue: "
+            )
+            if answer != 'yes':
+                self.stdout.write('Restore cancelled')
+                return
+
+        saved = restore_database(snapshot, options['dir'], pages=options['pages'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Restored {snapshot}'))
+        self.stdout.write(f'  The previous data was saved to {saved}')
@@ -0,0 +1,114 @@
+import statistics
+import time
+from copy import deepcopy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from main.middleware import BROTLI_QUALITY
+
+# The largest pages of the application
+DEFAULT_PAGES = [
+    'admin_dashboard',
+    'admin_all_debts',
+    'customer_list',
+    'reminders',
+    'todays_operations',
+]
+
+
+def _template_profiles():
+    """(name, TEMPLATES) for the development and production profiles"""
+    base = deepcopy(settings.TEMPLATES)
+    base[0].pop('APP_DIRS', None)
+    base[0]['OPTIONS'].pop('loaders', None)
+
+    development = deepcopy(base)
+    development[0]['APP_DIRS'] = True
+    development[0]['OPTIONS']['debug'] = True
+
+    production = deepcopy(base)
+    production[0]['APP_DIRS'] = False
+    production[0]['OPTIONS']['debug'] = False
+    production[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+    return [('development', development), ('production', production)]
+
+
+class Command(BaseCommand):
+    help = 'Measure render time and compressed size of the largest pages (development vs production profile)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username to render the pages as (admin pages need a staff user)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Renders per page and profile (default: 20)',
+        )
+        parser.add_argument(
+            'pages',
+            nargs='*',
+            help=f'URL names to measure (default: {", ".join(DEFAULT_PAGES)})',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' not found")
+
+        repeat = max(1, options['repeat'])
+        pages = options['pages'] or DEFAULT_PAGES
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+        self.stdout.write(
+            f"{'page':<20} {'profile':<12} {'median ms':>10} {'html':>10} {'gzip':>10} {'br':>10}"
+        )
+        for name in pages:
+            url = reverse(name)
+            for profile, templates in _template_profiles():
+                with override_settings(TEMPLATES=templates, DEBUG=profile == 'development'):
+                    client = Client(SERVER_NAME=host)
+                    client.force_login(user)
+                    timings = []
+                    content = b''
+                    # One warm-up render fills the template cache (production)
+                    for i in range(repeat + 1):
+                        # Measure rendering, not the rendered-table cache
+                        cache.clear()
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        elapsed = time.perf_counter() - start
+                        if response.status_code != 200:
+                            raise CommandError(f'{url} returned {response.status_code} for {user.username}')
+                        if i:
+                            timings.append(elapsed * 1000)
+                        content = response.content
+
+                gzip_size = len(compress_string(content))
+                br_size = len(brotli.compress(content, quality=BROTLI_QUALITY)) if brotli else 0
+                self.stdout.write(
+                    f"{name:<20} {profile:<12} {statistics.median(timings):>10.1f} "
+                    f"{len(content):>10} {gzip_size:>10} {br_size or '-':>10}"
+                )
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark finished'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.dedup import DEFAULT_THRESHOLD, find_duplicate_groups, merge_customers
+
+
+class Command(BaseCommand):
+    help = 'Find duplicate customers (spelling variants, empty patronymic, unknown place) and merge them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Merge the groups found (default: only list them)',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=f'Similarity 0..1 for names and places to count as equal (default: {DEFAULT_THRESHOLD})',
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if not 0 < threshold <= 1:
+            raise CommandError('--threshold must be between 0 and 1')
+
+        groups = find_duplicate_groups(threshold=threshold)
+        if not groups:
+            self.stdout.write(self.style.SUCCESS('✓ No duplicate customers found'))
+            return
+
+        for group in groups:
+            keep = group[0]
+            self.stdout.write(f'#{keep.pk} {keep}')
+            for duplicate in group[1:]:
+                self.stdout.write(f'    ← #{duplicate.pk} {duplicate}')
+
+        duplicates = sum(len(group) - 1 for group in groups)
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING(
+                f'\n{len(groups)} group(s), {duplicates} duplicate(s). Run with --apply to merge them.'
+            ))
+            return
+
+        result = merge_customers(groups)
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Merged {result["merged"]} customer(s), moved {result["debts"]} debt(s)'
+        ))
@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Cashier
+from main.utils import parse_csv_file, parse_excel_file, import_debts_from_data
+
+
+class Command(BaseCommand):
+    help = 'Import debts from a CSV or Excel sales export from 1C'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file_path',
+            type=str,
+            help='Path to the CSV or Excel file to import'
+        )
+        parser.add_argument(
+            '--cashier',
+            help='Username of the cashier for all debts (default: the "Кассир" column of each row)',
+        )
+        parser.add_argument(
+            '--promise-days',
+            type=int,
+            default=30,
+            help='Promise date for rows without one, in days after the date given (default: 30)',
+        )
+        parser.add_argument(
+            '--default-place',
+            default='Unknown',
+            help='Place of new customers when the file has none (default: Unknown)',
+        )
+
+    def handle(self, *args, **options):
+        file_path = options['file_path']
+
+        if not os.path.exists(file_path):
+            raise CommandError(f'File not found: {file_path}')
+
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension not in ['.csv', '.xlsx', '.xls']:
+            raise CommandError('Unsupported file format. Please use CSV or Excel (.xlsx, .xls)')
+
+        cashier = None
+        if options['cashier']:
+            try:
+                cashier = Cashier.objects.get(user__username=options['cashier'])
+            except Cashier.DoesNotExist:
+                raise CommandError(f"Cashier '{options['cashier']}' not found")
+
+        self.stdout.write(f'Reading file: {file_path}')
+        started = time.perf_counter()
+        try:
+            with open(file_path, 'rb') as f:
+                if file_extension == '.csv':
+                    data_rows = parse_csv_file(f)
+                else:
+                    data_rows = parse_excel_file(f)
+        except (ImportError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f'Found {len(data_rows)} rows to process')
+
+        result = import_debts_from_data(
+            data_rows,
+            cashier=cashier,
+            default_place=options['default_place'],
+            promise_days=options['promise_days'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Imported {result["imported"]} debt(s), created {result["customers_created"]} customer(s) '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+        if result['skipped']:
+            self.stdout.write(self.style.WARNING(f'⚠ Skipped {result["skipped"]} empty or zero-amount row(s)'))
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f'\n✗ Encountered {len(result["errors"])} error(s):'))
+            for error in result['errors'][:10]:  # Show first 10 errors
+                self.stdout.write(self.style.ERROR(f'  - {error}'))
+            if len(result['errors']) > 10:
+                self.stdout.write(self.style.ERROR(f'  ... and {len(result["errors"]) - 10} more errors'))
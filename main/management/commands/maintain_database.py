@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from main.backups import BackupError, database_path
+from main.maintenance import (
+    AUTO_VACUUM_INCREMENTAL, database_report, enable_incremental_vacuum, file_stats, in_window, run_maintenance,
+)
+
+
+class Command(BaseCommand):
+    help = 'Refresh planner statistics, vacuum free pages, checkpoint the WAL and report table sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report',
+            action='store_true',
+            help='Only show file, table and index sizes',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Tables/indexes listed in the size report (default: 15)',
+        )
+        parser.add_argument(
+            '--vacuum-pages',
+            type=int,
+            help='Free pages given back per run (default: all)',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum',
+            action='store_true',
+            help='Switch an existing database to incremental vacuum (one full VACUUM, blocks writers)',
+        )
+        parser.add_argument(
+            '--off-hours',
+            action='store_true',
+            help=f'Do nothing outside MAINTENANCE_WINDOW ({settings.MAINTENANCE_WINDOW}), for frequent scheduled runs',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            database_path()
+        except BackupError as exc:
+            raise CommandError(str(exc)) from exc
+        if options['vacuum_pages'] is not None and options['vacuum_pages'] < 1:
+            raise CommandError('--vacuum-pages must be at least 1')
+
+        if options['report']:
+            self._report(options['top'])
+            return
+        if options['off_hours']:
+            try:
+                off_hours = in_window(settings.MAINTENANCE_WINDOW)
+            except ValueError as exc:
+                raise CommandError(f'Invalid MAINTENANCE_WINDOW "{settings.MAINTENANCE_WINDOW}", use HH:MM-HH:MM') from exc
+            if not off_hours:
+                self.stdout.write(f'Outside the maintenance window {settings.MAINTENANCE_WINDOW}, nothing done')
+                return
+
+        if options['enable_incremental_vacuum']:
+            if file_stats()['auto_vacuum'] == AUTO_VACUUM_INCREMENTAL:
+                self.stdout.write('Incremental vacuum is already enabled')
+            else:
+                self.stdout.write('Rebuilding the database file (VACUUM)...')
+                enable_incremental_vacuum()
+                self.stdout.write(self.style.SUCCESS('✓ Incremental vacuum enabled'))
+
+        result = run_maintenance(vacuum_pages=options['vacuum_pages'])
+        before, after = result['before'], result['after']
+        self.stdout.write(self.style.SUCCESS('✓ Planner statistics refreshed (ANALYZE, PRAGMA optimize)'))
+        if result['vacuumed']:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Vacuumed: {filesizeformat(before["size"])} → {filesizeformat(after["size"])}, '
+                f'{filesizeformat(after["free"])} still free'
+            ))
+        elif before['free']:
+            self.stdout.write(self.style.WARNING(
+                f'{filesizeformat(before["free"])} of free pages stay in the file: '
+                'run once with --enable-incremental-vacuum (off-hours) to give them back'
+            ))
+        checkpoint = result['checkpoint']
+        if checkpoint['busy']:
+            self.stdout.write(self.style.WARNING(
+                f'WAL checkpoint incomplete ({checkpoint["checkpointed"]}/{checkpoint["frames"]} frames), '
+                'a reader was still active'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ WAL checkpointed and truncated'))
+
+    def _report(self, top):
+        stats = file_stats()
+        self.stdout.write(
+            f'Database: {filesizeformat(stats["size"])}, free pages: {filesizeformat(stats["free"])}, '
+            f'auto_vacuum: {"incremental" if stats["auto_vacuum"] == AUTO_VACUUM_INCREMENTAL else stats["auto_vacuum"]}'
+        )
+        rows = database_report()
+        if not rows:
+            self.stdout.write('Table sizes are not available (SQLite built without dbstat)')
+            return
+        self.stdout.write(f'\n{"Name":<45} {"Kind":<6} {"Size":>10} {"Fill":>6}')
+        for row in rows[:top]:
+            name = row['name'] if row['kind'] == 'table' else f'{row["name"]} ({row["table"]})'
+            self.stdout.write(
+                f'{name[:45]:<45} {row["kind"]:<6} {filesizeformat(row["size"]):>10} {row["fill"]:>6.0%}'
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from main.models import Customer, Debt
+
+
+class Command(BaseCommand):
+    help = 'Recompute normalized search keys for all customers and debts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows per bulk update (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        changed = []
+        for customer in Customer.objects.all().iterator(chunk_size=batch_size):
+            key = customer.build_search_key()
+            if key != customer.search_key:
+                customer.search_key = key
+                changed.append(customer)
+        Customer.objects.bulk_update(changed, ['search_key'], batch_size=batch_size)
+        self.stdout.write(f'Customers updated: {len(changed)}')
+
+        debt_count = Debt.refresh_search_keys(Debt.all_objects.all(), batch_size=batch_size)
+        self.stdout.write(f'Debts updated: {debt_count}')
+
+        self.stdout.write(self.style.SUCCESS('✓ Search keys rebuilt'))
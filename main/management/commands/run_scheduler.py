@@ -0,0 +1,113 @@
+import signal
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main import jobs  # noqa: F401  (registers the jobs)
+from main.models import JobRun
+from main.scheduler import JOBS, LOCK_HEARTBEAT, DatabaseLock, SchedulerLockHeld, due_jobs, last_runs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run the scheduled jobs (backup, archiving, maintenance, clean-ups) at their times'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs due this minute and exit (for an external timer)',
+        )
+        parser.add_argument(
+            '--run',
+            metavar='JOB',
+            help='Run one job now, whatever its schedule',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the jobs with their schedule and last run',
+        )
+        parser.add_argument(
+            '--history',
+            type=int,
+            metavar='N',
+            help='Show the last N job runs',
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self._list()
+            return
+        if options['history'] is not None:
+            self._history(options['history'])
+            return
+        if options['run']:
+            if options['run'] not in JOBS:
+                raise CommandError(f'Unknown job "{options["run"]}", choose from: {", ".join(JOBS)}')
+            self._run(JOBS[options['run']])
+            return
+
+        lock = DatabaseLock()
+        while True:
+            try:
+                lock.acquire()
+                break
+            except SchedulerLockHeld as exc:
+                holder = exc.args[0]
+                message = f'Another scheduler is running ({holder[0]})' if holder else 'The scheduler lock is busy'
+                if options['once']:
+                    raise CommandError(message)
+                self.stdout.write(f'{message}, waiting...')
+                lock.lost.wait(LOCK_HEARTBEAT.total_seconds())
+        # A service manager stops us with SIGTERM; leave through `finally` to free the lock
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            if options['once']:
+                for scheduled in due_jobs(timezone.localtime()):
+                    self._run(scheduled)
+            else:
+                self._loop(lock)
+        except KeyboardInterrupt:
+            self.stdout.write('Scheduler stopped')
+        finally:
+            lock.release()
+
+    def _loop(self, lock):
+        self.stdout.write(self.style.SUCCESS(f'✓ Scheduler started with {len(JOBS)} job(s)'))
+        minute = timezone.localtime().replace(second=0, microsecond=0)
+        while not lock.lost.is_set():
+            # Minutes passed while a long job ran are caught up here
+            for scheduled in due_jobs(minute):
+                self._run(scheduled)
+            minute += timedelta(minutes=1)
+            lock.lost.wait(max((minute - timezone.localtime()).total_seconds(), 0))
+        raise CommandError('The scheduler lock was taken over, stopping')
+
+    def _run(self, scheduled):
+        self.stdout.write(f'{timezone.localtime():%d.%m.%Y %H:%M:%S} {scheduled.name}...')
+        run = run_job(scheduled)
+        seconds = run.duration.total_seconds()
+        if run.status == 'success':
+            self.stdout.write(self.style.SUCCESS(f'  ✓ {seconds:.1f}s {run.result}'))
+        else:
+            self.stdout.write(self.style.ERROR(f'  ✗ {seconds:.1f}s failed\n{run.result}'))
+
+    def _list(self):
+        runs = last_runs()
+        for scheduled in JOBS.values():
+            run = runs.get(scheduled.name)
+            last = (
+                f'{timezone.localtime(run.started_at):%d.%m.%Y %H:%M} {run.get_status_display()}'
+                f' ({run.duration.total_seconds():.1f}s)' if run and run.duration else '-'
+            )
+            self.stdout.write(f'{scheduled.name:<20} {scheduled.cron.expression:<15} {last:<40} {scheduled.description}')
+
+    def _history(self, count):
+        for run in JobRun.objects.all()[:count]:
+            duration = f'{run.duration.total_seconds():.1f}s' if run.duration else '-'
+            self.stdout.write(
+                f'{timezone.localtime(run.started_at):%d.%m.%Y %H:%M:%S} {run.job:<20} '
+                f'{run.get_status_display():<12} {duration:>8}  {run.result.strip().splitlines()[-1] if run.result else ""}'
+            )
@@ -0,0 +1,423 @@
+"""
+Production launcher for the pharmacy application.
+
+``runserver`` is single-process and meant for development. This command
+runs ``pharmacy.wsgi.application`` under waitress (works on Windows, the
+default) or gunicorn (Linux/macOS, if installed), sized to the CPU cores,
+with an access log that includes request durations and graceful
+restarts: the listening socket is closed, requests in flight are allowed
+to finish, then the process starts again with fresh code.
+
+With ``--asgi`` it runs ``pharmacy.asgi.application`` under uvicorn
+instead, which the live dashboard feed (Server-Sent Events) needs: an
+open stream then costs a coroutine, not a request thread. Django runs
+the sync views of an ASGI process one at a time on a single thread, so
+this mode is sized in worker processes rather than threads. Under WSGI
+the dashboard polls, and no request holds a thread for long.
+
+Restart triggers:
+    waitress  - touch the restart file (default: restart.txt next to
+                manage.py) or send SIGHUP (Linux/macOS)
+    gunicorn  - send SIGHUP to the master process
+    uvicorn   - touch the restart file
+"""
+import logging
+import logging.handlers
+import os
+import signal
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ACCESS_LOGGER = 'pharmacy.access'
+
+# How often the waitress loop checks the restart file / stop flag (seconds)
+LOOP_TICK = 1.0
+
+
+def default_threads():
+    """Request threads for waitress: requests mostly wait on SQLite and the network"""
+    return min(32, max(8, (os.cpu_count() or 1) * 4))
+
+
+def default_workers():
+    """Worker processes for gunicorn and uvicorn (the usual 2 * cores + 1)"""
+    return (os.cpu_count() or 1) * 2 + 1
+
+
+def log_request(logger, remote_addr, method, path, query, status, size, started):
+    """One access log line, with the request duration"""
+    if query:
+        path = f'{path}?{query}'
+    logger.info(
+        '%s "%s %s" %s %s %.1fms',
+        remote_addr, method, path, status, size, (time.perf_counter() - started) * 1000,
+    )
+
+
+class AccessLogMiddleware:
+    """WSGI wrapper that logs one line per request, with its duration, and counts requests in flight"""
+
+    def __init__(self, application, logger):
+        self.application = application
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        state = {'status': '-', 'bytes': 0}
+
+        def logged_start_response(status, headers, exc_info=None):
+            state['status'] = status.split(' ', 1)[0]
+            return start_response(status, headers, exc_info)
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            result = self.application(environ, logged_start_response)
+        except Exception:
+            self._finish(environ, state, started)
+            raise
+        return self._iterate(result, environ, state, started)
+
+    def _iterate(self, result, environ, state, started):
+        try:
+            for chunk in result:
+                state['bytes'] += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            self._finish(environ, state, started)
+
+    def _finish(self, environ, state, started):
+        with self.lock:
+            self.in_flight -= 1
+        log_request(
+            self.logger,
+            environ.get('REMOTE_ADDR', '-'),
+            environ.get('REQUEST_METHOD', '-'),
+            environ.get('PATH_INFO', ''),
+            environ.get('QUERY_STRING', ''),
+            state['status'],
+            state['bytes'],
+            started,
+        )
+
+
+class ASGIAccessLogMiddleware:
+    """ASGI counterpart of AccessLogMiddleware (--asgi)"""
+
+    def __init__(self, application, logger):
+        self.application = application
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        started = time.perf_counter()
+        state = {'status': '-', 'bytes': 0}
+
+        async def logged_send(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                state['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.application(scope, receive, logged_send)
+        finally:
+            client = scope.get('client')
+            log_request(
+                self.logger,
+                client[0] if client else '-',
+                scope.get('method', '-'),
+                scope.get('path', ''),
+                scope.get('query_string', b'').decode('latin-1'),
+                state['status'],
+                state['bytes'],
+                started,
+            )
+
+
+def asgi_application():
+    """The ASGI app with access logging; uvicorn calls this in every worker"""
+    from pharmacy.asgi import application
+    return ASGIAccessLogMiddleware(application, logging.getLogger(ACCESS_LOGGER))
+
+
+class Command(BaseCommand):
+    help = 'Run the application under a production server (waitress or gunicorn, or uvicorn with --asgi)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0', help='Address to listen on (default: 0.0.0.0)')
+        parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+        parser.add_argument(
+            '--server',
+            choices=['auto', 'waitress', 'gunicorn'],
+            default='auto',
+            help='WSGI server; auto picks gunicorn on Linux/macOS when installed, waitress otherwise',
+        )
+        parser.add_argument(
+            '--asgi',
+            action='store_true',
+            help='Run the ASGI application under uvicorn, for the live dashboard feed (uses --workers, not --threads)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            help=f'Request threads (waitress, default: {default_threads()}) or threads per worker (gunicorn, default: 4)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help=f'Worker processes, gunicorn and --asgi (default: {default_workers()})',
+        )
+        parser.add_argument(
+            '--access-log',
+            default='-',
+            help="Access log file, '-' for the console (default: -)",
+        )
+        parser.add_argument(
+            '--graceful-timeout',
+            type=int,
+            default=30,
+            help='Seconds to wait for requests in flight on stop/restart (default: 30)',
+        )
+        parser.add_argument(
+            '--restart-file',
+            default=str(settings.BASE_DIR / 'restart.txt'),
+            help='Touch this file to restart waitress gracefully (default: restart.txt next to manage.py)',
+        )
+
+    def handle(self, *args, **options):
+        if options['asgi']:
+            if options['server'] != 'auto':
+                raise CommandError('--asgi always uses uvicorn; leave out --server')
+            if options['threads']:
+                raise CommandError('--asgi runs worker processes; use --workers instead of --threads')
+            server = 'uvicorn'
+        else:
+            server = options['server']
+        if server == 'auto':
+            server = 'gunicorn' if os.name != 'nt' and self._has_gunicorn() else 'waitress'
+
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING(
+                'DEBUG is on; set DJANGO_DEBUG=0 for the production profile (see DEPLOYMENT_GUIDE.md)'
+            ))
+
+        if server == 'uvicorn':
+            self._run_uvicorn(options)
+        elif server == 'gunicorn':
+            self._run_gunicorn(options)
+        else:
+            self._run_waitress(options)
+
+    def _has_gunicorn(self):
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _access_logger(self, target):
+        logger = logging.getLogger(ACCESS_LOGGER)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers.clear()
+        if target == '-':
+            handler = logging.StreamHandler(sys.stdout)
+        else:
+            handler = logging.handlers.RotatingFileHandler(
+                target, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8'
+            )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        return logger
+
+    def _run_waitress(self, options):
+        try:
+            from waitress.server import BaseWSGIServer, create_server
+            from waitress import wasyncore
+        except ImportError:
+            raise CommandError(
+                'waitress is not installed. Run:\n'
+                f'  {sys.executable} -m pip install -r requirements.txt'
+            )
+        from pharmacy.wsgi import application
+
+        threads = options['threads'] or default_threads()
+        app = AccessLogMiddleware(application, self._access_logger(options['access_log']))
+        server = create_server(
+            app,
+            host=options['host'],
+            port=options['port'],
+            threads=threads,
+            # Cashier terminals keep connections alive; leave room for all of them
+            connection_limit=max(100, threads * 10),
+            ident='pharmacy',
+        )
+
+        stop = {'reason': None}
+
+        def request_stop(reason):
+            def handler(signum, frame):
+                stop['reason'] = stop['reason'] or reason
+            return handler
+
+        signal.signal(signal.SIGINT, request_stop('stop'))
+        signal.signal(signal.SIGTERM, request_stop('stop'))
+        if hasattr(signal, 'SIGBREAK'):
+            signal.signal(signal.SIGBREAK, request_stop('stop'))
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, request_stop('restart'))
+
+        # One listener: the server itself, several (e.g. IPv4 + IPv6): MultiSocketServer
+        socket_map = server.map if hasattr(server, 'map') else server._map
+
+        restart_file = options['restart_file']
+        restart_mtime = self._mtime(restart_file)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving on http://{options['host']}:{options['port']} "
+            f"(waitress, {threads} threads, pid {os.getpid()})"
+        ))
+
+        while stop['reason'] is None:
+            wasyncore.loop(timeout=LOOP_TICK, map=socket_map, count=1)
+            mtime = self._mtime(restart_file)
+            if mtime != restart_mtime:
+                stop['reason'] = 'restart'
+
+        self.stdout.write(f"{stop['reason'].capitalize()} requested, finishing requests in flight...")
+        # Stop accepting; keep the loop running so in-flight responses are flushed
+        for dispatcher in list(socket_map.values()):
+            if isinstance(dispatcher, BaseWSGIServer):
+                wasyncore.dispatcher.close(dispatcher)
+        deadline = time.monotonic() + options['graceful_timeout']
+        while time.monotonic() < deadline:
+            pending_output = any(getattr(ch, 'total_outbufs_len', 0) for ch in socket_map.values())
+            if not app.in_flight and not pending_output:
+                break
+            wasyncore.loop(timeout=0.1, map=socket_map, count=1)
+        else:
+            self.stdout.write(self.style.WARNING(f'{app.in_flight} request(s) cut off after the graceful timeout'))
+        server.close()
+
+        if stop['reason'] == 'restart':
+            self.stdout.write('Restarting...')
+            sys.stdout.flush()
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        self.stdout.write('Server stopped.')
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _run_gunicorn(self, options):
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise CommandError(
+                'gunicorn is not installed (Linux/macOS only). Run:\n'
+                f'  {sys.executable} -m pip install gunicorn'
+            )
+
+        workers = options['workers'] or default_workers()
+        threads = options['threads'] or 4
+        config = {
+            'bind': f"{options['host']}:{options['port']}",
+            'workers': workers,
+            'threads': threads,
+            'worker_class': 'gthread',
+            'graceful_timeout': options['graceful_timeout'],
+            'accesslog': options['access_log'],
+            # %(M)s is the request duration in milliseconds
+            'access_log_format': '%(h)s "%(r)s" %(s)s %(B)s %(M)sms',
+            'proc_name': 'pharmacy',
+        }
+
+        class PharmacyApplication(BaseApplication):
+            def load_config(self):
+                for key, value in config.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                from pharmacy.wsgi import application
+                return application
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving on http://{config['bind']} (gunicorn, {workers} workers x {threads} threads); "
+            'send SIGHUP to the master for a graceful restart'
+        ))
+        PharmacyApplication().run()
+
+    def _run_uvicorn(self, options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError(
+                'uvicorn is not installed. Run:\n'
+                f'  {sys.executable} -m pip install -r requirements.txt'
+            )
+
+        workers = options['workers'] or default_workers()
+        if options['access_log'] == '-':
+            handler = {'class': 'logging.StreamHandler', 'stream': 'ext://sys.stdout'}
+        else:
+            # Every worker process writes it; one of them rotating it would break the others
+            handler = {'class': 'logging.FileHandler', 'filename': options['access_log'], 'encoding': 'utf-8'}
+        # Applied by uvicorn in every worker
+        log_config = {
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {'access': {'format': '%(asctime)s %(message)s'}},
+            'handlers': {'access': {**handler, 'formatter': 'access'}},
+            'loggers': {
+                ACCESS_LOGGER: {'handlers': ['access'], 'level': 'INFO', 'propagate': False},
+            },
+        }
+
+        restart_file = options['restart_file']
+        restart = threading.Event()
+
+        def watch_restart_file():
+            mtime = self._mtime(restart_file)
+            while self._mtime(restart_file) == mtime:
+                time.sleep(LOOP_TICK)
+            restart.set()
+            # uvicorn stops gracefully on SIGINT, in the main thread
+            signal.raise_signal(signal.SIGINT)
+
+        threading.Thread(target=watch_restart_file, daemon=True).start()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving on http://{options['host']}:{options['port']} "
+            f"(uvicorn, ASGI, {workers} workers, pid {os.getpid()})"
+        ))
+        uvicorn.run(
+            'main.management.commands.serve:asgi_application',
+            factory=True,
+            host=options['host'],
+            port=options['port'],
+            workers=workers,
+            log_config=log_config,
+            # Requests are logged with their duration by ASGIAccessLogMiddleware
+            access_log=False,
+            timeout_graceful_shutdown=options['graceful_timeout'],
+            lifespan='off',
+        )
+
+        if restart.is_set():
+            self.stdout.write('Restarting...')
+            sys.stdout.flush()
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        self.stdout.write('Server stopped.')
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from main.branch_sync import EVENTS_PER_FILE, SyncError, export_changes
+
+
+class Command(BaseCommand):
+    help = "Write this branch's changes since the last export as batch files for head office"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--out',
+            default=settings.SYNC_DIR / 'outbox',
+            help=f'Folder for the batch files (default: {settings.SYNC_DIR / "outbox"})',
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Export all rows instead of the changes (e.g. after restoring this database from a backup)',
+        )
+        parser.add_argument(
+            '--events-per-file',
+            type=int,
+            default=EVENTS_PER_FILE,
+            help=f'Changes read into one file at most (default: {EVENTS_PER_FILE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['events_per_file'] < 1:
+            raise CommandError('--events-per-file must be at least 1')
+        try:
+            paths = export_changes(options['out'], options['snapshot'], options['events_per_file'])
+        except SyncError as exc:
+            raise CommandError(str(exc)) from exc
+        if not paths:
+            self.stdout.write('No changes since the last export')
+        for path in paths:
+            self.stdout.write(self.style.SUCCESS(f'✓ {path} ({filesizeformat(path.stat().st_size)})'))
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.branch_sync import import_batches
+from main.models import Branch
+
+
+class Command(BaseCommand):
+    help = 'Import the batch files of the pharmacy branches into this (head office) database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help=f'Batch files or folders (default: {settings.SYNC_DIR / "inbox"})',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='List the branches and how far they are imported',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self._status()
+            return
+        paths = [Path(path) for path in options['paths']] or [settings.SYNC_DIR / 'inbox']
+        missing = [path for path in paths if not path.exists()]
+        if missing:
+            raise CommandError(f'Not found: {", ".join(map(str, missing))}')
+
+        counts = {'imported': 0, 'skipped': 0, 'waiting': 0, 'failed': 0}
+        for path, branch, status, result in import_batches(paths):
+            counts[status] += 1
+            if status == 'imported':
+                details = ', '.join(f'{value} {name}' for name, value in result.items() if value)
+                self.stdout.write(self.style.SUCCESS(f'✓ {path.name}: {details or "no changes"}'))
+            elif status == 'skipped':
+                self.stdout.write(f'  {path.name}: already imported')
+            elif status == 'waiting':
+                self.stdout.write(self.style.WARNING(f'  {path.name}: waits for an earlier file of {branch}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'✗ {result}'))
+        self.stdout.write(
+            f'{counts["imported"]} imported, {counts["skipped"]} already imported, '
+            f'{counts["waiting"] + counts["failed"]} not imported'
+        )
+        if counts['failed']:
+            raise CommandError('Some batch files could not be imported')
+
+    def _status(self):
+        for branch in Branch.objects.all():
+            imported = (
+                f'{timezone.localtime(branch.last_imported_at):%d.%m.%Y %H:%M}' if branch.last_imported_at else '-'
+            )
+            exported = (
+                f'{timezone.localtime(branch.last_exported_at):%d.%m.%Y %H:%M}' if branch.last_exported_at else '-'
+            )
+            self.stdout.write(
+                f'{branch.code:<20} {branch.name[:30]:<30} #{branch.last_sequence:<10} '
+                f'exported {exported}, imported {imported}'
+            )
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:26
+
+from django.db import migrations, models
+
+from main.search import normalize_search_text
+
+
+def backfill_search_keys(apps, schema_editor):
+    Customer = apps.get_model('main', 'Customer')
+    Debt = apps.get_model('main', 'Debt')
+
+    customers = []
+    for customer in Customer.objects.all().iterator(chunk_size=500):
+        customer.search_key = normalize_search_text(
+            customer.surname, customer.name, customer.patronymic, customer.place, customer.phone
+        )[:255]
+        customers.append(customer)
+    Customer.objects.bulk_update(customers, ['search_key'], batch_size=500)
+
+    debts = []
+    for debt in Debt.objects.select_related('customer', 'cashier').iterator(chunk_size=500):
+        debt.search_key = normalize_search_text(
+            debt.customer.search_key, debt.cashier.name, debt.cashier.surname, debt.description
+        )[:500]
+        debts.append(debt)
+    Debt.objects.bulk_update(debts, ['search_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_alter_debt_cashier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Axtarış açarı'),
+        ),
+        migrations.AddField(
+            model_name='debt',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='Axtarış açarı'),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
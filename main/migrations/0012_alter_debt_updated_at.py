@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_customer_search_key_debt_search_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='debt',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Yenilənmə tarixi'),
+        ),
+    ]
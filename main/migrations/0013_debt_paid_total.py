@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:41
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_paid_totals(apps, schema_editor):
+    Debt = apps.get_model('main', 'Debt')
+    Payment = apps.get_model('main', 'Payment')
+
+    payments = Payment.objects.filter(debt=OuterRef('pk')).order_by().values('debt').annotate(
+        total=Sum('amount')
+    ).values('total')
+    Debt.objects.update(
+        paid_total=Coalesce(
+            Subquery(payments, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_alter_debt_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='debt',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Ödənilmiş məbləğ'),
+        ),
+        migrations.RunPython(backfill_paid_totals, migrations.RunPython.noop),
+    ]
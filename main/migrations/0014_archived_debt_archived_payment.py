@@ -0,0 +1,61 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_debt_paid_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDebt',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Məbləğ')),
+                ('date_given', models.DateTimeField(verbose_name='Verilmə tarixi')),
+                ('promise_date', models.DateField(verbose_name='Vəd tarixi')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='Təsvir')),
+                ('is_paid', models.BooleanField(default=False, verbose_name='Ödənilib')),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Ödənilmiş məbləğ')),
+                ('paid_date', models.DateTimeField(blank=True, null=True, verbose_name='Ödəniş tarixi')),
+                ('payment_method', models.CharField(blank=True, choices=[('cash', 'Nağd'), ('card', 'Kart'), ('posterminal', 'Posterminal')], max_length=20, null=True, verbose_name='Ödəniş üsulu')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Silinib')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Silinmə tarixi')),
+                ('created_at', models.DateTimeField(verbose_name='Yaradılma tarixi')),
+                ('updated_at', models.DateTimeField(verbose_name='Yenilənmə tarixi')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Arxivləşdirilmə tarixi')),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_debts', to='main.cashier', verbose_name='Kassir')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_debts', to='main.customer', verbose_name='Müştəri')),
+                ('deleted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Silən')),
+            ],
+            options={
+                'verbose_name': 'Arxiv borc',
+                'verbose_name_plural': 'Arxiv borclar',
+                'ordering': ['-date_given'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Məbləğ')),
+                ('payment_date', models.DateTimeField(db_index=True, verbose_name='Ödəniş tarixi')),
+                ('payment_method', models.CharField(choices=[('cash', 'Nağd'), ('card', 'Kart'), ('posterminal', 'Posterminal')], max_length=20, verbose_name='Ödəniş üsulu')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Qeydlər')),
+                ('created_at', models.DateTimeField(verbose_name='Yaradılma tarixi')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Yaradan')),
+                ('debt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='main.archiveddebt', verbose_name='Borc')),
+            ],
+            options={
+                'verbose_name': 'Arxiv ödəniş',
+                'verbose_name_plural': 'Arxiv ödənişlər',
+                'ordering': ['-payment_date'],
+            },
+        ),
+    ]
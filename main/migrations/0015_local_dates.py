@@ -0,0 +1,75 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:55
+
+import main.fields
+from django.db import migrations, models
+
+from main.fields import local_date
+
+# (model, {local date field: source field})
+LOCAL_DATE_SOURCES = [
+    ('Debt', {'given_local_date': 'date_given', 'paid_local_date': 'paid_date'}),
+    ('Payment', {'payment_local_date': 'payment_date'}),
+    ('ArchivedDebt', {'given_local_date': 'date_given', 'paid_local_date': 'paid_date'}),
+    ('ArchivedPayment', {'payment_local_date': 'payment_date'}),
+]
+
+
+def backfill_local_dates(apps, schema_editor):
+    # Time zone rules (and their history) live in Python, not in SQLite
+    for model_name, fields in LOCAL_DATE_SOURCES:
+        model = apps.get_model('main', model_name)
+        changed = []
+        for obj in model._base_manager.only('pk', *fields.values()).iterator(chunk_size=1000):
+            for target, source in fields.items():
+                setattr(obj, target, local_date(getattr(obj, source)))
+            changed.append(obj)
+            if len(changed) >= 1000:
+                model._base_manager.bulk_update(changed, list(fields))
+                changed = []
+        model._base_manager.bulk_update(changed, list(fields))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_archived_debt_archived_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archiveddebt',
+            name='given_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='date_given', verbose_name='Verilmə günü'),
+        ),
+        migrations.AddField(
+            model_name='archiveddebt',
+            name='paid_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='paid_date', verbose_name='Ödəniş günü'),
+        ),
+        migrations.AddField(
+            model_name='archivedpayment',
+            name='payment_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='payment_date', verbose_name='Ödəniş günü'),
+        ),
+        migrations.AddField(
+            model_name='debt',
+            name='given_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='date_given', verbose_name='Verilmə günü'),
+        ),
+        migrations.AddField(
+            model_name='debt',
+            name='paid_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='paid_date', verbose_name='Ödəniş günü'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_local_date',
+            field=main.fields.LocalDateField(blank=True, db_index=True, editable=False, null=True, source='payment_date', verbose_name='Ödəniş günü'),
+        ),
+        migrations.AlterField(
+            model_name='archivedpayment',
+            name='payment_date',
+            field=models.DateTimeField(verbose_name='Ödəniş tarixi'),
+        ),
+        migrations.RunPython(backfill_local_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:58
+
+import django.core.validators
+import main.fields
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+# (model, decimal field) converted to integer qəpik
+MONEY_FIELDS = [
+    ('debt', 'amount'),
+    ('debt', 'paid_total'),
+    ('payment', 'amount'),
+    ('archiveddebt', 'amount'),
+    ('archiveddebt', 'paid_total'),
+    ('archivedpayment', 'amount'),
+]
+
+
+def copy_to_minor_units(apps, schema_editor):
+    # One UPDATE per column; ROUND because SQLite keeps the old decimals as floats
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('main', model_name)
+        model._base_manager.update(**{
+            f'{field}_minor': Cast(Round(F(field) * 100), models.BigIntegerField()),
+        })
+
+
+def copy_from_minor_units(apps, schema_editor):
+    # Back to manat; divide as a float so SQLite does not truncate 1250 / 100
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('main', model_name)
+        model._base_manager.update(**{
+            field: Round(Cast(F(f'{field}_minor'), models.FloatField()) / 100, 2),
+        })
+
+
+def money_field_operations(final_fields):
+    """
+    Add a temporary qəpik column, copy, drop the decimal one and rename.
+
+    The decimal columns are made nullable before the copy so that, when
+    migrating backwards, they are re-added empty, filled by
+    copy_from_minor_units and only then made NOT NULL again.
+    """
+    operations = [
+        migrations.AddField(
+            model_name=model_name,
+            name=f'{field}_minor',
+            field=main.fields.MoneyField(null=True),
+        )
+        for model_name, field in MONEY_FIELDS
+    ]
+    operations += [
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        )
+        for model_name, field in MONEY_FIELDS
+    ]
+    operations.append(migrations.RunPython(copy_to_minor_units, copy_from_minor_units))
+    for model_name, field in MONEY_FIELDS:
+        operations += [
+            migrations.RemoveField(model_name=model_name, name=field),
+            migrations.RenameField(model_name=model_name, old_name=f'{field}_minor', new_name=field),
+            migrations.AlterField(model_name=model_name, name=field, field=final_fields[model_name, field]),
+        ]
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_local_dates'),
+    ]
+
+    operations = money_field_operations({
+        ('debt', 'amount'): main.fields.MoneyField(validators=[django.core.validators.MinValueValidator(0)], verbose_name='Məbləğ'),
+        ('debt', 'paid_total'): main.fields.MoneyField(default=0, editable=False, verbose_name='Ödənilmiş məbləğ'),
+        ('payment', 'amount'): main.fields.MoneyField(validators=[django.core.validators.MinValueValidator(0.01)], verbose_name='Məbləğ'),
+        ('archiveddebt', 'amount'): main.fields.MoneyField(verbose_name='Məbləğ'),
+        ('archiveddebt', 'paid_total'): main.fields.MoneyField(default=0, verbose_name='Ödənilmiş məbləğ'),
+        ('archivedpayment', 'amount'): main.fields.MoneyField(verbose_name='Məbləğ'),
+    })
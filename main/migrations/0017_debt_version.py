@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='debt',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Versiya'),
+        ),
+    ]
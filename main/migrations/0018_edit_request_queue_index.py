@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_debt_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='debteditrequest',
+            index=models.Index(fields=['status', 'created_at'], name='edit_request_queue_idx'),
+        ),
+    ]
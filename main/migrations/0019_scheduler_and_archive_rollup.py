@@ -0,0 +1,97 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:12
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+import main.fields
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_archived_totals(apps, schema_editor):
+    """First rollup of the archive (as main.archive.rebuild_archived_totals)"""
+    ArchivedDebt = apps.get_model('main', 'ArchivedDebt')
+    ArchivedPayment = apps.get_model('main', 'ArchivedPayment')
+    ArchivedMonthlyTotal = apps.get_model('main', 'ArchivedMonthlyTotal')
+
+    def by_month(queryset, date_field, cashier_field):
+        return (
+            queryset.annotate(month=TruncMonth(date_field))
+            .order_by()
+            .values_list(cashier_field, 'month')
+            .annotate(total=Sum('amount'))
+        )
+
+    totals = defaultdict(lambda: {'given': Decimal(0), 'returned': Decimal(0)})
+    for cashier_id, month, total in by_month(ArchivedDebt.objects.filter(is_deleted=False), 'given_local_date', 'cashier_id'):
+        totals[cashier_id, month]['given'] += total
+    for cashier_id, month, total in by_month(ArchivedPayment.objects.all(), 'payment_local_date', 'debt__cashier_id'):
+        totals[cashier_id, month]['returned'] += total
+    payment_in_month = ArchivedPayment.objects.filter(debt=OuterRef('pk')).annotate(
+        month=TruncMonth('payment_local_date')
+    ).filter(month=OuterRef('month'))
+    full = by_month(
+        ArchivedDebt.objects.filter(is_deleted=False, is_paid=True, paid_local_date__isnull=False),
+        'paid_local_date', 'cashier_id',
+    ).filter(~Exists(payment_in_month))
+    for cashier_id, month, total in full:
+        totals[cashier_id, month]['returned'] += total
+
+    ArchivedMonthlyTotal.objects.bulk_create([
+        ArchivedMonthlyTotal(cashier_id=cashier_id, month=month, **values)
+        for (cashier_id, month), values in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_edit_request_queue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=200)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100, verbose_name='Tapşırıq')),
+                ('status', models.CharField(choices=[('running', 'İcra olunur'), ('success', 'Uğurlu'), ('failed', 'Uğursuz')], default='running', max_length=20, verbose_name='Status')),
+                ('started_at', models.DateTimeField(verbose_name='Başlama vaxtı')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Bitmə vaxtı')),
+                ('duration', models.DurationField(blank=True, null=True, verbose_name='Müddət')),
+                ('result', models.TextField(blank=True, verbose_name='Nəticə')),
+            ],
+            options={
+                'verbose_name': 'Tapşırıq icrası',
+                'verbose_name_plural': 'Tapşırıq icraları',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', '-started_at'], name='job_run_history_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Ayın birinci günü', verbose_name='Ay')),
+                ('given', main.fields.MoneyField(default=0, verbose_name='Verilmiş borclar')),
+                ('returned', main.fields.MoneyField(default=0, verbose_name='Qaytarılmış məbləğ')),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.cashier', verbose_name='Kassir')),
+            ],
+            options={
+                'verbose_name': 'Arxiv aylıq cəm',
+                'verbose_name_plural': 'Arxiv aylıq cəmlər',
+                'constraints': [models.UniqueConstraint(fields=('month', 'cashier'), name='archived_month_cashier_unique')],
+            },
+        ),
+        migrations.RunPython(build_archived_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:16
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_scheduler_and_archive_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20, verbose_name='Model')),
+                ('object_id', models.BigIntegerField(verbose_name='Obyekt')),
+                ('action', models.CharField(choices=[('create', 'Yaradılıb'), ('update', 'Dəyişdirilib'), ('delete', 'Silinib'), ('archive', 'Arxivləşdirilib')], max_length=10, verbose_name='Əməliyyat')),
+                ('data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Məlumat')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Yaradılma tarixi')),
+            ],
+            options={
+                'verbose_name': 'Dəyişiklik',
+                'verbose_name_plural': 'Dəyişikliklər',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['model', 'object_id'], name='change_event_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_change_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='Kod')),
+                ('name', models.CharField(max_length=100, verbose_name='Ad')),
+                ('last_sequence', models.BigIntegerField(default=0, verbose_name='Son ardıcıllıq nömrəsi')),
+                ('last_exported_at', models.DateTimeField(blank=True, null=True, verbose_name='Son ixrac')),
+                ('last_imported_at', models.DateTimeField(blank=True, null=True, verbose_name='Son idxal')),
+            ],
+            options={
+                'verbose_name': 'Filial',
+                'verbose_name_plural': 'Filiallar',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cashier',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cashiers', to='main.branch', verbose_name='Filial'),
+        ),
+        migrations.CreateModel(
+            name='ReplicaKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('source_id', models.BigIntegerField()),
+                ('local_id', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.branch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'local_id'], name='replica_key_local_idx')],
+                'constraints': [models.UniqueConstraint(fields=('branch', 'model', 'source_id'), name='replica_key_source_unique')],
+            },
+        ),
+    ]
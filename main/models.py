@@ -1,13 +1,41 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
+from .fields import LocalDateField, MoneyField
+from .search import normalize_search_text
+
+
+class Branch(models.Model):
+    """
+    A pharmacy whose data is imported at head office (``main.branch_sync``).
+    Empty on the branch servers themselves.
+    """
+    code = models.CharField(_('Kod'), max_length=20, unique=True)
+    name = models.CharField(_('Ad'), max_length=100)
+    # Outbox sequence of the branch up to which its changes are imported
+    last_sequence = models.BigIntegerField(_('Son ardıcıllıq nömrəsi'), default=0)
+    # When the branch wrote the last imported batch file
+    last_exported_at = models.DateTimeField(_('Son ixrac'), null=True, blank=True)
+    last_imported_at = models.DateTimeField(_('Son idxal'), null=True, blank=True)
+
+    class Meta:
+        ordering = ['code']
+        verbose_name = _('Filial')
+        verbose_name_plural = _('Filiallar')
+
+    def __str__(self):
+        return self.name or self.code
 
 
 class Cashier(models.Model):
     """Model representing a cashier"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cashier_profile', verbose_name=_('İstifadəçi'), null=True, blank=True)
+    # Set on cashiers imported from a branch; empty for this server's own
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='cashiers', verbose_name=_('Filial'), null=True, blank=True)
     name = models.CharField(_('Ad'), max_length=100)
     surname = models.CharField(_('Soyad'), max_length=100)
     phone = models.CharField(_('Telefon'), max_length=20, blank=True, null=True)
@@ -22,11 +50,20 @@ class Cashier(models.Model):
     def __str__(self):
         return f"{self.name} {self.surname}"
 
+    def save(self, *args, **kwargs):
+        """Override save to keep debt search keys in sync with cashier name"""
+        name_changed = False
+        if self.pk:
+            old = Cashier.objects.filter(pk=self.pk).values('name', 'surname').first()
+            name_changed = old is not None and (old['name'], old['surname']) != (self.name, self.surname)
+        super().save(*args, **kwargs)
+        if name_changed:
+            Debt.refresh_search_keys(Debt.all_objects.filter(cashier=self), touch=True)
+
     @property
     def total_debt(self):
         """Calculate total remaining debt for this cashier"""
-        unpaid_debts = self.debts.filter(is_paid=False).prefetch_related('payments')
-        return sum(debt.remaining_amount for debt in unpaid_debts)
+        return self.debts.filter(is_paid=False).balance()['remaining']
 
     @property
     def overdue_debt_count(self):
@@ -48,8 +85,12 @@ class Customer(models.Model):
     place = models.CharField(_('Yer'), max_length=200, help_text=_("Müştərinin haradan olduğu"), default='Unknown')
     phone = models.CharField(_('Telefon'), max_length=20, blank=True, null=True)
     address = models.TextField(_('Ünvan'), blank=True, null=True)
+    search_key = models.CharField(_('Axtarış açarı'), max_length=255, blank=True, default='', editable=False)
     created_at = models.DateTimeField(_('Yaradılma tarixi'), auto_now_add=True)
 
+    # Shown on the cached debt rows (see main.caching)
+    DISPLAYED_FIELDS = ['name', 'surname', 'place']
+
     class Meta:
         ordering = ['surname', 'name']
         unique_together = [['name', 'surname', 'patronymic', 'place']]
@@ -62,10 +103,37 @@ class Customer(models.Model):
             full_name += f" {self.patronymic}"
         return f"{full_name} ({self.place})"
 
+    def build_search_key(self):
+        """Normalized key used by customer and debt searches"""
+        return normalize_search_text(self.surname, self.name, self.patronymic, self.place, self.phone)[:255]
+
+    def save(self, *args, **kwargs):
+        """Override save to maintain search_key (and the copy on debts)"""
+        adding = self._state.adding
+        old_key = self.search_key
+        old = None if adding else Customer.objects.filter(pk=self.pk).values(*self.DISPLAYED_FIELDS).first()
+        self.search_key = self.build_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'search_key' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['search_key']
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeEvent.record(Customer, [self.pk], 'create' if adding else 'update')
+        displayed_changed = old is not None and any(old[f] != getattr(self, f) for f in self.DISPLAYED_FIELDS)
+        if displayed_changed or (not adding and self.search_key != old_key):
+            Debt.refresh_search_keys(Debt.all_objects.filter(customer=self), touch=displayed_changed)
+
 class DebtQuerySet(models.QuerySet):
     def alive(self):
         return self.filter(is_deleted=False)
 
+    def balance(self):
+        """Number of debts and exact remaining total: ``{'count', 'remaining'}``"""
+        return self.aggregate(
+            count=models.Count('id'),
+            remaining=models.Sum(models.F('amount') - models.F('paid_total'), output_field=MoneyField(), default=0),
+        )
+
 class DebtManager(models.Manager.from_queryset(DebtQuerySet)):
     def get_queryset(self):
         return super().get_queryset().alive()
@@ -76,6 +144,10 @@ class DebtManager(models.Manager.from_queryset(DebtQuerySet)):
 #         return super().get_queryset().filter(is_deleted=False)
 
 
+class DebtConflict(ValidationError):
+    """The debt was changed by someone else after it was read (version mismatch)"""
+
+
 class Debt(models.Model):
     """Model representing a debt record"""
     PAYMENT_METHOD_CHOICES = [
@@ -86,18 +158,26 @@ class Debt(models.Model):
     
     cashier = models.ForeignKey(Cashier, on_delete=models.CASCADE, related_name='debts', verbose_name=_('Kassir'))
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='debts', verbose_name=_('Müştəri'))
-    amount = models.DecimalField(_('Məbləğ'), max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    amount = MoneyField(_('Məbləğ'), validators=[MinValueValidator(0)])
     date_given = models.DateTimeField(_('Verilmə tarixi'), default=timezone.now, help_text=_("Borcun verildiyi tarix və vaxt"))
     promise_date = models.DateField(_('Vəd tarixi'), help_text=_("Müştərinin pulu qaytarmaq üçün vəd etdiyi tarix"))
     description = models.TextField(_('Təsvir'), blank=True, null=True, help_text=_("Borcla bağlı əlavə qeydlər"))
     is_paid = models.BooleanField(_('Ödənilib'), default=False)
+    # Sum of the partial payments, kept in step by main.services.record_payment
+    paid_total = MoneyField(_('Ödənilmiş məbləğ'), default=0, editable=False)
     paid_date = models.DateTimeField(_('Ödəniş tarixi'), blank=True, null=True, help_text=_("Ödəniş tarixi və vaxtı"))
     payment_method = models.CharField(_('Ödəniş üsulu'), max_length=20, choices=PAYMENT_METHOD_CHOICES, blank=True, null=True, help_text=_("Ödəniş üsulu"))
+    search_key = models.CharField(_('Axtarış açarı'), max_length=500, blank=True, default='', editable=False)
     is_deleted = models.BooleanField(_('Silinib'), default=False, help_text=_("Borcun silinib-silinməməsi"))
     deleted_at = models.DateTimeField(_('Silinmə tarixi'), blank=True, null=True, help_text=_("Borcun silindiyi tarix və vaxt"))
     deleted_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='deleted_debts', verbose_name=_('Silən'))
     created_at = models.DateTimeField(_('Yaradılma tarixi'), auto_now_add=True)
-    updated_at = models.DateTimeField(_('Yenilənmə tarixi'), auto_now=True)
+    updated_at = models.DateTimeField(_('Yenilənmə tarixi'), auto_now=True, db_index=True)
+    # Asia/Baku dates of date_given / paid_date for day and month reports
+    given_local_date = LocalDateField(_('Verilmə günü'), source='date_given')
+    paid_local_date = LocalDateField(_('Ödəniş günü'), source='paid_date')
+    # Bumped by every write; edits made from a form check it (see save_if_unchanged)
+    version = models.PositiveIntegerField(_('Versiya'), default=1, editable=False)
 
     # Custom manager to exclude deleted debts by default
     objects = DebtManager()
@@ -112,6 +192,90 @@ class Debt(models.Model):
         status = _("Ödənilib") if self.is_paid else _("Ödənilməyib")
         return f"{self.customer} - {self.amount} ({status})"
 
+    def build_search_key(self):
+        """Customer key + cashier name + description, denormalized for list searches"""
+        return normalize_search_text(
+            self.customer.search_key or self.customer.build_search_key(),
+            self.cashier.name,
+            self.cashier.surname,
+            self.description,
+        )[:500]
+
+    def _with_derived_fields(self, update_fields):
+        """``update_fields`` plus the columns kept in step with them"""
+        update_fields = set(update_fields)
+        if {'customer', 'cashier', 'description'} & update_fields:
+            self.search_key = self.build_search_key()
+            update_fields.add('search_key')
+        if 'date_given' in update_fields:
+            update_fields.add('given_local_date')
+        if 'paid_date' in update_fields:
+            update_fields.add('paid_local_date')
+        return update_fields
+
+    def save(self, *args, **kwargs):
+        """Override save to maintain the denormalized search_key and bump the version"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.search_key = self.build_search_key()
+        else:
+            kwargs['update_fields'] = self._with_derived_fields(update_fields) | {'version'}
+        adding = self._state.adding
+        if not adding:
+            self.version = models.F('version') + 1
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeEvent.record(Debt, [self.pk], 'create' if adding else 'update')
+        if not adding:
+            self.refresh_from_db(fields=['version'])
+
+    def save_if_unchanged(self, update_fields, version=None):
+        """
+        Save ``update_fields`` only if the debt still has ``version`` (by
+        default the one this instance was read with), with a single
+        ``UPDATE ... WHERE id = %s AND version = %s`` that also bumps it.
+        Raises DebtConflict if someone else changed the debt meanwhile;
+        no lock is held between reading the debt and saving it.
+        """
+        expected = self.version if version is None else version
+        values = {}
+        for name in self._with_derived_fields(update_fields) | {'updated_at'}:
+            field = self._meta.get_field(name)
+            values[field.attname] = field.pre_save(self, add=False)
+        with transaction.atomic():
+            updated = Debt.all_objects.filter(pk=self.pk, version=expected).update(
+                version=models.F('version') + 1, **values
+            )
+            if updated:
+                ChangeEvent.record(Debt, [self.pk], 'update')
+        if not updated:
+            raise DebtConflict(
+                _('Bu borc siz açdıqdan sonra başqa istifadəçi tərəfindən dəyişdirilib. '
+                  'Cari məlumatları yoxlayıb yenidən cəhd edin.'),
+                code='conflict',
+            )
+        self.version = expected + 1
+
+    @classmethod
+    def refresh_search_keys(cls, debts, batch_size=500, touch=False):
+        """
+        Recompute search_key for the given debts with bulk updates. Pass
+        ``touch`` when the displayed customer or cashier name changed: every
+        debt then gets a new row version, even where the key folds to the
+        same text (Şahin -> Sahin, a case-only change).
+        """
+        now = timezone.now()
+        changed = []
+        for debt in debts.select_related('customer', 'cashier').iterator(chunk_size=batch_size):
+            key = debt.build_search_key()
+            if touch or key != debt.search_key:
+                debt.search_key = key
+                # Displayed customer/cashier data changed: bump the row version
+                debt.updated_at = now
+                changed.append(debt)
+        cls.all_objects.bulk_update(changed, ['search_key', 'updated_at'], batch_size=batch_size)
+        return len(changed)
+
     @property
     def is_overdue(self):
         """Check if the debt is overdue"""
@@ -128,13 +292,13 @@ class Debt(models.Model):
         today = timezone.now().date()
         return (today - self.promise_date).days
 
-    def mark_as_paid(self, payment_method=None):
-        """Mark debt as paid"""
+    def mark_as_paid(self, payment_method=None, version=None):
+        """Mark debt as paid; raises DebtConflict if it changed since ``version``"""
         self.is_paid = True
         self.paid_date = timezone.now()
         if payment_method:
             self.payment_method = payment_method
-        self.save()
+        self.save_if_unchanged(['is_paid', 'paid_date', 'payment_method'], version=version)
     
     def get_payment_method_display_az(self):
         """Get payment method display name in Azerbaijani"""
@@ -149,24 +313,29 @@ class Debt(models.Model):
     
     @property
     def paid_amount(self):
-        """Calculate total paid amount from partial payments"""
-        return self.payments.aggregate(total=models.Sum('amount'))['total'] or 0
+        """Total paid amount from partial payments (stored balance)"""
+        return self.paid_total
     
     @property
     def remaining_amount(self):
         """Calculate remaining amount to be paid"""
         return self.amount - self.paid_amount
     
-    def soft_delete(self, user):
-        """Soft delete the debt"""
+    def soft_delete(self, user, version=None):
+        """Soft delete the debt; raises DebtConflict if it changed since ``version``"""
         self.is_deleted = True
         self.deleted_at = timezone.now()
         self.deleted_by = user
-        self.save()
+        self.save_if_unchanged(['is_deleted', 'deleted_at', 'deleted_by'], version=version)
 
 
 class Payment(models.Model):
-    """Model for tracking partial payments on debts"""
+    """
+    Model for tracking partial payments on debts.
+
+    Record payments with ``main.services.record_payment``: it updates the
+    debt balance and the payment row in one transaction.
+    """
     PAYMENT_METHOD_CHOICES = [
         ('cash', _('Nağd')),
         ('card', _('Kart')),
@@ -174,12 +343,13 @@ class Payment(models.Model):
     ]
     
     debt = models.ForeignKey(Debt, on_delete=models.CASCADE, related_name='payments', verbose_name=_('Borc'))
-    amount = models.DecimalField(_('Məbləğ'), max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)])
+    amount = MoneyField(_('Məbləğ'), validators=[MinValueValidator(0.01)])
     payment_date = models.DateTimeField(_('Ödəniş tarixi'), default=timezone.now, help_text=_("Ödəniş tarixi və vaxtı"))
     payment_method = models.CharField(_('Ödəniş üsulu'), max_length=20, choices=PAYMENT_METHOD_CHOICES, help_text=_("Ödəniş üsulu"))
     notes = models.TextField(_('Qeydlər'), blank=True, null=True, help_text=_("Ödənişlə bağlı əlavə qeydlər"))
     created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='created_payments', verbose_name=_('Yaradan'))
     created_at = models.DateTimeField(_('Yaradılma tarixi'), auto_now_add=True)
+    payment_local_date = LocalDateField(_('Ödəniş günü'), source='payment_date')
     
     class Meta:
         ordering = ['-payment_date', '-created_at']
@@ -188,6 +358,12 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"{self.debt.customer} - {self.amount}₼ ({self.payment_date.strftime('%d.%m.%Y %H:%M')})"
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeEvent.record(Payment, [self.pk], 'create' if adding else 'update')
     
     def get_payment_method_display_az(self):
         """Get payment method display name in Azerbaijani"""
@@ -197,16 +373,6 @@ class Payment(models.Model):
             'posterminal': 'Posterminal',
         }
         return method_map.get(self.payment_method, self.payment_method)
-    
-    def save(self, *args, **kwargs):
-        """Override save to check if debt is fully paid"""
-        super().save(*args, **kwargs)
-        # Check if debt is fully paid after this payment
-        if self.debt.remaining_amount <= 0:
-            self.debt.is_paid = True
-            self.debt.paid_date = self.payment_date
-            self.debt.payment_method = self.payment_method
-            self.debt.save()
 
 
 class DebtEditRequest(models.Model):
@@ -230,8 +396,208 @@ class DebtEditRequest(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # The review queue: pending requests, oldest first
+        indexes = [models.Index(fields=['status', 'created_at'], name='edit_request_queue_idx')]
         verbose_name = _('Borc redaktə tələbi')
         verbose_name_plural = _('Borc redaktə tələbləri')
     
     def __str__(self):
         return f"{self.debt} - {self.get_status_display()} ({self.requested_by})"
+
+
+class ArchivedDebt(models.Model):
+    """
+    A settled or deleted debt moved out of the live table by
+    ``main.archive``. Keeps the id and all columns of the original Debt.
+    """
+    id = models.IntegerField(primary_key=True)
+    cashier = models.ForeignKey(Cashier, on_delete=models.CASCADE, related_name='archived_debts', verbose_name=_('Kassir'))
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_debts', verbose_name=_('Müştəri'))
+    amount = MoneyField(_('Məbləğ'))
+    date_given = models.DateTimeField(_('Verilmə tarixi'))
+    promise_date = models.DateField(_('Vəd tarixi'))
+    description = models.TextField(_('Təsvir'), blank=True, null=True)
+    is_paid = models.BooleanField(_('Ödənilib'), default=False)
+    paid_total = MoneyField(_('Ödənilmiş məbləğ'), default=0)
+    paid_date = models.DateTimeField(_('Ödəniş tarixi'), blank=True, null=True)
+    payment_method = models.CharField(_('Ödəniş üsulu'), max_length=20, choices=Debt.PAYMENT_METHOD_CHOICES, blank=True, null=True)
+    is_deleted = models.BooleanField(_('Silinib'), default=False)
+    deleted_at = models.DateTimeField(_('Silinmə tarixi'), blank=True, null=True)
+    deleted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name=_('Silən'))
+    created_at = models.DateTimeField(_('Yaradılma tarixi'))
+    updated_at = models.DateTimeField(_('Yenilənmə tarixi'))
+    given_local_date = LocalDateField(_('Verilmə günü'), source='date_given')
+    paid_local_date = LocalDateField(_('Ödəniş günü'), source='paid_date')
+    archived_at = models.DateTimeField(_('Arxivləşdirilmə tarixi'), auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date_given']
+        verbose_name = _('Arxiv borc')
+        verbose_name_plural = _('Arxiv borclar')
+
+    def __str__(self):
+        return f"{self.customer} - {self.amount} ({_('arxiv')})"
+
+
+class ArchivedPayment(models.Model):
+    """A payment of an archived debt; keeps the id of the original Payment"""
+    id = models.IntegerField(primary_key=True)
+    debt = models.ForeignKey(ArchivedDebt, on_delete=models.CASCADE, related_name='payments', verbose_name=_('Borc'))
+    amount = MoneyField(_('Məbləğ'))
+    payment_date = models.DateTimeField(_('Ödəniş tarixi'))
+    payment_method = models.CharField(_('Ödəniş üsulu'), max_length=20, choices=Payment.PAYMENT_METHOD_CHOICES)
+    notes = models.TextField(_('Qeydlər'), blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name=_('Yaradan'))
+    created_at = models.DateTimeField(_('Yaradılma tarixi'))
+    payment_local_date = LocalDateField(_('Ödəniş günü'), source='payment_date')
+
+    class Meta:
+        ordering = ['-payment_date']
+        verbose_name = _('Arxiv ödəniş')
+        verbose_name_plural = _('Arxiv ödənişlər')
+
+    def __str__(self):
+        return f"{self.debt.customer} - {self.amount}₼ ({self.payment_date.strftime('%d.%m.%Y %H:%M')})"
+
+
+class ArchivedMonthlyTotal(models.Model):
+    """
+    The archive's part of the dashboards' monthly figures for one cashier
+    and month, rebuilt by ``main.archive`` whenever debts are archived.
+    """
+    cashier = models.ForeignKey(Cashier, on_delete=models.CASCADE, related_name='+', verbose_name=_('Kassir'))
+    month = models.DateField(_('Ay'), help_text=_("Ayın birinci günü"))
+    given = MoneyField(_('Verilmiş borclar'), default=0)
+    returned = MoneyField(_('Qaytarılmış məbləğ'), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'cashier'], name='archived_month_cashier_unique'),
+        ]
+        verbose_name = _('Arxiv aylıq cəm')
+        verbose_name_plural = _('Arxiv aylıq cəmlər')
+
+    def __str__(self):
+        return f"{self.cashier} - {self.month:%m.%Y}"
+
+
+class JobRun(models.Model):
+    """One run of a scheduled job (``main.scheduler``)"""
+    STATUS_CHOICES = [
+        ('running', _('İcra olunur')),
+        ('success', _('Uğurlu')),
+        ('failed', _('Uğursuz')),
+    ]
+
+    job = models.CharField(_('Tapşırıq'), max_length=100)
+    status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(_('Başlama vaxtı'))
+    finished_at = models.DateTimeField(_('Bitmə vaxtı'), null=True, blank=True)
+    duration = models.DurationField(_('Müddət'), null=True, blank=True)
+    result = models.TextField(_('Nəticə'), blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        # Last runs of a job
+        indexes = [models.Index(fields=['job', '-started_at'], name='job_run_history_idx')]
+        verbose_name = _('Tapşırıq icrası')
+        verbose_name_plural = _('Tapşırıq icraları')
+
+    def __str__(self):
+        return f"{self.job} - {self.get_status_display()} ({self.started_at:%d.%m.%Y %H:%M})"
+
+
+class SchedulerLock(models.Model):
+    """Held by the one running scheduler; expires unless renewed"""
+    name = models.CharField(max_length=50, primary_key=True)
+    owner = models.CharField(max_length=200)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} ({self.owner})"
+
+
+class ChangeEvent(models.Model):
+    """
+    One change of a debt, payment or customer, written in the transaction
+    of the change itself (see ``main.outbox``). Rows are never updated;
+    ``id`` is the sequence number consumers read from.
+    """
+    ACTION_CHOICES = [
+        ('create', _('Yaradılıb')),
+        ('update', _('Dəyişdirilib')),
+        ('delete', _('Silinib')),
+        ('archive', _('Arxivləşdirilib')),
+    ]
+    # Derived columns, rebuilt from the others wherever the data lands
+    SKIPPED_FIELDS = {'search_key', 'given_local_date', 'paid_local_date', 'payment_local_date'}
+    BATCH_SIZE = 500
+
+    model = models.CharField(_('Model'), max_length=20)
+    object_id = models.BigIntegerField(_('Obyekt'))
+    action = models.CharField(_('Əməliyyat'), max_length=10, choices=ACTION_CHOICES)
+    data = models.JSONField(_('Məlumat'), null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(_('Yaradılma tarixi'), auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['model', 'object_id'], name='change_event_object_idx')]
+        verbose_name = _('Dəyişiklik')
+        verbose_name_plural = _('Dəyişikliklər')
+
+    def __str__(self):
+        return f"#{self.pk} {self.model} {self.object_id} {self.action}"
+
+    @classmethod
+    def row_fields(cls, model):
+        """Columns of ``model`` kept in an event's data"""
+        return [f.attname for f in model._meta.concrete_fields if f.name not in cls.SKIPPED_FIELDS]
+
+    @classmethod
+    def record(cls, model, ids, action):
+        """
+        Append one event per row ``ids`` of ``model``, with the row as it is
+        now (no data for deletes and archiving). Call it inside the
+        transaction that made the change.
+        """
+        ids = list(ids)
+        rows = {}
+        if action in ('create', 'update'):
+            fields = cls.row_fields(model)
+            for start in range(0, len(ids), cls.BATCH_SIZE):
+                batch = model._base_manager.filter(pk__in=ids[start:start + cls.BATCH_SIZE]).values(*fields)
+                rows.update((row['id'], row) for row in batch)
+        cls.objects.bulk_create(
+            [cls(model=model._meta.model_name, object_id=pk, action=action, data=rows.get(pk)) for pk in ids],
+            batch_size=cls.BATCH_SIZE,
+        )
+
+
+class OutboxCursor(models.Model):
+    """How far a consumer of the change events has read (``main.outbox.consume``)"""
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class ReplicaKey(models.Model):
+    """The head office row a branch row was imported into"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='+')
+    model = models.CharField(max_length=20)
+    source_id = models.BigIntegerField()
+    local_id = models.BigIntegerField()
+    # When the last applied change was made at the branch
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'model', 'source_id'], name='replica_key_source_unique'),
+        ]
+        # Which branches share a head office row
+        indexes = [models.Index(fields=['model', 'local_id'], name='replica_key_local_idx')]
+
+    def __str__(self):
+        return f"{self.branch_id}:{self.model}:{self.source_id} -> {self.local_id}"
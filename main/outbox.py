@@ -0,0 +1,109 @@
+"""
+Change data capture for debts, payments and customers.
+
+Every write to these tables appends ``ChangeEvent`` rows in the same
+transaction: ``save()`` of the three models (so ``mark_as_paid``,
+``soft_delete`` and form edits too), the bulk paths (payments, batch
+payments, approved edit requests, imports, customer merges), deletes
+(through ``post_delete``, so cascades and the admin are covered) and
+archiving. An event holds the model, the row id, the action and the row
+as it is after the change.
+
+Event ids are the sequence: SQLite hands them out with AUTOINCREMENT
+(never reused) and runs one write transaction at a time, so a reader
+that has seen event N has seen every event committed before it.
+Consumers keep their position in an ``OutboxCursor`` and ask for what
+came after it, instead of rescanning the tables:
+
+    def handle(events):
+        for event in events:
+            ...
+
+    consume('1c-export', handle)
+
+Derived columns (search keys, local dates) and their rebuilds are not
+recorded. Old events that every consumer has read are deleted by the
+scheduler after ``RETENTION_DAYS``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ChangeEvent, Customer, Debt, OutboxCursor, Payment
+
+DEFAULT_BATCH_SIZE = 500
+RETENTION_DAYS = 180
+
+_record_deletes = ContextVar('outbox_record_deletes', default=True)
+
+
+@contextmanager
+def deletes_not_recorded():
+    """Deletes inside the block are recorded by the caller (archiving)"""
+    token = _record_deletes.set(False)
+    try:
+        yield
+    finally:
+        _record_deletes.reset(token)
+
+
+@receiver(post_delete, sender=Debt)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Customer)
+def _record_delete(sender, instance, **kwargs):
+    if _record_deletes.get():
+        ChangeEvent.record(sender, [instance.pk], 'delete')
+
+
+def last_sequence():
+    """Id of the newest event (0 if there is none)"""
+    return ChangeEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def read_changes(after=0, limit=DEFAULT_BATCH_SIZE, models=None):
+    """
+    Events with an id above ``after``, oldest first, at most ``limit``.
+    ``models`` limits them to those model names ('debt', 'payment',
+    'customer').
+    """
+    events = ChangeEvent.objects.filter(id__gt=after)
+    if models:
+        events = events.filter(model__in=models)
+    return list(events.order_by('id')[:limit])
+
+
+def consume(name, handler, batch_size=DEFAULT_BATCH_SIZE, models=None):
+    """
+    Pass the events after the cursor ``name`` to ``handler(events)`` batch
+    by batch and move the cursor past each batch, in one transaction with
+    the handler's own database writes. A failing handler leaves the
+    cursor where it was; side effects outside the database may repeat.
+    Returns the number of events handled.
+    """
+    handled = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = OutboxCursor.objects.get_or_create(name=name)
+            events = read_changes(cursor.position, batch_size, models)
+            if not events:
+                return handled
+            handler(events)
+            cursor.position = events[-1].id
+            cursor.save(update_fields=['position', 'updated_at'])
+        handled += len(events)
+
+
+def prune_changes(days=RETENTION_DAYS):
+    """Delete events older than ``days`` that every consumer has read; returns how many"""
+    events = ChangeEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    slowest = OutboxCursor.objects.aggregate(position=Min('position'))['position']
+    if slowest is not None:
+        events = events.filter(id__lte=slowest)
+    deleted, _ = events.delete()
+    return deleted
@@ -0,0 +1,121 @@
+"""
+Lightweight row projections for list pages.
+
+List templates only show a handful of columns, but iterating model
+instances loads every field (including TextFields) and calling
+related customer/cashier objects costs extra work per row. The helpers
+here fetch exactly the needed columns (including the stored
+``paid_total`` balance) with one ``values()`` query and wrap each row in a small slotted dataclass that exposes the same
+attribute names the templates already use.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from .models import Customer
+
+PAYMENT_METHOD_DISPLAY_AZ = {
+    'cash': 'Nağd',
+    'card': 'Kart',
+    'posterminal': 'Posterminal',
+}
+
+DEBT_ROW_FIELDS = (
+    'pk', 'amount', 'paid_total', 'date_given', 'promise_date', 'is_paid', 'payment_method', 'updated_at',
+    'customer__name', 'customer__surname', 'customer__place',
+    'cashier__name', 'cashier__surname',
+)
+
+CUSTOMER_ROW_FIELDS = ('pk', 'surname', 'name', 'patronymic', 'place', 'phone')
+
+# Enough characters for the "truncatewords:10" address column
+ADDRESS_PREVIEW_LENGTH = 120
+
+
+@dataclass(slots=True)
+class CustomerRef:
+    """Customer columns shown next to a debt"""
+    name: str
+    surname: str
+    place: str
+
+    def __str__(self):
+        return f"{self.surname} {self.name} ({self.place})"
+
+
+@dataclass(slots=True)
+class CashierRef:
+    """Cashier columns shown next to a debt"""
+    name: str
+    surname: str
+
+    def __str__(self):
+        return f"{self.name} {self.surname}"
+
+
+@dataclass(slots=True)
+class DebtRow:
+    """One debt row with precomputed payment/overdue figures"""
+    pk: int
+    amount: Decimal
+    paid_amount: Decimal
+    remaining_amount: Decimal
+    date_given: datetime
+    promise_date: date
+    is_paid: bool
+    payment_method: str
+    is_overdue: bool
+    days_overdue: int
+    updated_at: datetime
+    customer: CustomerRef
+    cashier: CashierRef
+
+    @property
+    def id(self):
+        return self.pk
+
+    def get_payment_method_display_az(self):
+        """Get payment method display name in Azerbaijani"""
+        if not self.payment_method:
+            return '-'
+        return PAYMENT_METHOD_DISPLAY_AZ.get(self.payment_method, self.payment_method)
+
+
+def debt_rows(queryset, today=None):
+    """Evaluate a Debt queryset into a list of DebtRow (one query)"""
+    if today is None:
+        today = timezone.now().date()
+    rows = []
+    for values in queryset.values(*DEBT_ROW_FIELDS):
+        paid = values['paid_total'] or Decimal('0')
+        is_paid = values['is_paid']
+        promise_date = values['promise_date']
+        is_overdue = not is_paid and promise_date < today
+        rows.append(DebtRow(
+            pk=values['pk'],
+            amount=values['amount'],
+            paid_amount=paid,
+            remaining_amount=values['amount'] - paid,
+            date_given=values['date_given'],
+            promise_date=promise_date,
+            is_paid=is_paid,
+            payment_method=values['payment_method'],
+            is_overdue=is_overdue,
+            days_overdue=(today - promise_date).days if is_overdue else 0,
+            updated_at=values['updated_at'],
+            customer=CustomerRef(values['customer__name'], values['customer__surname'], values['customer__place']),
+            cashier=CashierRef(values['cashier__name'], values['cashier__surname']),
+        ))
+    return rows
+
+
+def customer_rows(queryset=None):
+    """Customer list columns as dicts, with a short address preview instead of the full TextField"""
+    if queryset is None:
+        queryset = Customer.objects.all()
+    return queryset.annotate(
+        address_preview=Substr('address', 1, ADDRESS_PREVIEW_LENGTH)
+    ).values(*CUSTOMER_ROW_FIELDS, 'address_preview')
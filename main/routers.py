@@ -0,0 +1,76 @@
+"""
+Read-only reporting connection.
+
+Report pages (dashboards, all-debts list, today's operations, reminders,
+statement exports) run long read queries. Wrapped in ``reports_db`` they
+read through the ``reports`` alias: a second SQLite connection opened
+with ``mode=ro`` on the same file (or on a snapshot, see
+``REPORTS_DATABASE`` in settings). With the database in WAL mode those
+scans neither wait for nor hold up the cashiers' writes on ``default``.
+
+Writes always go to ``default``, also for objects read from ``reports``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPORTS_DB_ALIAS = 'reports'
+
+_reading_reports = ContextVar('reading_reports', default=False)
+
+
+@contextmanager
+def reports_reads():
+    """Route ORM reads to the reports connection inside the block"""
+    token = _reading_reports.set(True)
+    try:
+        yield
+    finally:
+        _reading_reports.reset(token)
+
+
+def reports_db(view_func):
+    """View decorator: the view's (and its streamed response's) reads use ``reports``"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with reports_reads():
+            response = view_func(request, *args, **kwargs)
+        if getattr(response, 'streaming', False):
+            response.streaming_content = _iter_in_reports(response.streaming_content)
+        return response
+    return wrapper
+
+
+def _iter_in_reports(content):
+    # Streamed rows are produced after the view returned
+    with reports_reads():
+        yield from content
+
+
+def read_db_alias():
+    """Alias the current reads go to (for raw SQL cursors)"""
+    if _reading_reports.get() and REPORTS_DB_ALIAS in settings.DATABASES:
+        return REPORTS_DB_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+class ReportsRouter:
+    """Sends reads inside ``reports_reads`` to the read-only alias"""
+
+    def db_for_read(self, model, **hints):
+        alias = read_db_alias()
+        return alias if alias != DEFAULT_DB_ALIAS else None
+
+    def db_for_write(self, model, **hints):
+        # Never the read-only alias, even for instances loaded from it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPORTS_DB_ALIAS
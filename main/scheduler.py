@@ -0,0 +1,226 @@
+"""
+A small in-process scheduler for periodic work.
+
+Jobs are plain functions registered with a cron expression (local time,
+``minute hour day-of-month month day-of-week``, with ``*``, ``*/n``,
+ranges and lists):
+
+    @job('backup', '30 1 * * *')
+    def backup():
+        ...
+        return 'short summary for the run history'
+
+``manage.py run_scheduler`` wakes up every minute and runs the jobs due
+in that minute one after another, in the scheduler process, so nightly
+rollups and housekeeping never run on a request. Each run is recorded as
+a ``JobRun`` (start, duration, status, summary or traceback).
+
+Only one scheduler may run against a database, wherever it is started:
+it holds the ``SchedulerLock`` row, renewed by a heartbeat thread; a
+second scheduler waits until the lock expires (the first one died) or
+exits with ``--once``.
+"""
+import os
+import socket
+import threading
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobRun, SchedulerLock
+
+LOCK_NAME = 'scheduler'
+# The lock is renewed every LOCK_HEARTBEAT; a scheduler that stops renewing loses it after LOCK_TTL
+LOCK_TTL = timedelta(minutes=5)
+LOCK_HEARTBEAT = timedelta(minutes=1)
+
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),  # 0 and 7 = Sunday, as in cron
+)
+
+
+def _parse_cron_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-'))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f'{text!r} is out of range {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class Cron:
+    """A parsed cron expression"""
+    expression: str
+    minute: frozenset
+    hour: frozenset
+    day: frozenset
+    month: frozenset
+    weekday: frozenset
+    # Day of month and weekday both restricted: either may match (cron rule)
+    any_day: bool
+
+    @classmethod
+    def parse(cls, expression):
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f'{expression!r}: expected 5 fields (minute hour day month weekday)')
+        parsed = {
+            name: _parse_cron_field(text, low, high)
+            for text, (name, low, high) in zip(fields, CRON_FIELDS)
+        }
+        parsed['weekday'] = frozenset(day % 7 for day in parsed['weekday'])
+        return cls(expression=expression, any_day=fields[2] != '*' and fields[4] != '*', **parsed)
+
+    def matches(self, moment):
+        """Whether the local datetime ``moment`` (to the minute) is due"""
+        day = moment.day in self.day
+        weekday = (moment.weekday() + 1) % 7 in self.weekday
+        return (
+            moment.minute in self.minute
+            and moment.hour in self.hour
+            and moment.month in self.month
+            and (day or weekday if self.any_day else day and weekday)
+        )
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    cron: Cron
+    func: object
+    description: str
+
+
+JOBS = {}
+
+
+def job(name, schedule):
+    """Register the decorated function as the job ``name`` run on ``schedule``"""
+    cron = Cron.parse(schedule)
+
+    def register(func):
+        JOBS[name] = Job(name, cron, func, (func.__doc__ or '').strip().split('\n')[0])
+        return func
+    return register
+
+
+def due_jobs(moment):
+    """Registered jobs due at the local datetime ``moment``"""
+    return [scheduled for scheduled in JOBS.values() if scheduled.cron.matches(moment)]
+
+
+def run_job(job):
+    """Run ``job`` now and record it; returns the JobRun"""
+    started = timezone.now()
+    run = JobRun.objects.create(job=job.name, started_at=started)
+    try:
+        result = job.func()
+    except Exception:
+        run.status = 'failed'
+        run.result = traceback.format_exc()
+    else:
+        run.status = 'success'
+        run.result = '' if result is None else str(result)
+    run.finished_at = timezone.now()
+    run.duration = run.finished_at - started
+    run.save(update_fields=['status', 'result', 'finished_at', 'duration'])
+    return run
+
+
+def last_runs():
+    """The latest JobRun of every job that has run, by job name"""
+    runs = {}
+    for name in JOBS:
+        run = JobRun.objects.filter(job=name).first()
+        if run:
+            runs[name] = run
+    return runs
+
+
+class SchedulerLockHeld(Exception):
+    pass
+
+
+class DatabaseLock:
+    """
+    The single-scheduler lock: a ``SchedulerLock`` row taken over only
+    when free or expired, renewed by a background thread while held.
+    """
+
+    def __init__(self, name=LOCK_NAME, ttl=LOCK_TTL, heartbeat=LOCK_HEARTBEAT):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _claim(self):
+        now = timezone.now()
+        expires_at = now + self.ttl
+        with transaction.atomic():
+            claimed = SchedulerLock.objects.filter(
+                Q(owner=self.owner) | Q(expires_at__lt=now), name=self.name,
+            ).update(owner=self.owner, expires_at=expires_at)
+            if claimed:
+                return True
+            try:
+                with transaction.atomic():
+                    SchedulerLock.objects.create(name=self.name, owner=self.owner, expires_at=expires_at)
+            except IntegrityError:
+                return False
+        return True
+
+    def holder(self):
+        """(owner, expires_at) of the current lock, or None"""
+        return SchedulerLock.objects.filter(name=self.name, expires_at__gte=timezone.now()).values_list(
+            'owner', 'expires_at'
+        ).first()
+
+    def acquire(self):
+        """Take the lock and start renewing it; raises SchedulerLockHeld"""
+        if not self._claim():
+            raise SchedulerLockHeld(self.holder())
+        self._thread = threading.Thread(target=self._renew, name='scheduler-lock', daemon=True)
+        self._thread.start()
+
+    def _renew(self):
+        try:
+            while not self._stop.wait(self.heartbeat.total_seconds()):
+                try:
+                    claimed = self._claim()
+                except DatabaseError:
+                    # Database busy; the lock outlives a few missed heartbeats
+                    continue
+                if not claimed:
+                    self.lost.set()
+                    return
+        finally:
+            connection.close()
+
+    def release(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        SchedulerLock.objects.filter(name=self.name, owner=self.owner).delete()
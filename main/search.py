@@ -0,0 +1,64 @@
+"""
+Normalized search keys for customers and debts.
+
+Names reach the database in Azerbaijani Latin, Azerbaijani Cyrillic and
+Russian spellings (1C exports are usually Cyrillic, the counter types
+Latin). Every text is folded to one lowercase ASCII form so that
+"Şahin", "Шахин" and "Shahin" end up with the same key.
+"""
+import re
+
+# Cyrillic (Russian + Azerbaijani Cyrillic) -> Azerbaijani Latin
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'q', 'ғ': 'ğ', 'д': 'd', 'е': 'e',
+    'ё': 'yo', 'ә': 'ə', 'ж': 'j', 'з': 'z', 'и': 'i', 'ы': 'ı', 'й': 'y',
+    'ј': 'y', 'к': 'k', 'ҝ': 'g', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'ө': 'ö', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ү': 'ü',
+    'ф': 'f', 'х': 'x', 'һ': 'h', 'ц': 'ts', 'ч': 'ç', 'ҹ': 'c', 'ш': 'ş',
+    'щ': 'ş', 'ъ': '', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Azerbaijani Latin letters folded to plain ASCII
+LATIN_FOLD = {
+    'ə': 'a', 'ı': 'i', 'i̇': 'i', 'ö': 'o', 'ü': 'u', 'ç': 'c', 'ş': 's', 'ğ': 'g',
+}
+
+# Spelling variants that mean the same sound (Shahin/Şahin, Gasimov/Qasımov,
+# Khalilov/Xəlilov/Халилов). Applied after folding, order matters.
+DIGRAPH_FOLD = [
+    ('sh', 's'), ('ch', 'c'), ('zh', 'j'), ('kh', 'h'), ('x', 'h'), ('q', 'g'),
+]
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_search_text(*parts):
+    """Fold any number of text parts into one normalized search string"""
+    text = ' '.join(str(p) for p in parts if p)
+    if not text:
+        return ''
+    text = text.lower()
+    text = ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text)
+    for src, dst in LATIN_FOLD.items():
+        text = text.replace(src, dst)
+    for src, dst in DIGRAPH_FOLD:
+        text = text.replace(src, dst)
+    return ' '.join(NON_WORD_RE.sub(' ', text).split())
+
+
+def search_terms(query):
+    """Split a user query into normalized terms (each must match)"""
+    return normalize_search_text(query).split()
+
+
+def filter_by_search_key(queryset, query, field='search_key'):
+    """
+    Filter a queryset so every term of the query is found in its search key.
+
+    Terms match anywhere in the key (LIKE '%term%'), so this is a scan of
+    one short column rather than an index lookup; it replaces OR-ed
+    icontains over several joined columns.
+    """
+    for term in search_terms(query):
+        queryset = queryset.filter(**{f'{field}__contains': term})
+    return queryset
@@ -0,0 +1,238 @@
+"""
+Write operations that must stay consistent under concurrent terminals.
+
+A payment changes two rows: the new Payment and the balance of its debt
+(``paid_total``, ``is_paid``). Both are written in one transaction, and
+the debt is updated with a single conditional UPDATE:
+
+    UPDATE debt SET paid_total = paid_total + :amount,
+                    is_paid = (amount <= paid_total + :amount), ...
+     WHERE id = :id AND NOT is_paid AND NOT is_deleted
+       AND paid_total + :amount <= amount
+
+The UPDATE takes the row lock (the database write lock on SQLite) before
+the condition is checked, so two cashiers paying the same debt at once
+are serialized: the second one sees the first payment and is rejected if
+it would overpay. No value is read in Python and written back.
+
+Batches of payments (end-of-day reconciliation) read all balances with
+one locking query, insert the payments with ``bulk_create`` and apply
+them with two UPDATEs, inside one transaction. On SQLite the
+transaction starts with BEGIN IMMEDIATE (see DATABASES in settings), so
+the balances cannot change between that read and the writes.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import CharField, Case, DateField, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .fields import MoneyField, local_date
+from .models import ChangeEvent, Debt, Payment
+from .projections import PAYMENT_METHOD_DISPLAY_AZ
+
+
+class PaymentError(ValidationError):
+    """A payment that cannot be applied to the debt (paid, deleted or overpaid)"""
+
+
+def _balance_update(amount, payment_date, payment_method):
+    """UPDATE kwargs adding ``amount`` to a debt and settling it if covered"""
+    amount = Value(amount, output_field=MoneyField())
+    settles = Q(amount__lte=F('paid_total') + amount)
+    return {
+        'paid_total': F('paid_total') + amount,
+        'is_paid': Case(When(settles, then=Value(True)), default=Value(False)),
+        'paid_date': Case(
+            When(settles, then=Value(payment_date, output_field=DateTimeField())),
+            default=F('paid_date'),
+        ),
+        # UPDATE skips pre_save; keep the local date in step with paid_date
+        'paid_local_date': Case(
+            When(settles, then=Value(local_date(payment_date))),
+            default=F('paid_local_date'),
+            output_field=DateField(),
+        ),
+        'payment_method': Case(When(settles, then=Value(payment_method)), default=F('payment_method')),
+        # Bulk UPDATE bypasses auto_now; the row version must still change
+        'updated_at': timezone.now(),
+        'version': F('version') + 1,
+    }
+
+
+def _rejection(debt_id):
+    """PaymentError explaining why the conditional UPDATE matched nothing"""
+    state = Debt.all_objects.filter(pk=debt_id).values('is_paid', 'is_deleted', 'amount', 'paid_total').first()
+    if state is None or state['is_deleted']:
+        return PaymentError(_('Borc tapılmadı'), code='missing')
+    if state['is_paid']:
+        return PaymentError(_('Bu borc artıq tam ödənilib.'), code='paid')
+    return PaymentError(
+        _('Ödəniş məbləği qalan məbləğdən ({remaining}₼) çox ola bilməz.').format(
+            remaining=state['amount'] - state['paid_total']
+        ),
+        code='overpaid',
+    )
+
+
+def record_payment(debt, amount, payment_method, payment_date=None, notes=None, created_by=None):
+    """
+    Record a partial payment atomically and return the Payment.
+
+    ``debt`` is refreshed with the new balance. Raises PaymentError if the
+    debt is paid, deleted or the amount exceeds what is left.
+    """
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise PaymentError(_('Məbləğ 0-dan böyük olmalıdır.'), code='invalid')
+    if payment_date is None:
+        payment_date = timezone.now()
+    elif timezone.is_naive(payment_date):
+        payment_date = timezone.make_aware(payment_date)
+
+    with transaction.atomic():
+        updated = Debt.objects.filter(
+            pk=debt.pk,
+            is_paid=False,
+            paid_total__lte=F('amount') - Value(amount, output_field=MoneyField()),
+        ).update(**_balance_update(amount, payment_date, payment_method))
+        if not updated:
+            raise _rejection(debt.pk)
+        ChangeEvent.record(Debt, [debt.pk], 'update')
+        payment = Payment.objects.create(
+            debt=debt,
+            amount=amount,
+            payment_date=payment_date,
+            payment_method=payment_method,
+            notes=notes,
+            created_by=created_by,
+        )
+
+    debt.refresh_from_db(fields=['paid_total', 'is_paid', 'paid_date', 'payment_method', 'updated_at', 'version'])
+    return payment
+
+
+# Upper bound for one batch; keeps the CASE expressions of the UPDATEs small
+MAX_BATCH_PAYMENTS = 1000
+
+
+def record_payments_batch(rows, created_by=None, cashier=None, skip_invalid=False):
+    """
+    Validate and record many payments in one transaction.
+
+    ``rows`` come from ``utils.parse_payment_rows`` (debt_id, amount,
+    payment_method, payment_date, error). Each row gets a ``status``:
+    ``ok`` (recorded), ``valid`` (correct but not recorded because other
+    rows failed) or ``error``, plus the customer and the remaining balance
+    after it. Nothing is written if any row fails, unless ``skip_invalid``.
+    ``cashier`` limits the batch to that cashier's debts.
+    """
+    debt_ids = {row['debt_id'] for row in rows if not row['error']}
+
+    with transaction.atomic():
+        debts = Debt.objects.select_for_update().filter(pk__in=debt_ids)
+        if cashier is not None:
+            debts = debts.filter(cashier=cashier)
+        balances = {
+            values['pk']: values
+            for values in debts.values('pk', 'amount', 'paid_total', 'is_paid', 'customer__surname', 'customer__name')
+        }
+
+        remaining = {pk: values['amount'] - values['paid_total'] for pk, values in balances.items()}
+        accepted = []
+        for row in rows:
+            row['payment_method_display'] = PAYMENT_METHOD_DISPLAY_AZ.get(row['payment_method'])
+            if row['error']:
+                continue
+            debt = balances.get(row['debt_id'])
+            if debt is None:
+                row['error'] = _('Borc tapılmadı')
+                continue
+            row['customer'] = f"{debt['customer__surname']} {debt['customer__name']}"
+            if debt['is_paid']:
+                row['error'] = _('Bu borc artıq tam ödənilib.')
+                continue
+            left = remaining[row['debt_id']]
+            if row['amount'] > left:
+                row['error'] = _('Ödəniş məbləği qalan məbləğdən ({remaining}₼) çox ola bilməz.').format(remaining=left)
+                continue
+            remaining[row['debt_id']] = left - row['amount']
+            row['remaining'] = remaining[row['debt_id']]
+            accepted.append(row)
+
+        failed = [row for row in rows if row['error']]
+        for row in failed:
+            row['status'] = 'error'
+        result = {
+            'rows': rows,
+            'committed': False,
+            'posted': 0,
+            'posted_total': Decimal('0'),
+            'settled': 0,
+            'failed': len(failed),
+        }
+        if not accepted or (failed and not skip_invalid):
+            for row in accepted:
+                row['status'] = 'valid'
+            return result
+
+        payments = Payment.objects.bulk_create([
+            Payment(
+                debt_id=row['debt_id'],
+                amount=row['amount'],
+                payment_date=row['payment_date'],
+                payment_method=row['payment_method'],
+                created_by=created_by,
+            )
+            for row in accepted
+        ])
+        ChangeEvent.record(Payment, [payment.pk for payment in payments], 'create')
+
+        added = defaultdict(Decimal)
+        settling = {}
+        for row in accepted:
+            added[row['debt_id']] += row['amount']
+            if row['remaining'] == 0:
+                settling[row['debt_id']] = row
+            row['status'] = 'ok'
+
+        now = timezone.now()
+        money = MoneyField()
+        Debt.objects.filter(pk__in=added).update(
+            paid_total=F('paid_total') + Case(
+                *[When(pk=pk, then=Value(total, output_field=money)) for pk, total in added.items()],
+                output_field=money,
+            ),
+            updated_at=now,
+            version=F('version') + 1,
+        )
+        if settling:
+            Debt.objects.filter(pk__in=settling, is_paid=False).update(
+                is_paid=True,
+                paid_date=Case(
+                    *[When(pk=pk, then=Value(row['payment_date'])) for pk, row in settling.items()],
+                    output_field=DateTimeField(),
+                ),
+                paid_local_date=Case(
+                    *[When(pk=pk, then=Value(local_date(row['payment_date']))) for pk, row in settling.items()],
+                    output_field=DateField(),
+                ),
+                payment_method=Case(
+                    *[When(pk=pk, then=Value(row['payment_method'])) for pk, row in settling.items()],
+                    output_field=CharField(),
+                ),
+                updated_at=now,
+                version=F('version') + 1,
+            )
+        ChangeEvent.record(Debt, list(added), 'update')
+
+    result.update(
+        committed=True,
+        posted=len(accepted),
+        posted_total=sum(added.values(), Decimal('0')),
+        settled=len(settling),
+    )
+    return result
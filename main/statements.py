@@ -0,0 +1,179 @@
+"""
+Customer account statements.
+
+A statement lists every debt (charge), payment and manual settlement of a
+customer in chronological order with the balance after each entry. The
+entries come from one UNION ALL query and the running balance, the
+entry count and the totals are window functions over it (SQLite 3.25+),
+so a page of a long history costs one query and no Python-side sums:
+
+    debt        +amount       at date_given
+    payment     -amount       at payment_date
+    settlement  -(amount - paid_total) at paid_date, for debts marked
+                paid without payments covering them ("Tam ödənildi")
+
+Soft-deleted debts and their payments are left out. Archived debts
+(``main.archive``) are part of the statement like live ones.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fields import from_minor_units
+from .models import ArchivedDebt, ArchivedPayment, Debt, Payment
+from .projections import PAYMENT_METHOD_DISPLAY_AZ
+from .routers import read_db_alias
+
+ENTRY_KINDS = ('debt', 'payment', 'settlement')
+
+# Entries of one debt/payment table pair; used for the live and the archive tables
+ENTRY_SQL = """
+    SELECT d.date_given AS entry_date, 0 AS kind, d.id AS debt_id, 0 AS payment_id,
+           d.amount AS amount, d.description AS details, NULL AS payment_method, {archived} AS archived
+      FROM {debt} d
+     WHERE d.customer_id = %(customer)s AND NOT d.is_deleted {cashier_filter}
+    UNION ALL
+    SELECT p.payment_date, 1, p.debt_id, p.id, -p.amount, p.notes, p.payment_method, {archived}
+      FROM {payment} p JOIN {debt} d ON d.id = p.debt_id
+     WHERE d.customer_id = %(customer)s AND NOT d.is_deleted {cashier_filter}
+    UNION ALL
+    SELECT COALESCE(d.paid_date, d.updated_at), 2, d.id, 0, d.paid_total - d.amount, NULL, d.payment_method, {archived}
+      FROM {debt} d
+     WHERE d.customer_id = %(customer)s AND NOT d.is_deleted {cashier_filter}
+       AND d.is_paid AND d.amount > d.paid_total
+"""
+
+STATEMENT_SQL = """
+WITH entries AS ({entries})
+SELECT entry_date, kind, debt_id, payment_id, amount, details, payment_method, archived,
+       SUM(amount) OVER (ORDER BY entry_date, kind, debt_id, payment_id ROWS UNBOUNDED PRECEDING) AS balance,
+       COUNT(*) OVER () AS entry_count,
+       SUM(CASE WHEN kind = 0 THEN amount ELSE 0 END) OVER () AS total_debt,
+       SUM(amount) OVER () AS total_balance
+  FROM entries
+ ORDER BY entry_date, kind, debt_id, payment_id
+"""
+
+
+@dataclass(slots=True)
+class StatementEntry:
+    """One line of a customer statement"""
+    date: datetime
+    kind: str
+    debt_id: int
+    payment_id: int | None
+    archived: bool
+    amount: Decimal
+    balance: Decimal
+    details: str
+    payment_method: str | None
+
+    @property
+    def charge(self):
+        return self.amount if self.amount > 0 else None
+
+    @property
+    def credit(self):
+        return -self.amount if self.amount < 0 else None
+
+    def get_payment_method_display_az(self):
+        if not self.payment_method:
+            return '-'
+        return PAYMENT_METHOD_DISPLAY_AZ.get(self.payment_method, self.payment_method)
+
+
+def _money(value):
+    # Amounts and their sums come back as integer qəpik (see MoneyField)
+    return from_minor_units(value or 0)
+
+
+def _datetime(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def _query(customer, cashier=None, limit=None, offset=0):
+    params = {'customer': customer.pk}
+    cashier_filter = ''
+    if cashier is not None:
+        cashier_filter = 'AND d.cashier_id = %(cashier)s'
+        params['cashier'] = cashier.pk
+    quote = connections[read_db_alias()].ops.quote_name
+    entries = ' UNION ALL '.join(
+        ENTRY_SQL.format(
+            debt=quote(debt_model._meta.db_table),
+            payment=quote(payment_model._meta.db_table),
+            cashier_filter=cashier_filter,
+            archived=archived,
+        )
+        for debt_model, payment_model, archived in ((Debt, Payment, 0), (ArchivedDebt, ArchivedPayment, 1))
+    )
+    sql = STATEMENT_SQL.format(entries=entries)
+    if limit is not None:
+        sql += ' LIMIT %(limit)s OFFSET %(offset)s'
+        params.update(limit=limit, offset=offset)
+    return sql, params
+
+
+def _entry(row):
+    entry_date, kind, debt_id, payment_id, amount, details, payment_method, archived, balance = row[:9]
+    return StatementEntry(
+        date=_datetime(entry_date),
+        kind=ENTRY_KINDS[kind],
+        debt_id=debt_id,
+        payment_id=payment_id or None,
+        archived=bool(archived),
+        amount=_money(amount),
+        balance=_money(balance),
+        details=details or '',
+        payment_method=payment_method,
+    )
+
+
+def customer_statement(customer, cashier=None, limit=None, offset=0):
+    """
+    One page of the statement (``limit`` entries from ``offset``, all if
+    ``limit`` is None) and the totals of the whole statement:
+    ``{'entries', 'count', 'total_debt', 'total_paid', 'balance'}``.
+    ``cashier`` limits the statement to that cashier's debts.
+    """
+    sql, params = _query(customer, cashier, limit, offset)
+    with connections[read_db_alias()].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    if not rows and offset:
+        # Past the last page: the totals still have to be right
+        return {**customer_statement(customer, cashier, limit=1), 'entries': []}
+    if not rows:
+        zero = Decimal('0.00')
+        return {'entries': [], 'count': 0, 'total_debt': zero, 'total_paid': zero, 'balance': zero}
+
+    count, total_debt, balance = rows[0][9], _money(rows[0][10]), _money(rows[0][11])
+    return {
+        'entries': [_entry(row) for row in rows],
+        'count': count,
+        'total_debt': total_debt,
+        'total_paid': total_debt - balance,
+        'balance': balance,
+    }
+
+
+def iter_statement(customer, cashier=None, chunk_size=500):
+    """All statement entries, fetched from one query in chunks (for exports)"""
+    sql, params = _query(customer, cashier)
+    with connections[read_db_alias()].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _entry(row)
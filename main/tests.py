@@ -1,3 +1,338 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .branch_sync import FORMAT_VERSION, SyncGap, batch_filename, import_batch
+from .dedup import _profile, is_duplicate
+from .edit_requests import approve_requests, pending_count, submit_edit_request
+from .models import Cashier, Customer, Debt, ReplicaKey
+from .services import PaymentError, record_payment, record_payments_batch
+from .utils import import_debts_from_data
+
+
+def make_debt(amount='100.00', **kwargs):
+    cashier = Cashier.objects.get_or_create(name='Aygün', surname='Həsənova')[0]
+    customer = Customer.objects.get_or_create(name='Əli', surname='Məmmədov', place='Bakı')[0]
+    return Debt.objects.create(
+        cashier=cashier, customer=customer, amount=Decimal(amount),
+        promise_date=timezone.localdate() + timedelta(days=30), **kwargs,
+    )
+
+
+def payment_row(debt, amount, method='cash'):
+    """A row as utils.parse_payment_rows returns it"""
+    return {
+        'line': 1, 'source': '', 'debt_id': debt.pk, 'amount': Decimal(amount),
+        'payment_method': method, 'payment_date': timezone.now(), 'error': None,
+    }
+
+
+class RecordPaymentTests(TestCase):
+    """Payments applied with one conditional UPDATE (services.record_payment)"""
+
+    def test_partial_payment(self):
+        debt = make_debt()
+        record_payment(debt, '40.00', 'cash')
+        debt.refresh_from_db()
+        self.assertEqual(debt.paid_total, Decimal('40.00'))
+        self.assertFalse(debt.is_paid)
+
+    def test_payment_covering_the_rest_settles(self):
+        debt = make_debt()
+        version = debt.version
+        record_payment(debt, '60.00', 'cash')
+        record_payment(debt, '40.00', 'card')
+        debt.refresh_from_db()
+        self.assertTrue(debt.is_paid)
+        self.assertEqual(debt.payment_method, 'card')
+        self.assertEqual(debt.paid_local_date, timezone.localdate())
+        self.assertEqual(debt.version, version + 2)
+
+    def test_overpayment_is_rejected(self):
+        debt = make_debt()
+        with self.assertRaises(PaymentError) as caught:
+            record_payment(debt, '100.01', 'cash')
+        self.assertEqual(caught.exception.code, 'overpaid')
+        self.assertFalse(debt.payments.exists())
+
+    def test_second_payment_from_a_stale_page_is_rejected(self):
+        debt = make_debt()
+        stale = Debt.objects.get(pk=debt.pk)
+        record_payment(debt, '100.00', 'cash')
+        with self.assertRaises(PaymentError) as caught:
+            record_payment(stale, '100.00', 'cash')
+        self.assertEqual(caught.exception.code, 'paid')
+        self.assertEqual(debt.payments.count(), 1)
+        debt.refresh_from_db()
+        self.assertEqual(debt.paid_total, Decimal('100.00'))
+
+
+class RecordPaymentsBatchTests(TestCase):
+    """End-of-day batch payments (services.record_payments_batch)"""
+
+    def test_batch_settles_debts(self):
+        first, second = make_debt('50.00'), make_debt('30.00')
+        result = record_payments_batch([payment_row(first, '50.00'), payment_row(second, '10.00')])
+        self.assertTrue(result['committed'])
+        self.assertEqual(result['settled'], 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.is_paid)
+        self.assertEqual(second.paid_total, Decimal('10.00'))
+
+    def test_rows_paying_one_debt_twice_write_nothing(self):
+        debt = make_debt('50.00')
+        result = record_payments_batch([payment_row(debt, '50.00'), payment_row(debt, '50.00')])
+        self.assertFalse(result['committed'])
+        self.assertEqual([row['status'] for row in result['rows']], ['valid', 'error'])
+        self.assertFalse(debt.payments.exists())
+
+    def test_skip_invalid_records_the_valid_rows(self):
+        debt = make_debt('50.00')
+        result = record_payments_batch(
+            [payment_row(debt, '50.00'), payment_row(debt, '50.00')], skip_invalid=True,
+        )
+        self.assertEqual((result['posted'], result['failed']), (1, 1))
+        debt.refresh_from_db()
+        self.assertTrue(debt.is_paid)
+        self.assertEqual(debt.payments.count(), 1)
+
+
+# Pages render without running collectstatic first
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class DebtEditConflictTests(TestCase):
+    """Optimistic version checks on the admin debt edit page"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.debt = make_debt()
+
+    def post_edit(self, amount, version):
+        return self.client.post(reverse('debt_edit', args=[self.debt.pk]), {
+            'customer': self.debt.customer_id,
+            'amount': amount,
+            'date_given': timezone.localtime(self.debt.date_given).strftime('%Y-%m-%dT%H:%M'),
+            'promise_date': self.debt.promise_date.isoformat(),
+            'description': '',
+            'paid_date': '',
+            'payment_method': '',
+            'version': version,
+        })
+
+    def test_edit_with_current_version_saves(self):
+        response = self.post_edit('120.00', self.debt.version)
+        self.assertEqual(response.status_code, 302)
+        self.debt.refresh_from_db()
+        self.assertEqual(self.debt.amount, Decimal('120.00'))
+
+    def test_edit_after_another_change_is_refused(self):
+        version = self.debt.version
+        record_payment(self.debt, '10.00', 'cash')
+        response = self.post_edit('120.00', version)
+        self.assertEqual(response.status_code, 409)
+        self.debt.refresh_from_db()
+        self.assertEqual(self.debt.amount, Decimal('100.00'))
+
+
+class EditRequestApprovalTests(TestCase):
+    """Cashier edit requests approved in batches (main.edit_requests)"""
+
+    def setUp(self):
+        self.reviewer = User.objects.create_superuser('admin', password='x')
+        self.debt = make_debt()
+
+    def test_later_request_for_a_debt_wins(self):
+        first = submit_edit_request(self.debt, self.debt.cashier, 'typo', requested_amount=Decimal('90.00'))
+        second = submit_edit_request(self.debt, self.debt.cashier, 'typo', requested_amount=Decimal('80.00'))
+        self.assertEqual(pending_count(), 2)
+        version = self.debt.version
+
+        result = approve_requests([first.pk, second.pk], self.reviewer)
+        self.assertEqual(len(result['approved']), 2)
+        self.assertEqual(pending_count(), 0)
+        self.debt.refresh_from_db()
+        self.assertEqual(self.debt.amount, Decimal('80.00'))
+        self.assertEqual(self.debt.version, version + 1)
+
+    def test_request_below_the_paid_amount_stays_pending(self):
+        record_payment(self.debt, '50.00', 'cash')
+        edit_request = submit_edit_request(self.debt, self.debt.cashier, 'typo', requested_amount=Decimal('40.00'))
+        result = approve_requests([edit_request.pk], self.reviewer)
+        self.assertEqual(result['failed'][0][0], edit_request)
+        edit_request.refresh_from_db()
+        self.assertEqual(edit_request.status, 'pending')
+        self.debt.refresh_from_db()
+        self.assertEqual(self.debt.amount, Decimal('100.00'))
+
+
+class ImportDebtsTests(TestCase):
+    """Debt rows imported from 1C exports (utils.import_debts_from_data)"""
+
+    def test_non_finite_amounts_are_errors(self):
+        cashier = Cashier.objects.create(name='Aygün', surname='Həsənova')
+        result = import_debts_from_data([
+            {'surname': 'Məmmədov', 'name': 'Əli', 'amount': 'NaN'},
+            {'surname': 'Məmmədov', 'name': 'Əli', 'amount': '12,50'},
+        ], cashier=cashier)
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(result['errors'], ["Row 2: Invalid amount 'NaN'"])
+
+
+class DuplicateCustomerTests(TestCase):
+    """Which customer profiles dedup merges (dedup.is_duplicate)"""
+
+    def profile(self, name, surname, phone=None, place='Bakı'):
+        return _profile({
+            'pk': 1, 'name': name, 'surname': surname, 'patronymic': None, 'place': place, 'phone': phone,
+        })
+
+    def test_spelling_variants_in_one_place(self):
+        self.assertTrue(is_duplicate(self.profile('Əli', 'Qasımov', place='Sumqayıt'),
+                                     self.profile('Əli', 'Гасымов', place='Sumqayit')))
+
+    def test_relatives_sharing_a_phone(self):
+        self.assertFalse(is_duplicate(self.profile('Əli', 'Məmmədov', '0501234567'),
+                                      self.profile('Leyla', 'Məmmədova', '0501234567')))
+
+    def test_unknown_place_is_no_evidence(self):
+        self.assertFalse(is_duplicate(self.profile('Əli', 'Məmmədov', place='Unknown'),
+                                      self.profile('Əli', 'Məmmədov', place='Gəncə')))
+        self.assertTrue(is_duplicate(self.profile('Əli', 'Məmmədov', '0501234567', place='Unknown'),
+                                     self.profile('Əli', 'Məmmədov', '+994501234567', place='Gəncə')))
+
+
+CASHIER = {'type': 'cashier', 'id': 1, 'name': 'Aygün', 'surname': 'Həsənova', 'phone': None, 'email': None}
+
+
+def customer_event(seq, pk, name, surname, patronymic=None, place='Bakı', action='update'):
+    return {
+        'type': 'event', 'seq': seq, 'model': 'customer', 'id': pk, 'action': action,
+        'at': timezone.now() + timedelta(minutes=seq),
+        'data': {
+            'id': pk, 'name': name, 'surname': surname, 'patronymic': patronymic, 'place': place,
+            'phone': None, 'address': None,
+        },
+    }
+
+
+def debt_event(seq, pk, customer_id, amount='10.00'):
+    now = timezone.now()
+    return {
+        'type': 'event', 'seq': seq, 'model': 'debt', 'id': pk, 'action': 'create',
+        'at': now + timedelta(minutes=seq),
+        'data': {
+            'id': pk, 'cashier_id': CASHIER['id'], 'customer_id': customer_id, 'amount': amount,
+            'date_given': now, 'promise_date': (now + timedelta(days=30)).date(), 'description': '',
+            'is_paid': False, 'paid_total': '0.00', 'paid_date': None, 'payment_method': None,
+            'is_deleted': False, 'deleted_at': None,
+        },
+    }
+
+
+@override_settings(BRANCH_CODE='')
+class BranchImportTests(TestCase):
+    """Batch files of the branches imported at head office (main.branch_sync)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_batch(self, branch, start, end, events, snapshot=False):
+        header = {
+            'type': 'batch', 'format': FORMAT_VERSION, 'branch': branch, 'name': branch,
+            'created_at': timezone.now() + timedelta(minutes=end), 'snapshot': snapshot,
+            'from': start, 'to': end,
+        }
+        path = self.directory / batch_filename(branch, start, end)
+        with gzip.open(path, 'wt', encoding='utf-8') as out:
+            for record in [header, CASHIER, *events, {'type': 'end', 'events': len(events)}]:
+                out.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        return path
+
+    def local_customer(self, branch, source_id):
+        key = ReplicaKey.objects.get(branch__code=branch, model='customer', source_id=source_id)
+        return Customer.objects.get(pk=key.local_id)
+
+    def debt_customer(self, branch, source_id):
+        key = ReplicaKey.objects.get(branch__code=branch, model='debt', source_id=source_id)
+        return Debt.all_objects.get(pk=key.local_id).customer
+
+    def test_import_twice_changes_nothing(self):
+        path = self.write_batch('A', 0, 2, [
+            customer_event(1, 1, 'Əli', 'Məmmədov', action='create'),
+            debt_event(2, 1, customer_id=1),
+        ], snapshot=True)
+        self.assertEqual(import_batch(path)[1], 'imported')
+        self.assertEqual(import_batch(path)[1], 'skipped')
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(Debt.all_objects.count(), 1)
+
+    def test_missing_file_stops_the_branch(self):
+        import_batch(self.write_batch('A', 0, 1, [customer_event(1, 1, 'Əli', 'Məmmədov', action='create')], True))
+        later = self.write_batch('A', 5, 6, [customer_event(6, 1, 'Əli', 'Məmmədov', patronymic='Vəli oğlu')])
+        with self.assertRaises(SyncGap):
+            import_batch(later)
+        self.assertIsNone(Customer.objects.get().patronymic)
+
+    def test_same_customer_from_two_branches_is_shared(self):
+        import_batch(self.write_batch('A', 0, 1, [customer_event(1, 7, 'Əli', 'Məmmədov', action='create')], True))
+        import_batch(self.write_batch('B', 0, 1, [customer_event(1, 3, 'Əli', 'Məmmədov', action='create')], True))
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_namesakes_of_one_branch_stay_apart(self):
+        # The branch allows both: a blank patronymic does not count in its unique constraint
+        import_batch(self.write_batch('A', 0, 4, [
+            customer_event(1, 1, 'Əli', 'Məmmədov', action='create'),
+            customer_event(2, 2, 'Əli', 'Məmmədov', action='create'),
+            debt_event(3, 1, customer_id=1),
+            debt_event(4, 2, customer_id=2),
+        ], snapshot=True))
+        self.assertNotEqual(self.local_customer('A', 1), self.local_customer('A', 2))
+
+        import_batch(self.write_batch('A', 4, 5, [
+            customer_event(5, 2, 'Əli', 'Məmmədov', patronymic='Əli oğlu'),
+        ]))
+        self.assertIsNone(self.debt_customer('A', 1).patronymic)
+        self.assertEqual(self.debt_customer('A', 2).patronymic, 'Əli oğlu')
+
+    def test_renaming_a_shared_customer_splits_it(self):
+        import_batch(self.write_batch('A', 0, 2, [
+            customer_event(1, 1, 'Əli', 'Məmmədov', action='create'),
+            debt_event(2, 1, customer_id=1),
+        ], snapshot=True))
+        import_batch(self.write_batch('B', 0, 2, [
+            customer_event(1, 9, 'Əli', 'Məmmədov', action='create'),
+            debt_event(2, 4, customer_id=9),
+        ], snapshot=True))
+        self.assertEqual(self.debt_customer('A', 1), self.debt_customer('B', 4))
+
+        import_batch(self.write_batch('B', 2, 3, [
+            customer_event(3, 9, 'Əli', 'Məmmədov', patronymic='Əli oğlu'),
+        ]))
+        self.assertIsNone(self.debt_customer('A', 1).patronymic)
+        self.assertEqual(self.debt_customer('B', 4).patronymic, 'Əli oğlu')
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_branch_without_patronymic_keeps_the_shared_one(self):
+        import_batch(self.write_batch('A', 0, 1, [
+            customer_event(1, 1, 'Əli', 'Məmmədov', patronymic='Vəli oğlu', action='create'),
+        ], snapshot=True))
+        import_batch(self.write_batch('B', 0, 1, [
+            customer_event(1, 5, 'Əli', 'Məmmədov', patronymic='Vəli oğlu', action='create'),
+        ], snapshot=True))
+        import_batch(self.write_batch('B', 1, 2, [customer_event(2, 5, 'Əli', 'Məmmədov')]))
+        customer = Customer.objects.get()
+        self.assertEqual(customer.patronymic, 'Vəli oğlu')
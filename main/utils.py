@@ -1,9 +1,15 @@
 import csv
 import os
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from io import StringIO
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from .models import Customer
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from .models import Cashier, ChangeEvent, Customer, Debt
+from .search import normalize_search_text
 
 
 def normalize_column_name(column_name):
@@ -21,6 +27,12 @@ def normalize_column_name(column_name):
         'phone': ['телефон', 'phone', 'tel', 'телефон клиента', 'phone number'],
         'address': ['адрес', 'address', 'полный адрес', 'full address', 'адрес клиента'],
         'counterparty': ['контрагент', 'counterparty', 'клиент', 'client', 'customer', 'покупатель'],
+        # Debt columns (debt import); promise date first, its names contain "date"
+        'promise_date': ['срок', 'погаш', 'promise', 'vəd', 'due'],
+        'date_given': ['дата', 'date', 'tarix'],
+        'amount': ['сумма', 'amount', 'məbləğ', 'borc', 'долг', 'debt'],
+        'cashier': ['кассир', 'cashier', 'kassir'],
+        'description': ['комментарий', 'примечание', 'товар', 'description', 'comment', 'qeyd', 'təsvir'],
     }
     
     for field, variations in name_mappings.items():
@@ -246,6 +258,40 @@ def parse_excel_file(file):
         raise ValueError(f"Error parsing Excel file: {str(e)}")
 
 
+def customer_fields_from_row(row, default_place='Unknown'):
+    """(name, surname, patronymic, place, phone, address) from a parsed 1C row"""
+    # Get name, surname, and patronymic (required)
+    name = row.get('name', '').strip() if row.get('name') else ''
+    surname = row.get('surname', '').strip() if row.get('surname') else ''
+    patronymic = row.get('patronymic', '').strip() if row.get('patronymic') else None
+    if not patronymic:
+        patronymic = None
+    
+    # If we have counterparty but no name/surname, try to parse it
+    if (not name or not surname) and 'counterparty' in row:
+        counterparty_value = row.get('counterparty', '')
+        if counterparty_value:
+            # Convert to string and clean
+            counterparty_str = str(counterparty_value).strip()
+            if counterparty_str and counterparty_str.lower() not in ['none', 'null', 'nan', '']:
+                parsed_name, parsed_surname, parsed_patronymic = parse_counterparty_name(counterparty_str)
+                if parsed_name:
+                    name = parsed_name
+                if parsed_surname:
+                    surname = parsed_surname
+                if parsed_patronymic:
+                    patronymic = parsed_patronymic
+                # If still no surname but we have counterparty, use it as surname
+                if not surname and counterparty_str:
+                    surname = counterparty_str
+    
+    # Get place (use default if not provided)
+    place = row.get('place', '').strip() or default_place
+    phone = row.get('phone', '').strip() or None
+    address = row.get('address', '').strip() or None
+    return name, surname, patronymic, place, phone, address
+
+
 def import_customers_from_data(data_rows, skip_duplicates=True, skip_empty=True, default_place='Unknown'):
     """Import customers from parsed data rows"""
     imported = 0
@@ -256,35 +302,7 @@ def import_customers_from_data(data_rows, skip_duplicates=True, skip_empty=True,
     
     for i, row in enumerate(data_rows, start=2):  # Start at 2 (row 1 is header)
         try:
-            # Get name, surname, and patronymic (required)
-            name = row.get('name', '').strip() if row.get('name') else ''
-            surname = row.get('surname', '').strip() if row.get('surname') else ''
-            patronymic = row.get('patronymic', '').strip() if row.get('patronymic') else None
-            if not patronymic:
-                patronymic = None
-            
-            # If we have counterparty but no name/surname, try to parse it
-            if (not name or not surname) and 'counterparty' in row:
-                counterparty_value = row.get('counterparty', '')
-                if counterparty_value:
-                    # Convert to string and clean
-                    counterparty_str = str(counterparty_value).strip()
-                    if counterparty_str and counterparty_str.lower() not in ['none', 'null', 'nan', '']:
-                        parsed_name, parsed_surname, parsed_patronymic = parse_counterparty_name(counterparty_str)
-                        if parsed_name:
-                            name = parsed_name
-                        if parsed_surname:
-                            surname = parsed_surname
-                        if parsed_patronymic:
-                            patronymic = parsed_patronymic
-                        # If still no surname but we have counterparty, use it as surname
-                        if not surname and counterparty_str:
-                            surname = counterparty_str
-            
-            # Get place (use default if not provided)
-            place = row.get('place', '').strip() or default_place
-            phone = row.get('phone', '').strip() or None
-            address = row.get('address', '').strip() or None
+            name, surname, patronymic, place, phone, address = customer_fields_from_row(row, default_place)
             
             # Validate required fields
             if not surname:
@@ -411,3 +429,293 @@ def import_customers_from_data(data_rows, skip_duplicates=True, skip_empty=True,
         'errors': errors
     }
 
+
+
+def _customer_key(name, surname, patronymic, place):
+    """Identity of a customer as in Customer.Meta.unique_together (None and '' patronymic match)"""
+    return (name or '', surname, patronymic or '', place)
+
+
+def _resolve_customers(keys, fields_by_key):
+    """
+    Map customer keys to ids: one query for the existing ones, one
+    bulk insert for the missing ones. Returns (ids by key, created count).
+    """
+    ids = {}
+    surnames = {key[1] for key in keys}
+    existing = Customer.objects.filter(surname__in=surnames).values_list('pk', 'name', 'surname', 'patronymic', 'place')
+    for pk, name, surname, patronymic, place in existing:
+        key = _customer_key(name, surname, patronymic, place)
+        if key in keys:
+            ids.setdefault(key, pk)
+
+    missing = []
+    for key in keys:
+        if key in ids:
+            continue
+        name, surname, patronymic, place, phone, address = fields_by_key[key]
+        customer = Customer(
+            name=name, surname=surname, patronymic=patronymic, place=place, phone=phone, address=address
+        )
+        # bulk_create skips save(), which maintains the search key
+        customer.search_key = customer.build_search_key()
+        missing.append(customer)
+    Customer.objects.bulk_create(missing)
+    ChangeEvent.record(Customer, [customer.pk for customer in missing], 'create')
+    for customer in missing:
+        ids[_customer_key(customer.name, customer.surname, customer.patronymic, customer.place)] = customer.pk
+    return ids, len(missing)
+
+
+def import_debts_from_data(data_rows, cashier=None, default_place='Unknown', promise_days=30, chunk_size=1000):
+    """
+    Import debts from parsed 1C rows (parse_csv_file / parse_excel_file).
+
+    Each row needs the customer (Контрагент or name/surname columns) and
+    an amount; date given, promise date, cashier and description are
+    optional. Rows are processed in chunks, all in one transaction:
+    customers are resolved with one query per chunk by the
+    (name, surname, patronymic, place) key, missing ones are created with
+    one bulk insert, then the debts are bulk inserted. ``cashier`` is used
+    for every row; without it the cashier column must name a cashier
+    ("name surname" or username). A missing promise date defaults to
+    ``promise_days`` after the date given.
+    """
+    imported = 0
+    customers_created = 0
+    skipped = 0
+    errors = []
+
+    cashiers_by_name = {}
+    if cashier is None:
+        for c in Cashier.objects.select_related('user'):
+            cashiers_by_name[normalize_search_text(c.name, c.surname)] = c
+            cashiers_by_name.setdefault(normalize_search_text(c.surname, c.name), c)
+            if c.user:
+                cashiers_by_name.setdefault(normalize_search_text(c.user.username), c)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(data_rows), chunk_size):
+            pending = []
+            fields_by_key = {}
+            for i, row in enumerate(data_rows[start:start + chunk_size], start=start + 2):  # row 1 is header
+                fields = customer_fields_from_row(row, default_place)
+                name, surname, patronymic, place, phone, address = fields
+                raw_amount = (row.get('amount') or '').replace(' ', '').replace(',', '.')
+                if not surname and not raw_amount:
+                    skipped += 1
+                    continue
+                if not surname:
+                    errors.append(f"Row {i}: Customer is required")
+                    continue
+                try:
+                    amount = Decimal(raw_amount).quantize(Decimal('0.01'))
+                except InvalidOperation:
+                    amount = None
+                # NaN gets through quantize
+                if amount is None or not amount.is_finite():
+                    errors.append(f"Row {i}: Invalid amount '{row.get('amount', '')}'")
+                    continue
+                if amount <= 0:
+                    skipped += 1
+                    continue
+
+                date_given = now
+                if row.get('date_given'):
+                    date_given = parse_datetime_value(row['date_given'])
+                    if date_given is None:
+                        errors.append(f"Row {i}: Invalid date '{row['date_given']}'")
+                        continue
+                if row.get('promise_date'):
+                    promise = parse_datetime_value(row['promise_date'])
+                    if promise is None:
+                        errors.append(f"Row {i}: Invalid promise date '{row['promise_date']}'")
+                        continue
+                    promise_date = timezone.localtime(promise).date()
+                else:
+                    promise_date = timezone.localtime(date_given).date() + timedelta(days=promise_days)
+
+                debt_cashier = cashier
+                if debt_cashier is None:
+                    debt_cashier = cashiers_by_name.get(normalize_search_text(row.get('cashier', '')))
+                    if debt_cashier is None:
+                        errors.append(f"Row {i}: Unknown cashier '{row.get('cashier', '')}'")
+                        continue
+
+                key = _customer_key(name, surname, patronymic, place)
+                fields_by_key.setdefault(key, fields)
+                pending.append((key, Debt(
+                    cashier=debt_cashier,
+                    amount=amount,
+                    date_given=date_given,
+                    promise_date=promise_date,
+                    description=(row.get('description') or '').strip() or None,
+                )))
+
+            if not pending:
+                continue
+            customer_ids, created = _resolve_customers(set(fields_by_key), fields_by_key)
+            customers_created += created
+            customers = Customer.objects.in_bulk(set(customer_ids.values()))
+            debts = []
+            for key, debt in pending:
+                debt.customer = customers[customer_ids[key]]
+                # bulk_create skips save(), which maintains the search key
+                debt.search_key = debt.build_search_key()
+                debts.append(debt)
+            Debt.objects.bulk_create(debts, batch_size=500)
+            ChangeEvent.record(Debt, [debt.pk for debt in debts], 'create')
+            imported += len(debts)
+
+    return {
+        'imported': imported,
+        'customers_created': customers_created,
+        'skipped': skipped,
+        'errors': errors,
+    }
+
+
+# Payment method spellings accepted in batch payment rows, keyed by search form
+PAYMENT_METHOD_ALIASES = {
+    normalize_search_text(alias).replace(' ', ''): method
+    for method, aliases in {
+        'cash': ['cash', 'nağd', 'наличные', 'нал'],
+        'card': ['card', 'kart', 'карта'],
+        'posterminal': ['posterminal', 'pos', 'terminal', 'терминал'],
+    }.items()
+    for alias in aliases
+}
+
+IMPORT_DATE_FORMATS = [
+    '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y',
+    '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M', '%d/%m/%Y',
+]
+
+CELL_SEPARATOR_RE = re.compile(r'\t|;')
+
+
+def payment_cells_from_text(text):
+    """
+    Split pasted payment rows into (line number, cells).
+
+    Cells are separated by tabs (pasted from Excel) or semicolons; a comma
+    is only used as separator when neither is present, since "10,50" is a
+    valid amount.
+    """
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        if CELL_SEPARATOR_RE.search(line):
+            cells = CELL_SEPARATOR_RE.split(line)
+        else:
+            cells = line.split(',')
+        rows.append((line_no, [cell.strip() for cell in cells]))
+    return rows
+
+
+def payment_cells_from_file(file):
+    """(line number, cells) from an uploaded CSV or Excel file of payments"""
+    extension = os.path.splitext(file.name)[1].lower()
+    if extension in ['.xlsx', '.xls']:
+        import openpyxl
+        file.seek(0)
+        sheet = openpyxl.load_workbook(file, data_only=True, read_only=True).active
+        rows = []
+        for line_no, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+            if not any(v not in (None, '') for v in values):
+                continue
+            cells = []
+            for value in values:
+                if isinstance(value, datetime):
+                    value = value.strftime('%d.%m.%Y %H:%M')
+                cells.append('' if value is None else str(value).strip())
+            rows.append((line_no, cells))
+        return rows
+
+    file.seek(0)
+    content = file.read()
+    for encoding in ['utf-8-sig', 'utf-8', 'windows-1251']:
+        try:
+            return payment_cells_from_text(content.decode(encoding))
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Could not decode file. Please ensure it's a valid CSV file.")
+
+
+def parse_datetime_value(value):
+    """Aware datetime from a date cell of an import file, None if unreadable"""
+    value = (value or '').strip()
+    for fmt in IMPORT_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    return None
+
+
+def parse_payment_date(value):
+    """Aware datetime from a batch row date; empty means now"""
+    if not value:
+        return timezone.now()
+    return parse_datetime_value(value)
+
+
+def parse_payment_rows(cell_rows):
+    """
+    Turn (line number, cells) into payment rows for record_payments_batch.
+
+    Expected columns: debt number, amount, payment method, date (optional).
+    A first line whose debt number is not a number is treated as a header.
+    Each row is a dict; rows that cannot be read carry an ``error``.
+    """
+    rows = []
+    for index, (line_no, cells) in enumerate(cell_rows):
+        cells = (cells + ['', '', '', ''])[:4]
+        raw_id, raw_amount, raw_method, raw_date = cells
+        if index == 0 and not raw_id.lstrip('#').isdigit():
+            continue
+
+        row = {
+            'line': line_no,
+            'source': ' | '.join(c for c in cells if c),
+            'debt_id': None,
+            'amount': None,
+            'payment_method': None,
+            'payment_date': None,
+            'error': None,
+        }
+        rows.append(row)
+
+        if not raw_id.lstrip('#').isdigit():
+            row['error'] = _('Borc nömrəsi düzgün deyil')
+            continue
+        row['debt_id'] = int(raw_id.lstrip('#'))
+
+        try:
+            amount = Decimal(raw_amount.replace(' ', '').replace(',', '.'))
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite() or amount <= 0:
+            row['error'] = _('Məbləğ düzgün deyil')
+            continue
+        if amount != amount.quantize(Decimal('0.01')):
+            row['error'] = _('Məbləğ ən çox 2 onluq rəqəmlə olmalıdır')
+            continue
+        row['amount'] = amount.quantize(Decimal('0.01'))
+
+        method = PAYMENT_METHOD_ALIASES.get(normalize_search_text(raw_method).replace(' ', ''))
+        if not method:
+            row['error'] = _('Ödəniş üsulu düzgün deyil (nağd, kart, posterminal)')
+            continue
+        row['payment_method'] = method
+
+        payment_date = parse_payment_date(raw_date)
+        if payment_date is None:
+            row['error'] = _('Tarix düzgün deyil (gg.aa.iiii ss:dd)')
+            continue
+        row['payment_date'] = payment_date
+    return rows
@@ -1,4 +1,11 @@
 import os
+import asyncio
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
@@ -7,11 +14,26 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import check_password
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import gettext as _
-from django.db.models import Sum, Q, Count
-from .models import Cashier, Customer, Debt, Payment
-from .forms import CashierForm, CustomerForm, DebtForm, DebtEditForm, CustomerImportForm, SimplifiedCustomerForm, PaymentForm
-from .utils import parse_csv_file, parse_excel_file, import_customers_from_data
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db.models import Sum, Count
+from .models import Cashier, Customer, Debt, DebtConflict, DebtEditRequest, Payment
+from .forms import CashierForm, CustomerForm, DebtForm, DebtEditForm, DebtEditRequestForm, CustomerImportForm, DebtImportForm, SimplifiedCustomerForm, PaymentForm, PaymentBatchForm
+from .utils import parse_csv_file, parse_excel_file, import_customers_from_data, import_debts_from_data
+from .search import filter_by_search_key
+from .services import PaymentError, record_payment, record_payments_batch
+from .projections import debt_rows, customer_rows
+from .archive import archived_monthly_totals
+from .edit_requests import approve_requests, reject_requests, submit_edit_request
+from .routers import reports_db
+from .statements import customer_statement as build_statement, iter_statement
+from .events import initial_cursor, collect_operation_events, cursor_token
+from .caching import (
+    debt_data_version, table_cache_key, dashboard_etag, dashboard_last_modified,
+    DEBT_ROW_CACHE_TIMEOUT, DEBT_TABLE_CACHE_TIMEOUT,
+)
 
 
 
@@ -63,6 +85,8 @@ def get_current_cashier(request):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard_etag, last_modified_func=dashboard_last_modified)
 def home(request):
     """Home page with overview of debts"""
     # If user is admin/staff, redirect to admin dashboard
@@ -75,8 +99,7 @@ def home(request):
         auth_logout(request)
         return redirect('login')
     
-    today = timezone.now().date()
-    from datetime import datetime
+    today = timezone.localdate()
     from calendar import monthrange
     
     # Get selected month from query params (format: YYYY-MM), default to current month
@@ -95,71 +118,58 @@ def home(request):
     last_day = monthrange(selected_month_date.year, selected_month_date.month)[1]
     current_month_end = selected_month_date.replace(day=last_day)
     
-    # Convert to datetime for filtering
-    month_start_datetime = timezone.make_aware(datetime.combine(current_month_start, datetime.min.time()))
-    month_end_datetime = timezone.make_aware(datetime.combine(current_month_end, datetime.max.time()))
-    
-    # Monthly statistics - debts given this month
+    # Monthly statistics - debts given this month (Asia/Baku days, see LocalDateField)
     monthly_given = Debt.objects.filter(
         cashier=cashier,
-        date_given__gte=month_start_datetime,
-        date_given__lte=month_end_datetime
-    ).aggregate(total=Sum('amount'))['total'] or 0
+        given_local_date__range=(current_month_start, current_month_end)
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     # Monthly statistics - payments/returns this month (partial + full)
     monthly_partial_payments = Payment.objects.filter(
         debt__cashier=cashier,
-        payment_date__gte=month_start_datetime,
-        payment_date__lte=month_end_datetime
-    ).aggregate(total=Sum('amount'))['total'] or 0
+        payment_local_date__range=(current_month_start, current_month_end)
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     # Full payments (debts fully paid this month, excluding those with partial payments)
     monthly_full_payments = Debt.objects.filter(
         cashier=cashier,
         is_paid=True,
-        paid_date__gte=month_start_datetime,
-        paid_date__lte=month_end_datetime
+        paid_local_date__range=(current_month_start, current_month_end)
     ).exclude(
         id__in=Payment.objects.filter(
-            payment_date__gte=month_start_datetime,
-            payment_date__lte=month_end_datetime
+            payment_local_date__range=(current_month_start, current_month_end)
         ).values_list('debt_id', flat=True).distinct()
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     monthly_returned = monthly_partial_payments + monthly_full_payments
+
+    # Settled history moved to the archive still counts for its month
+    archived = archived_monthly_totals(current_month_start, cashier=cashier)
+    monthly_given += archived['given']
+    monthly_returned += archived['returned']
     monthly_balance = monthly_given - monthly_returned
     
     # Today's debt summary by customer
-    today_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-    today_end = timezone.make_aware(datetime.combine(today, datetime.max.time()))
-    
     todays_debts = Debt.objects.filter(
         cashier=cashier,
-        date_given__gte=today_start,
-        date_given__lte=today_end
+        given_local_date=today
     ).select_related('customer').values('customer__name', 'customer__surname', 'customer__patronymic', 'customer__place').annotate(
         total_debt=Sum('amount')
     ).order_by('-total_debt')
     
     # Get statistics for current cashier only
-    # Prefetch payments to calculate remaining_amount correctly
-    unpaid_debts = Debt.objects.filter(cashier=cashier, is_paid=False).select_related('customer').prefetch_related('payments')
-    unpaid_debts_list = list(unpaid_debts)  # Evaluate queryset once
-    total_debts = len(unpaid_debts_list)
-    
-    # Calculate total remaining amount (not total amount)
-    total_amount = sum(debt.remaining_amount for debt in unpaid_debts_list)
+    # Remaining amounts (not total amounts), summed in the database
+    unpaid = Debt.objects.filter(cashier=cashier, is_paid=False).balance()
+    total_debts = unpaid['count']
+    total_amount = unpaid['remaining']
     
-    overdue_debts_qs = Debt.objects.filter(
+    overdue = Debt.objects.filter(
         cashier=cashier,
         is_paid=False,
         promise_date__lt=today
-    ).select_related('customer').prefetch_related('payments')
-    overdue_debts_list = list(overdue_debts_qs)  # Evaluate queryset once
-    overdue_count = len(overdue_debts_list)
-    
-    # Calculate overdue remaining amount (not total amount)
-    overdue_amount = sum(debt.remaining_amount for debt in overdue_debts_list)
+    ).balance()
+    overdue_count = overdue['count']
+    overdue_amount = overdue['remaining']
     
     # Recent debts for current cashier
     recent_debts = Debt.objects.filter(cashier=cashier, is_paid=False).order_by('-date_given')[:10]
@@ -221,17 +231,20 @@ def debt_list(request):
     # Search
     search = request.GET.get('search', '').strip()
     if search:
-        debts = debts.filter(
-            Q(customer__name__icontains=search) |
-            Q(customer__surname__icontains=search) |
-            Q(customer__place__icontains=search) |
-            Q(description__icontains=search)
-        )
+        debts = filter_by_search_key(debts, search)
+    
+    # Rows are only evaluated when the table fragment is not cached
+    today = timezone.now().date()
+    version = debt_data_version(Debt.all_objects.filter(cashier=cashier))
     
     context = {
-        'debts': debts,
+        'debts': SimpleLazyObject(lambda: debt_rows(debts, today=today)),
         'selected_status': status,
         'search_query': search if search else '',
+        'today': today,
+        'table_cache_key': table_cache_key(request, 'debt_list', version, today),
+        'table_cache_timeout': DEBT_TABLE_CACHE_TIMEOUT,
+        'row_cache_timeout': DEBT_ROW_CACHE_TIMEOUT,
     }
     
     return render(request, 'main/debt_list.html', context)
@@ -418,20 +431,23 @@ def debt_detail(request, pk):
             is_deleted=False
         ).select_related('cashier', 'customer').order_by('-date_given')
     
-    # Calculate totals
-    total_remaining = sum(d.remaining_amount for d in customer_debts)
-    total_amount = sum(d.amount for d in customer_debts)
-    total_paid = sum(d.paid_amount for d in customer_debts)
+    # Totals in one aggregate query (paid_total is the stored balance)
+    totals = customer_debts.aggregate(
+        count=Count('id'), total_amount=Sum('amount', default=0), total_paid=Sum('paid_total', default=0)
+    )
+    total_amount = totals['total_amount']
+    total_paid = totals['total_paid']
     
     return render(request, 'main/debt_detail.html', {
         'debt': debt, 
         'is_admin': is_admin,
         'payments': payments,
-        'customer_debts': customer_debts,
-        'total_remaining': total_remaining,
+        'customer_debts': debt_rows(customer_debts) if totals['count'] > 1 else [],
+        'customer_debt_count': totals['count'],
+        'total_remaining': total_amount - total_paid,
         'total_amount': total_amount,
         'total_paid': total_paid,
-        'has_multiple_debts': customer_debts.count() > 1
+        'has_multiple_debts': totals['count'] > 1
     })
 
 
@@ -440,6 +456,14 @@ def is_admin(user):
     return user.is_authenticated and (user.is_staff or user.is_superuser)
 
 
+def posted_version(request):
+    """Debt version the submitted page was rendered with (None if not sent)"""
+    try:
+        return int(request.POST['version'])
+    except (KeyError, ValueError):
+        return None
+
+
 @login_required
 @user_passes_test(is_admin)
 def debt_delete(request, pk):
@@ -461,7 +485,11 @@ def debt_delete(request, pk):
         # Password is correct, soft delete the debt
         customer_name = str(debt.customer)
         amount = debt.amount
-        debt.soft_delete(request.user)
+        try:
+            debt.soft_delete(request.user, version=posted_version(request))
+        except DebtConflict as e:
+            messages.error(request, e.message)
+            return redirect('debt_detail', pk=pk)
         messages.success(request, _('Borc uğurla silindi: {customer} - {amount}₼').format(
             customer=customer_name, amount=amount
         ))
@@ -474,12 +502,19 @@ def debt_delete(request, pk):
 @user_passes_test(is_admin)
 def debt_edit(request, pk):
     """Edit a debt - only admins can edit"""
-    debt = get_object_or_404(Debt, pk=pk)
+    debt = get_object_or_404(Debt.objects.select_related('customer', 'cashier'), pk=pk)
     
     if request.method == 'POST':
         form = DebtEditForm(request.POST, instance=debt, user=request.user)
         if form.is_valid():
-            form.save()
+            try:
+                form.save()
+            except DebtConflict as e:
+                # Show what the other user saved instead of overwriting it
+                messages.error(request, e.message)
+                debt = get_object_or_404(Debt.objects.select_related('customer', 'cashier'), pk=pk)
+                form = DebtEditForm(instance=debt, user=request.user)
+                return render(request, 'main/debt_edit.html', {'form': form, 'debt': debt}, status=409)
             messages.success(request, _('Borc uğurla yeniləndi!'))
             return redirect('debt_detail', pk=pk)
     else:
@@ -488,6 +523,38 @@ def debt_edit(request, pk):
     return render(request, 'main/debt_edit.html', {'form': form, 'debt': debt})
 
 
+@login_required
+def debt_edit_request(request, pk):
+    """Cashiers ask an admin to change a debt's amount or paid date"""
+    if request.user.is_staff or request.user.is_superuser:
+        # Admins change debts directly
+        return redirect('debt_edit', pk=pk)
+    cashier = get_current_cashier(request)
+    if not cashier:
+        messages.error(request, _('Kassir profili tapılmadı.'))
+        auth_logout(request)
+        return redirect('login')
+    debt = get_object_or_404(Debt.objects.select_related('customer'), pk=pk, cashier=cashier)
+    
+    if request.method == 'POST':
+        form = DebtEditRequestForm(request.POST, debt=debt)
+        if form.is_valid():
+            submit_edit_request(
+                debt,
+                cashier,
+                form.cleaned_data['reason'],
+                requested_amount=form.cleaned_data['requested_amount'],
+                requested_paid_date=form.cleaned_data['requested_paid_date'],
+            )
+            messages.success(request, _('Dəyişiklik tələbi göndərildi, admin təsdiqini gözləyir.'))
+            return redirect('debt_detail', pk=pk)
+    else:
+        form = DebtEditRequestForm(debt=debt)
+    
+    pending = debt.edit_requests.filter(status='pending').order_by('-created_at')
+    return render(request, 'main/debt_edit_request.html', {'form': form, 'debt': debt, 'pending_requests': pending})
+
+
 @login_required
 def debt_mark_paid(request, pk):
     """Mark a debt as paid with payment method"""
@@ -508,7 +575,11 @@ def debt_mark_paid(request, pk):
             messages.error(request, _('Zəhmət olmasa ödəniş üsulunu seçin.'))
             return redirect('debt_detail', pk=pk)
         
-        debt.mark_as_paid(payment_method=payment_method)
+        try:
+            debt.mark_as_paid(payment_method=payment_method, version=posted_version(request))
+        except DebtConflict as e:
+            messages.error(request, e.message)
+            return redirect('debt_detail', pk=pk)
         payment_method_display = debt.get_payment_method_display_az()
         messages.success(request, _('Borc ödənildi kimi işarələndi! Ödəniş üsulu: {method}').format(method=payment_method_display))
         return redirect('debt_detail', pk=pk)
@@ -538,21 +609,64 @@ def debt_add_payment(request, pk):
     if request.method == 'POST':
         form = PaymentForm(request.POST, debt=debt)
         if form.is_valid():
-            payment = form.save(commit=False)
-            payment.debt = debt
-            payment.created_by = request.user
-            # payment_date is already set from the form, but ensure it's timezone-aware
-            if payment.payment_date and timezone.is_naive(payment.payment_date):
-                payment.payment_date = timezone.make_aware(payment.payment_date)
-            payment.save()
-            messages.success(request, _('Ödəniş uğurla əlavə edildi: {amount}₼').format(amount=payment.amount))
-            return redirect('debt_detail', pk=pk)
+            try:
+                payment = record_payment(
+                    debt,
+                    form.cleaned_data['amount'],
+                    form.cleaned_data['payment_method'],
+                    payment_date=form.cleaned_data['payment_date'],
+                    notes=form.cleaned_data['notes'],
+                    created_by=request.user,
+                )
+            except PaymentError as e:
+                # Another terminal paid this debt in the meantime
+                form.add_error('amount', e)
+            else:
+                messages.success(request, _('Ödəniş uğurla əlavə edildi: {amount}₼').format(amount=payment.amount))
+                return redirect('debt_detail', pk=pk)
     else:
         form = PaymentForm(debt=debt)
     
     return render(request, 'main/debt_add_payment.html', {'form': form, 'debt': debt})
 
 
+@login_required
+def payment_batch(request):
+    """Record many payments at once (end-of-day reconciliation) with a per-row report"""
+    if request.user.is_staff or request.user.is_superuser:
+        cashier = None
+    else:
+        cashier = get_current_cashier(request)
+        if not cashier:
+            messages.error(request, _('Kassir profili tapılmadı.'))
+            auth_logout(request)
+            return redirect('login')
+
+    report = None
+    if request.method == 'POST':
+        form = PaymentBatchForm(request.POST, request.FILES)
+        if form.is_valid():
+            report = record_payments_batch(
+                form.cleaned_data['payment_rows'],
+                created_by=request.user,
+                cashier=cashier,
+                skip_invalid=form.cleaned_data['skip_invalid'],
+            )
+            if report['committed']:
+                messages.success(request, _('{count} ödəniş qeyd edildi: {amount}₼, tam ödənilən borclar: {settled}').format(
+                    count=report['posted'], amount=report['posted_total'], settled=report['settled']
+                ))
+                if report['failed']:
+                    messages.warning(request, _('{count} sətir atlandı, hesabata baxın.').format(count=report['failed']))
+                form = PaymentBatchForm()
+            else:
+                messages.error(request, _('Heç bir ödəniş qeyd edilmədi: {count} sətirdə səhv var.').format(count=report['failed']))
+    else:
+        form = PaymentBatchForm()
+
+    return render(request, 'main/payment_batch.html', {'form': form, 'report': report})
+
+
 @login_required
 def debt_pay_all_customer(request, pk):
     """Pay all debts for a customer"""
@@ -597,11 +711,19 @@ def debt_pay_all_customer(request, pk):
         # Mark all debts as paid
         count = 0
         total_amount = 0
+        conflicts = 0
         for d in customer_debts:
-            # Sum remaining amount BEFORE marking as paid
+            try:
+                d.mark_as_paid(payment_method=payment_method)
+            except DebtConflict:
+                # Paid or edited by someone else since it was read
+                conflicts += 1
+                continue
+            # Remaining amount as read, before marking as paid
             total_amount += d.remaining_amount
-            d.mark_as_paid(payment_method=payment_method)
             count += 1
+        if conflicts:
+            messages.warning(request, _('{count} borc başqa istifadəçi tərəfindən dəyişdirildiyi üçün ödənilmədi.').format(count=conflicts))
         
         # Get payment method display name
         payment_methods = {
@@ -687,7 +809,7 @@ def cashier_detail(request, pk):
     
     context = {
         'cashier': cashier,
-        'debts': debts,
+        'debts': debt_rows(debts),
         'selected_status': status,
     }
     
@@ -764,15 +886,10 @@ def customer_list(request):
     # Search
     search = request.GET.get('search')
     if search:
-        customers = customers.filter(
-            Q(name__icontains=search) |
-            Q(surname__icontains=search) |
-            Q(patronymic__icontains=search) |
-            Q(place__icontains=search)
-        )
+        customers = filter_by_search_key(customers, search)
     
     context = {
-        'customers': customers,
+        'customers': customer_rows(customers),
         'search_query': search,
     }
     
@@ -858,6 +975,7 @@ def customer_edit(request, pk):
 
 
 @login_required
+@reports_db
 def reminders(request):
     """View all overdue debts (reminders) for current cashier"""
     # If admin/staff, show all overdue debts
@@ -870,7 +988,7 @@ def reminders(request):
         
         context = {
             'cashier': None,
-            'overdue_debts': overdue_debts,
+            'overdue_debts': debt_rows(overdue_debts, today=today),
             'is_admin': True,
         }
         return render(request, 'main/reminders.html', context)
@@ -890,7 +1008,7 @@ def reminders(request):
     
     context = {
         'cashier': cashier,
-        'overdue_debts': overdue_debts,
+        'overdue_debts': debt_rows(overdue_debts, today=today),
         'is_admin': False,
     }
     
@@ -1013,6 +1131,162 @@ def customer_import(request):
     return render(request, 'main/customer_import.html', {'form': form})
 
 
+@login_required
+def debt_import(request):
+    """Import debts from a 1C sales export (CSV or Excel)"""
+    is_admin = request.user.is_staff or request.user.is_superuser
+    if is_admin:
+        cashier = None
+    else:
+        cashier = get_current_cashier(request)
+        if not cashier:
+            messages.error(request, _('Kassir profili tapılmadı.'))
+            auth_logout(request)
+            return redirect('login')
+
+    if request.method == 'POST':
+        form = DebtImportForm(request.POST, request.FILES, is_admin=is_admin)
+        if form.is_valid():
+            result = import_debts_from_data(
+                form.cleaned_data['data_rows'],
+                cashier=form.cleaned_data.get('cashier') or cashier,
+                promise_days=form.cleaned_data['promise_days'],
+            )
+            if result['imported']:
+                messages.success(request, _('{count} borc idxal edildi, yeni müştərilər: {customers}').format(
+                    count=result['imported'], customers=result['customers_created']
+                ))
+            else:
+                messages.warning(request, _('Heç bir borc idxal edilmədi. Zəhmət olmasa fayl formatını yoxlayın.'))
+            if result['skipped']:
+                messages.info(request, _('{count} boş sətir atlandı.').format(count=result['skipped']))
+            if result['errors']:
+                error_msg = _('{count} xəta ilə qarşılaşıldı. ').format(count=len(result['errors']))
+                error_msg += '<br>'.join(result['errors'][:3])
+                if len(result['errors']) > 3:
+                    error_msg += _('<br>... və {count} əlavə xəta.').format(count=len(result['errors']) - 3)
+                messages.warning(request, error_msg)
+            return redirect('debt_list')
+    else:
+        form = DebtImportForm(is_admin=is_admin)
+
+    return render(request, 'main/debt_import.html', {'form': form})
+
+
+STATEMENT_PAGE_SIZE = 50
+STATEMENT_API_MAX_PAGE_SIZE = 500
+
+
+def _positive_int(value, default):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back"""
+    def write(self, value):
+        return value
+
+
+@login_required
+@reports_db
+def customer_statement(request, pk):
+    """Account statement of a customer: debts and payments with a running balance"""
+    customer = get_object_or_404(Customer, pk=pk)
+    # Cashiers only see their own debts of the customer
+    if request.user.is_staff or request.user.is_superuser:
+        cashier = None
+    else:
+        cashier = get_current_cashier(request)
+        if not cashier:
+            messages.error(request, _('Kassir profili tapılmadı.'))
+            auth_logout(request)
+            return redirect('login')
+
+    if request.GET.get('format') == 'csv':
+        writer = csv.writer(_Echo())
+        kind_labels = {'debt': _('Borc'), 'payment': _('Ödəniş'), 'settlement': _('Tam ödəniş')}
+
+        def lines():
+            # BOM so that Excel opens the file as UTF-8
+            yield '\ufeff' + writer.writerow([
+                _('Tarix'), _('Növ'), _('Borc'), _('Borc artımı'), _('Ödəniş'), _('Qalıq'), _('Ödəniş üsulu'), _('Qeyd'),
+            ])
+            for entry in iter_statement(customer, cashier):
+                yield writer.writerow([
+                    timezone.localtime(entry.date).strftime('%d.%m.%Y %H:%M'),
+                    kind_labels[entry.kind],
+                    entry.debt_id,
+                    entry.charge or '',
+                    entry.credit or '',
+                    entry.balance,
+                    entry.get_payment_method_display_az() if entry.kind != 'debt' else '',
+                    entry.details,
+                ])
+
+        response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="statement-{customer.pk}.csv"'
+        return response
+
+    page = _positive_int(request.GET.get('page'), 1)
+    statement = build_statement(
+        customer, cashier, limit=STATEMENT_PAGE_SIZE, offset=(page - 1) * STATEMENT_PAGE_SIZE
+    )
+    page_count = max(1, -(-statement['count'] // STATEMENT_PAGE_SIZE))
+    return render(request, 'main/customer_statement.html', {
+        'customer': customer,
+        'statement': statement,
+        'page': page,
+        'page_count': page_count,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if page < page_count else None,
+    })
+
+
+@login_required
+@reports_db
+def customer_statement_api(request, pk):
+    """Customer statement as JSON, paginated with ?page=&page_size="""
+    from django.http import JsonResponse
+
+    customer = get_object_or_404(Customer, pk=pk)
+    if request.user.is_staff or request.user.is_superuser:
+        cashier = None
+    else:
+        cashier = get_current_cashier(request)
+        if not cashier:
+            return JsonResponse({'error': _('Kassir profili tapılmadı.')}, status=403)
+
+    page = _positive_int(request.GET.get('page'), 1)
+    page_size = min(_positive_int(request.GET.get('page_size'), STATEMENT_PAGE_SIZE), STATEMENT_API_MAX_PAGE_SIZE)
+    statement = build_statement(customer, cashier, limit=page_size, offset=(page - 1) * page_size)
+    return JsonResponse({
+        'customer': {'id': customer.pk, 'display': str(customer)},
+        'count': statement['count'],
+        'page': page,
+        'page_size': page_size,
+        'total_debt': str(statement['total_debt']),
+        'total_paid': str(statement['total_paid']),
+        'balance': str(statement['balance']),
+        'entries': [
+            {
+                'date': entry.date.isoformat(),
+                'kind': entry.kind,
+                'debt_id': entry.debt_id,
+                'payment_id': entry.payment_id,
+                'archived': entry.archived,
+                'amount': str(entry.amount),
+                'balance': str(entry.balance),
+                'payment_method': entry.payment_method,
+                'details': entry.details,
+            }
+            for entry in statement['entries']
+        ],
+    })
+
+
 @login_required
 def customer_search_api(request):
     """API endpoint for customer search (AJAX)"""
@@ -1025,13 +1299,8 @@ def customer_search_api(request):
         # Return recent customers (last 20) as preview
         customers = Customer.objects.all().order_by('-id')[:20]
     else:
-        # Search in name, surname, place, phone
-        customers = Customer.objects.filter(
-            Q(name__icontains=query) |
-            Q(surname__icontains=query) |
-            Q(place__icontains=query) |
-            Q(phone__icontains=query)
-        )[:20]
+        # Search in name, surname, patronymic, place, phone (via search_key)
+        customers = filter_by_search_key(Customer.objects.all(), query)[:20]
     
     results = []
     for customer in customers:
@@ -1055,10 +1324,10 @@ def is_admin(user):
 
 @login_required
 @user_passes_test(is_admin)
+@reports_db
 def admin_dashboard(request):
     """Admin dashboard showing all cashiers and their debts"""
-    today = timezone.now().date()
-    from datetime import datetime, timedelta
+    today = timezone.localdate()
     from calendar import monthrange
     
     # Get selected month from query params (format: YYYY-MM), default to current month
@@ -1077,70 +1346,59 @@ def admin_dashboard(request):
     last_day = monthrange(selected_month_date.year, selected_month_date.month)[1]
     current_month_end = selected_month_date.replace(day=last_day)
     
-    # Convert to datetime for filtering
-    month_start_datetime = timezone.make_aware(datetime.combine(current_month_start, datetime.min.time()))
-    month_end_datetime = timezone.make_aware(datetime.combine(current_month_end, datetime.max.time()))
-    
-    # Monthly statistics - debts given this month
+    # Monthly statistics - debts given this month (Asia/Baku days, see LocalDateField)
     monthly_given = Debt.objects.filter(
-        date_given__gte=month_start_datetime,
-        date_given__lte=month_end_datetime
-    ).aggregate(total=Sum('amount'))['total'] or 0
+        given_local_date__range=(current_month_start, current_month_end)
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     # Monthly statistics - payments/returns this month (partial + full)
     monthly_partial_payments = Payment.objects.filter(
-        payment_date__gte=month_start_datetime,
-        payment_date__lte=month_end_datetime
-    ).aggregate(total=Sum('amount'))['total'] or 0
+        payment_local_date__range=(current_month_start, current_month_end)
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     # Full payments (debts fully paid this month, excluding those with partial payments)
     monthly_full_payments = Debt.objects.filter(
         is_paid=True,
-        paid_date__gte=month_start_datetime,
-        paid_date__lte=month_end_datetime
+        paid_local_date__range=(current_month_start, current_month_end)
     ).exclude(
         id__in=Payment.objects.filter(
-            payment_date__gte=month_start_datetime,
-            payment_date__lte=month_end_datetime
+            payment_local_date__range=(current_month_start, current_month_end)
         ).values_list('debt_id', flat=True).distinct()
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ).aggregate(total=Sum('amount', default=0))['total']
     
     monthly_returned = monthly_partial_payments + monthly_full_payments
+
+    # Settled history moved to the archive still counts for its month
+    archived = archived_monthly_totals(current_month_start)
+    monthly_given += archived['given']
+    monthly_returned += archived['returned']
     monthly_balance = monthly_given - monthly_returned
     
     # Get all cashiers
     cashiers = Cashier.objects.all().select_related('user')
     
     # Get statistics for all cashiers
-    # Prefetch payments to calculate remaining_amount correctly
-    unpaid_debts = Debt.objects.filter(is_paid=False).select_related('customer', 'cashier').prefetch_related('payments')
-    unpaid_debts_list = list(unpaid_debts)  # Evaluate queryset once
-    total_debts = len(unpaid_debts_list)
+    # Remaining amounts (not total amounts), summed in the database
+    unpaid = Debt.objects.filter(is_paid=False).balance()
+    total_debts = unpaid['count']
+    total_amount = unpaid['remaining']
     
-    # Calculate total remaining amount (not total amount)
-    total_amount = sum(debt.remaining_amount for debt in unpaid_debts_list)
-    
-    overdue_debts_qs = Debt.objects.filter(
+    overdue = Debt.objects.filter(
         is_paid=False,
         promise_date__lt=today
-    ).select_related('customer', 'cashier').prefetch_related('payments')
-    overdue_debts_list = list(overdue_debts_qs)  # Evaluate queryset once
-    overdue_debts_count = len(overdue_debts_list)
-    
-    # Calculate overdue remaining amount (not total amount)
-    overdue_amount = sum(debt.remaining_amount for debt in overdue_debts_list)
+    ).balance()
+    overdue_debts_count = overdue['count']
+    overdue_amount = overdue['remaining']
     
     # Get cashier statistics
     cashier_stats = []
     for cashier in cashiers:
-        # Prefetch debts and payments for accurate remaining_amount calculation
-        unpaid_debts = cashier.debts.filter(is_paid=False).prefetch_related('payments')
-        total_remaining = sum(debt.remaining_amount for debt in unpaid_debts)
+        unpaid = cashier.debts.filter(is_paid=False).balance()
         
         stats = {
             'cashier': cashier,
-            'total_debt': total_remaining,  # Use calculated remaining amount
-            'debt_count': unpaid_debts.count(),
+            'total_debt': unpaid['remaining'],  # Remaining amount, not the total amount
+            'debt_count': unpaid['count'],
             'overdue_count': cashier.overdue_debt_count,
             'has_user': cashier.user is not None,
         }
@@ -1167,13 +1425,78 @@ def admin_dashboard(request):
         'monthly_returned': monthly_returned,
         'monthly_balance': monthly_balance,
         'selected_month': current_month_start,
+        # Live counters: events after the state rendered here
+        'live_stream': streaming_supported(request),
+        'live_cursor': cursor_token(initial_cursor()),
+        'live_poll_seconds': OPERATIONS_POLL_INTERVAL_SECONDS,
     }
     
     return render(request, 'main/admin_dashboard.html', context)
 
 
+# Live operations feed. Server-Sent Events need an ASGI server
+# (``manage.py serve --asgi``): each connection is closed after
+# OPERATIONS_STREAM_MAX_SECONDS and the browser reconnects with Last-Event-ID.
+# Under WSGI a stream would hold a request thread for its whole life, so
+# the dashboard polls operations_poll instead.
+OPERATIONS_STREAM_POLL_SECONDS = 2
+OPERATIONS_STREAM_KEEPALIVE_SECONDS = 20
+OPERATIONS_STREAM_MAX_SECONDS = 300
+OPERATIONS_POLL_INTERVAL_SECONDS = 15
+
+
+def streaming_supported(request):
+    """True if the server delivers a streaming response as it is produced (ASGI)"""
+    return isinstance(request, ASGIRequest)
+
+
 @login_required
 @user_passes_test(is_admin)
+async def operations_stream(request):
+    """Push debt/payment events to the admin dashboard as they are committed"""
+    if not streaming_supported(request):
+        # 204 tells EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OPERATIONS_STREAM_MAX_SECONDS
+        last_sent = loop.time()
+        # Off the shared thread the sync views run on
+        cursor = await sync_to_async(initial_cursor, thread_sensitive=False)(last_event_id)
+        yield f'retry: 3000\nid: {cursor_token(cursor)}\n\n'
+        while loop.time() < deadline:
+            events, cursor = await sync_to_async(collect_operation_events, thread_sensitive=False)(cursor)
+            if events:
+                token = cursor_token(cursor)
+                for event in events:
+                    yield f"id: {token}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= OPERATIONS_STREAM_KEEPALIVE_SECONDS:
+                yield f'id: {cursor_token(cursor)}\n: keepalive\n\n'
+                last_sent = loop.time()
+            await asyncio.sleep(OPERATIONS_STREAM_POLL_SECONDS)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+def operations_poll(request):
+    """The events committed after ?cursor= and the next cursor (the dashboard's fallback under WSGI)"""
+    events, cursor = collect_operation_events(initial_cursor(request.GET.get('cursor')))
+    response = JsonResponse({'cursor': cursor_token(cursor), 'events': events})
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+@reports_db
 def admin_all_debts(request):
     """Admin view to see all debts from all cashiers"""
     # Only show open (unpaid) debts by default
@@ -1204,28 +1527,96 @@ def admin_all_debts(request):
     # Search
     search = request.GET.get('search', '').strip()
     if search:
-        debts = debts.filter(
-            Q(customer__name__icontains=search) |
-            Q(customer__surname__icontains=search) |
-            Q(customer__place__icontains=search) |
-            Q(cashier__name__icontains=search) |
-            Q(cashier__surname__icontains=search) |
-            Q(description__icontains=search)
-        )
+        debts = filter_by_search_key(debts, search)
     
     cashiers = Cashier.objects.all()
     
+    # Rows are only evaluated when the table fragment is not cached
+    today = timezone.now().date()
+    scope = Debt.all_objects.all()
+    if cashier_id:
+        scope = scope.filter(cashier_id=cashier_id)
+    version = debt_data_version(scope)
+    
     context = {
-        'debts': debts,
+        'debts': SimpleLazyObject(lambda: debt_rows(debts, today=today)),
         'cashiers': cashiers,
         'selected_cashier': cashier_id,
         'selected_status': status,
         'search_query': search if search else '',
+        'today': today,
+        'table_cache_key': table_cache_key(request, 'admin_all_debts', version, today),
+        'table_cache_timeout': DEBT_TABLE_CACHE_TIMEOUT,
+        'row_cache_timeout': DEBT_ROW_CACHE_TIMEOUT,
     }
     
     return render(request, 'main/admin_all_debts.html', context)
 
 
+EDIT_REQUEST_PAGE_SIZE = 50
+
+
+def _review_edit_requests(request, request_ids):
+    """Apply the approve/reject action posted for ``request_ids`` and report it"""
+    action = request.POST.get('action')
+    notes = request.POST.get('review_notes', '').strip()
+    if not request_ids:
+        messages.error(request, _('Heç bir tələb seçilməyib.'))
+    elif action == 'approve':
+        result = approve_requests(request_ids, request.user, notes)
+        if result['approved']:
+            messages.success(request, _('{count} tələb təsdiqləndi.').format(count=len(result['approved'])))
+        for edit_request, reason in result['failed']:
+            messages.warning(request, _('Tələb #{pk} təsdiqlənmədi: {reason}').format(pk=edit_request.pk, reason=reason))
+    elif action == 'reject':
+        rejected = reject_requests(request_ids, request.user, notes)
+        messages.success(request, _('{count} tələb rədd edildi.').format(count=rejected))
+    else:
+        messages.error(request, _('Naməlum əməliyyat.'))
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_edit_requests(request):
+    """Queue of debt edit requests; pending ones can be approved or rejected in bulk"""
+    if request.method == 'POST':
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+        _review_edit_requests(request, ids)
+        return redirect(request.get_full_path())
+    
+    selected_status = request.GET.get('status', 'pending')
+    edit_requests = DebtEditRequest.objects.select_related(
+        'debt__customer', 'requested_by'
+    ).order_by('-created_at', '-pk')
+    if selected_status in dict(DebtEditRequest.STATUS_CHOICES):
+        edit_requests = edit_requests.filter(status=selected_status)
+    else:
+        selected_status = ''
+    if selected_status == 'pending':
+        # Oldest first: the queue is worked through in order
+        edit_requests = edit_requests.order_by('created_at', 'pk')
+    
+    page = Paginator(edit_requests, EDIT_REQUEST_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'main/admin_edit_requests.html', {
+        'requests': page.object_list,
+        'page_obj': page,
+        'selected_status': selected_status,
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_edit_request_detail(request, pk):
+    """Review one edit request"""
+    edit_request = get_object_or_404(
+        DebtEditRequest.objects.select_related('debt__customer', 'debt__cashier', 'requested_by', 'reviewed_by'), pk=pk
+    )
+    if request.method == 'POST':
+        _review_edit_requests(request, [edit_request.pk])
+        return redirect('admin_edit_requests')
+    return render(request, 'main/admin_edit_request_detail.html', {'edit_request': edit_request})
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_cashier_list(request):
@@ -1281,6 +1672,9 @@ def admin_cashier_change_password(request, pk):
 
 
 @login_required
+@reports_db
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard_etag, last_modified_func=dashboard_last_modified)
 def todays_operations(request):
     """View operations for a specific date (defaults to today)"""
     # Get current date in local timezone
@@ -1312,15 +1706,13 @@ def todays_operations(request):
         start_datetime = timezone.make_aware(naive_start)
         end_datetime = start_datetime + timedelta(days=1)
         
-        # Separate debts given today from debts returned/paid today
+        # Separate debts given today from debts returned/paid today (Asia/Baku days)
         debts_given_today = Debt.all_objects.filter(
-            date_given__gte=start_datetime, 
-            date_given__lt=end_datetime,
+            given_local_date=selected_date,
         ).select_related('cashier', 'customer', 'deleted_by').prefetch_related('payments').order_by('-date_given', '-id')
         
         debts_returned_today = Debt.all_objects.filter(
-            paid_date__gte=start_datetime, 
-            paid_date__lt=end_datetime
+            paid_local_date=selected_date
         ).select_related('cashier', 'customer', 'deleted_by').prefetch_related('payments').order_by('-paid_date', '-id')
         
         debts_deleted_today = Debt.all_objects.filter(
@@ -1330,8 +1722,7 @@ def todays_operations(request):
         
         # Get partial payments made today
         partial_payments_today = Payment.objects.filter(
-            payment_date__gte=start_datetime, 
-            payment_date__lt=end_datetime
+            payment_local_date=selected_date
         ).select_related('debt__customer', 'debt__cashier', 'created_by').order_by('-payment_date', '-id')
         
         # Get full payments (debts fully paid today) - exclude those with partial payments
@@ -1357,9 +1748,9 @@ def todays_operations(request):
         all_payments_today.sort(key=lambda x: x.payment_date if hasattr(x, 'payment_date') else x['payment_date'], reverse=True)
         
         # Statistics
-        total_amount = debts_given_today.aggregate(total=Sum('amount'))['total'] or 0
+        total_amount = debts_given_today.aggregate(total=Sum('amount', default=0))['total']
         deleted_count = debts_deleted_today.count()
-        payments_today_total = partial_payments_today.aggregate(total=Sum('amount'))['total'] or 0
+        payments_today_total = partial_payments_today.aggregate(total=Sum('amount', default=0))['total']
         payments_today_total += sum(debt.amount for debt in full_payments_today)
         
         # Cashier summary - total debt given and payments received by each cashier today
@@ -1454,17 +1845,15 @@ def todays_operations(request):
     start_datetime = timezone.make_aware(naive_start)
     end_datetime = start_datetime + timedelta(days=1)
     
-    # Separate debts given today from debts returned/paid today
+    # Separate debts given today from debts returned/paid today (Asia/Baku days)
     debts_given_today = Debt.all_objects.filter(
         cashier=cashier,
-        date_given__gte=start_datetime, 
-        date_given__lt=end_datetime
+        given_local_date=selected_date
     ).select_related('cashier', 'customer', 'deleted_by').prefetch_related('payments').order_by('-date_given', '-id')
     
     debts_returned_today = Debt.all_objects.filter(
         cashier=cashier,
-        paid_date__gte=start_datetime, 
-        paid_date__lt=end_datetime
+        paid_local_date=selected_date
     ).select_related('cashier', 'customer', 'deleted_by').prefetch_related('payments').order_by('-paid_date', '-id')
     
     debts_deleted_today = Debt.all_objects.filter(
@@ -1475,8 +1864,7 @@ def todays_operations(request):
     
     # Get partial payments made today
     partial_payments_today = Payment.objects.filter(
-        payment_date__gte=start_datetime, 
-        payment_date__lt=end_datetime,
+        payment_local_date=selected_date,
         debt__cashier=cashier
         ).select_related('debt__customer', 'debt__cashier', 'created_by').order_by('-payment_date', '-id')
     
@@ -1503,9 +1891,9 @@ def todays_operations(request):
     all_payments_today.sort(key=lambda x: x.payment_date if hasattr(x, 'payment_date') else x['payment_date'], reverse=True)
     
     # Statistics
-    total_amount = debts_given_today.aggregate(total=Sum('amount'))['total'] or 0
+    total_amount = debts_given_today.aggregate(total=Sum('amount', default=0))['total']
     deleted_count = debts_deleted_today.count()
-    payments_today_total = partial_payments_today.aggregate(total=Sum('amount'))['total'] or 0
+    payments_today_total = partial_payments_today.aggregate(total=Sum('amount', default=0))['total']
     payments_today_total += sum(debt.amount for debt in full_payments_today)
     
     # Cashier summary - for single cashier, just their own total
@@ -1553,7 +1941,7 @@ def admin_cashier_detail(request, pk):
     
     context = {
         'cashier': cashier,
-        'debts': debts,
+        'debts': debt_rows(debts),
         'selected_status': status,
     }
     
@@ -3,6 +3,14 @@ ASGI config for pharmacy project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live operations feed (``api/operations/stream/``, Server-Sent Events)
+is an async view and needs this entry point:
+
+    python manage.py serve --asgi
+
+Under WSGI (``runserver``, ``serve``) the stream answers 204 and the admin
+dashboard polls ``api/operations/`` instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -15,20 +15,48 @@ import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployment settings can be overridden from the environment or a .env file
+# next to manage.py (see DEPLOYMENT_GUIDE.md). Without them the project runs
+# with the development defaults below.
+try:
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
+except ImportError:
+    pass
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-^x6b2+yvlywxk6%h4r3^z-kh4d-f4k-wptk8zzau(3wjvpzxne'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-^x6b2+yvlywxk6%h4r3^z-kh4d-f4k-wptk8zzau(3wjvpzxne',
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DJANGO_DEBUG=0 selects the production profile: cached templates without
+# debug info and compressed HTML/JSON responses.
+DEBUG = env_bool('DJANGO_DEBUG', True)
 
 # ALLOWED_HOSTS: Add your server's IP address here
 # For development on local network, you can use '*' (less secure)
 # For production, specify exact IP addresses or domain names
-ALLOWED_HOSTS = ['192.168.100.11', '127.0.0.1'] 
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', ['192.168.100.11', '127.0.0.1'])
  # Change to ['192.168.1.100', 'localhost'] for better security
 
 
@@ -46,6 +74,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files (pre-compressed, far-future cache headers)
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +85,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if not DEBUG:
+    # Brotli/gzip for HTML and JSON. Placed after WhiteNoise, so static
+    # files keep their pre-compressed variants.
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware') + 1,
+        'main.middleware.CompressionMiddleware',
+    )
+
 ROOT_URLCONF = 'pharmacy.urls'
 TEMPLATES = [
     {
@@ -69,10 +107,22 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.pending_edit_requests',
             ],
         },
     },
 ]
+
+if not DEBUG:
+    # Parse each template once per process instead of on every render
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'pharmacy.wsgi.application'
 
 
@@ -83,6 +133,64 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions take the write lock when they start, so a
+            # read-validate-write block (batch payments) is never
+            # interleaved with another terminal's write; waiting writers
+            # queue for up to `timeout` seconds instead of failing.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            # WAL: readers (the reports connection below) and the writer
+            # do not block each other. auto_vacuum only takes effect on a
+            # new file (see main/maintenance.py for existing ones).
+            'init_command': 'PRAGMA auto_vacuum=INCREMENTAL; PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
+    }
+}
+
+# Read-only connection for the report pages (see main/routers.py). Reads
+# the live database by default; REPORTS_DATABASE can point it at a
+# periodically refreshed copy of it instead (manage.py backup --reports).
+REPORTS_DATABASE = Path(os.environ.get('REPORTS_DATABASE') or DATABASES['default']['NAME'])
+DATABASES['reports'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': REPORTS_DATABASE.resolve().as_uri() + '?mode=ro',
+    'OPTIONS': {
+        'timeout': 20,
+    },
+    'TEST': {
+        'MIRROR': 'default',
+    },
+}
+DATABASE_ROUTERS = ['main.routers.ReportsRouter']
+
+# Compressed snapshots written by manage.py backup (see main/backups.py)
+BACKUP_DIR = Path(os.environ.get('BACKUP_DIR') or BASE_DIR / 'backups')
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 14))
+
+# Local time range in which manage.py maintain_database --off-hours runs
+MAINTENANCE_WINDOW = os.environ.get('MAINTENANCE_WINDOW', '02:00-05:00')
+
+# Replication to head office (see main/branch_sync.py): the code of this
+# pharmacy in batch file names (letters, digits, _), empty at head office
+BRANCH_CODE = os.environ.get('BRANCH_CODE', '')
+BRANCH_NAME = os.environ.get('BRANCH_NAME', '')
+# sync_export writes to SYNC_DIR/outbox, sync_import reads SYNC_DIR/inbox
+SYNC_DIR = Path(os.environ.get('SYNC_DIR') or BASE_DIR / 'sync')
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Used for rendered debt list rows/tables (see main/caching.py). Cache keys
+# carry their own data version, so a per-process cache is safe.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pharmacy-default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
@@ -142,6 +250,19 @@ SESSION_COOKIE_AGE = 86400  # 24 hours (but expires on browser close due to abov
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Bootstrap and bootstrap-icons are vendored in main/static/vendor, pages
+# never load anything from the internet. `collectstatic` writes hashed
+# copies (bootstrap.min.<hash>.css) plus .gz/.br variants; WhiteNoise serves
+# them with a one-year immutable Cache-Control header.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 